@@ -0,0 +1,138 @@
+from __future__ import annotations
+import numpy as np
+from numpy.typing import NDArray
+
+from QuaternionBatch import *
+from ExponentialMap import *
+
+"""
+Description: AttitudeConversions.py converts whole attitude histories between quaternions, rotation matrices, yaw/pitch/roll angles and
+tilt-from-vertical angles in single numpy passes. Quaternions are (w, x, y, z) rows rotating body coordinates into the inertial frame, the
+same convention as `rotateVector()`. Euler angles follow the aerospace z-y-x sequence, R = Rz(yaw) Ry(pitch) Rx(roll), and the tilt is
+the angle between the body z axis (the thrust axis) and the inertial vertical, with the azimuth giving the horizontal direction it leans.
+"""
+
+YAW, PITCH, ROLL = 0, 1, 2
+TILT, AZIMUTH = 0, 1
+
+
+def batchRotationMatrix(qs: QuaternionArray) -> NDArray:
+  """ rotation matrices of a stack of quaternions, matching `Quaternion.get_rotation_matrix()` row by row
+
+  Args:
+      qs (QuaternionArray): (N, 4) quaternions, normalized internally
+
+  Returns:
+      NDArray: (N, 3, 3) rotation matrices
+  """
+  qw, qx, qy, qz = np.moveaxis(batchNormalize(qs=qs), -1, 0)
+  return np.stack((
+    np.stack((1 - 2 * (qy * qy + qz * qz), 2 * (qx * qy - qw * qz), 2 * (qx * qz + qw * qy)), axis=-1),
+    np.stack((2 * (qx * qy + qw * qz), 1 - 2 * (qx * qx + qz * qz), 2 * (qy * qz - qw * qx)), axis=-1),
+    np.stack((2 * (qx * qz - qw * qy), 2 * (qy * qz + qw * qx), 1 - 2 * (qx * qx + qy * qy)), axis=-1)
+  ), axis=-2)
+
+def batchQuaternionFromMatrix(Rs: NDArray) -> QuaternionArray:
+  """ quaternions of a stack of rotation matrices with Shepperd's method, always dividing by the largest of the four candidates
+
+  Args:
+      Rs (NDArray): (N, 3, 3) rotation matrices
+
+  Returns:
+      QuaternionArray: (N, 4) unit quaternions with w >= 0
+  """
+  R00, R01, R02 = Rs[..., 0, 0], Rs[..., 0, 1], Rs[..., 0, 2]
+  R10, R11, R12 = Rs[..., 1, 0], Rs[..., 1, 1], Rs[..., 1, 2]
+  R20, R21, R22 = Rs[..., 2, 0], Rs[..., 2, 1], Rs[..., 2, 2]
+
+  # each row is 4 |q_c| q for one choice of the pivot component c, the diagonal entries are 4 q_c^2
+  candidates = np.stack((
+    np.stack((1 + R00 + R11 + R22, R21 - R12, R02 - R20, R10 - R01), axis=-1),
+    np.stack((R21 - R12, 1 + R00 - R11 - R22, R01 + R10, R02 + R20), axis=-1),
+    np.stack((R02 - R20, R01 + R10, 1 - R00 + R11 - R22, R12 + R21), axis=-1),
+    np.stack((R10 - R01, R02 + R20, R12 + R21, 1 - R00 - R11 + R22), axis=-1)
+  ), axis=-2)
+
+  pivots = np.argmax(np.diagonal(candidates, axis1=-2, axis2=-1), axis=-1)
+  rows = np.take_along_axis(candidates, pivots[..., np.newaxis, np.newaxis], axis=-2)[..., 0, :]
+  qs = batchNormalize(qs=rows)
+  return np.where(qs[..., :1] < 0.0, -qs, qs)
+
+def batchEulerAngles(qs: QuaternionArray) -> NDArray:
+  """ yaw, pitch and roll of a stack of quaternions in the z-y-x sequence
+
+  Args:
+      qs (QuaternionArray): (N, 4) quaternions, normalized internally
+
+  Returns:
+      NDArray: (N, 3) yaw in (-π, π], pitch in [-π / 2, π / 2], roll in (-π, π], all in radians
+  """
+  qw, qx, qy, qz = np.moveaxis(batchNormalize(qs=qs), -1, 0)
+  yaw = np.arctan2(2 * (qw * qz + qx * qy), 1 - 2 * (qy * qy + qz * qz))
+  pitch = np.arcsin(np.clip(2 * (qw * qy - qz * qx), -1.0, 1.0))
+  roll = np.arctan2(2 * (qw * qx + qy * qz), 1 - 2 * (qx * qx + qy * qy))
+  return np.stack((yaw, pitch, roll), axis=-1)
+
+def batchQuaternionFromEuler(angles: NDArray) -> QuaternionArray:
+  """ quaternions of a stack of z-y-x yaw, pitch and roll angles, the inverse of `batchEulerAngles()`
+
+  Args:
+      angles (NDArray): (N, 3) yaw, pitch, roll in radians
+
+  Returns:
+      QuaternionArray: (N, 4) unit quaternions
+  """
+  half = np.asarray(angles) / 2
+  cy, cp, cr = np.moveaxis(np.cos(half), -1, 0)
+  sy, sp, sr = np.moveaxis(np.sin(half), -1, 0)
+  return np.stack((
+    cr * cp * cy + sr * sp * sy,
+    sr * cp * cy - cr * sp * sy,
+    cr * sp * cy + sr * cp * sy,
+    cr * cp * sy - sr * sp * cy
+  ), axis=-1)
+
+def batchTiltAngles(qs: QuaternionArray) -> NDArray:
+  """ tilt of the body z axis away from the inertial vertical, and the azimuth of the direction it leans toward
+
+  Args:
+      qs (QuaternionArray): (N, 4) quaternions, normalized internally
+
+  Returns:
+      NDArray: (N, 2) tilt in [0, π] and azimuth in (-π, π] measured from inertial x toward inertial y, in radians
+  """
+  qw, qx, qy, qz = np.moveaxis(batchNormalize(qs=qs), -1, 0)
+  # third column of the rotation matrix, the body z axis expressed in the inertial frame
+  zx = 2 * (qx * qz + qw * qy)
+  zy = 2 * (qy * qz - qw * qx)
+  zz = 1 - 2 * (qx * qx + qy * qy)
+  return np.stack((np.arctan2(np.hypot(zx, zy), zz), np.arctan2(zy, zx)), axis=-1)
+
+def batchQuaternionFromTilt(angles: NDArray) -> QuaternionArray:
+  """ attitudes that tilt the body z axis by the given angles with no spin about it, the inverse of `batchTiltAngles()` up to spin
+
+  Args:
+      angles (NDArray): (N, 2) tilt and azimuth in radians
+
+  Returns:
+      QuaternionArray: (N, 4) unit quaternions, rotations about a horizontal axis only
+  """
+  tilt, azimuth = np.moveaxis(np.asarray(angles), -1, 0)
+  # rotating about z x (cos a, sin a, 0) leans the z axis toward azimuth a
+  axes = np.stack((-np.sin(azimuth), np.cos(azimuth), np.zeros_like(azimuth)), axis=-1)
+  return batchExpMap(phis=tilt[..., np.newaxis] * axes)
+
+
+__all__ = [
+  "YAW",
+  "PITCH",
+  "ROLL",
+  "TILT",
+  "AZIMUTH",
+  "batchRotationMatrix",
+  "batchQuaternionFromMatrix",
+  "batchEulerAngles",
+  "batchQuaternionFromEuler",
+  "batchTiltAngles",
+  "batchQuaternionFromTilt"
+]
@@ -0,0 +1,309 @@
+from __future__ import annotations
+from typing import Dict, Tuple, List, Callable
+from timeit import repeat as timeRepeat
+import numpy as np
+import pandas as pd
+
+from Quaternion import *
+from QuaternionBatch import *
+from Kernels import *
+from Precision import *
+from Design import *
+from Element import *
+from ElementTypes import *
+from Builder import *
+from MotorManager import *
+from ThrustVectorController import *
+from Integrator import *
+from Dynamics import *
+from Ensemble import *
+from Interpolation import *
+from Trajectory import frameChannel
+from SimulationLoop import simulate
+
+"""
+Description: Benchmarks.py collects the timing and accuracy studies for the physics core. Each benchmark rebuilds the demo vehicle from
+scratch with a fixed random seed so every run flies the exact same motor draw, then reports its findings as a DataFrame and prints it.
+Run this file directly from the repository root to execute all of them.
+"""
+
+
+def buildDemoVehicle(seed: int = 0, targetx: float = 0.05, targety: float = 0.02) -> Tuple[Design, ThrustVectorController, int]:
+  """ builds the standard F15 demo vehicle, resetting the singletons so consecutive calls produce independent designs
+
+  Args:
+      seed (int, optional): numpy random seed used for the motor parameter draw. Defaults to 0.
+      targetx (float, optional): initial servo angle in radians. Defaults to 0.05.
+      targety (float, optional): initial servo angle in radians. Defaults to 0.02.
+
+  Returns:
+      Tuple[Design, ThrustVectorController, int]: the locked design, its thrust vectoring unit, and the motor index
+  """
+  Builder._instance = None
+  MotorManager._instance = None
+  ThrustVectorController._instance = None
+  np.random.seed(seed)
+
+  motor = MotorManager(motor="F15")
+  tvc = ThrustVectorController(motor_manager=motor)
+
+  data_dict = motor.getElementData()
+  motor_idx = 0
+  data_dict.update({
+    "flight_computer": ConfigDict(
+      Type=Cylinder,
+      Args=CylinderDictS(radius=0.072 / 2, height=0.12, mass=0.18, is_static=True)
+    ),
+    "nose_cone": ConfigDict(
+      Type=Cone,
+      Args=ConeDictS(radius=0.074 / 2, height=0.2, mass=0.12, is_static=True)
+    ),
+    "body_tube": ConfigDict(
+      Type=Tube,
+      Args=TubeDictS(inner_radius=0.072 / 2, outer_radius=0.074 / 2, height=0.8, mass=0.3, is_static=True)
+    )
+  })
+
+  builder = Builder(data_dict=data_dict)
+  design, part_numbers = builder.generate_design()
+
+  design.manipulate_element(part_numbers["rocket_motor"], np.array([0, 0, -0.4]))
+  tvc.moveToMotor(offset=np.array([0, 0, -0.4]))
+  design.manipulate_element(part_numbers["flight_computer"], np.array([0, 0, 0.15]))
+  design.manipulate_element(part_numbers["nose_cone"], np.array([0, 0, 0.4]))
+  design.manipulate_element(part_numbers["body_tube"], np.array([0.0, 0.0, -0.05]))
+  design.consolidate_static_elements()
+
+  tvc.updateSetpoint(targetx=targetx, targety=targety)
+  tvc.forceToTarget()
+
+  return (design, tvc, motor_idx)
+
+def benchmarkPrecision(dt: float = 1e-3, repeats: int = 3) -> pd.DataFrame:
+  """ flies the demo vehicle in every precision mode and reports speed and drift relative to float64
+
+  Args:
+      dt (float, optional): small time step. Defaults to 1e-3.
+      repeats (int, optional): runs per mode, the fastest wall time is reported. Defaults to 3.
+
+  Returns:
+      pd.DataFrame: one row per precision with loop wall time, step count and position drift in meters
+  """
+  trajectories: Dict[str, NDArray] = {}
+  times: Dict[str, float] = {}
+
+  for precision in PRECISIONS.keys():
+    wall_times = []
+    for _ in range(repeats):
+      design, tvc, motor_idx = buildDemoVehicle()
+      data = simulate(serial_manager=None, design=design, tvc=tvc, motor_idx=motor_idx, dt=dt, precision=precision).to_frame()
+      wall_times.append(data.attrs["simulation_time"])
+
+    trajectories[precision] = frameChannel(data=data, channel="position").astype(np.float64)
+    times[precision] = min(wall_times)
+
+  setPrecision(precision=DEFAULT_PRECISION)
+
+  reference = trajectories["float64"]
+  rows: List[dict] = []
+  for precision, positions in trajectories.items():
+    N = min(len(positions), len(reference))
+    drift = np.linalg.norm(positions[:N] - reference[:N], axis=1)
+    rows.append({
+      "precision": precision,
+      "wall_time_s": times[precision],
+      "steps": len(positions),
+      "max_drift_m": drift.max(),
+      "final_drift_m": drift[-1],
+      "apogee_m": positions[:, 2].max()
+    })
+
+  report = pd.DataFrame(rows)
+  print(f"Precision benchmark at dt = {dt}\n{report.to_string(index=False)}")
+  return report
+
+def benchmarkKernels(number: int = 20000, repeats: int = 5) -> pd.DataFrame:
+  """ times every scalar kernel in Kernels.py against the numpy call it replaces in the simulation step, on the same random inputs
+
+  Args:
+      number (int, optional): calls per timing. Defaults to 20000.
+      repeats (int, optional): timings per operation, the fastest is reported. Defaults to 5.
+
+  Returns:
+      pd.DataFrame: one row per operation with the per call time of each version in microseconds and the speedup
+  """
+  rng = np.random.default_rng(0)
+  a, b = rng.normal(size=3), rng.normal(size=3)
+  A = rng.normal(size=(3, 3))
+  A = A @ A.T + 3 * np.identity(3) # symmetric positive definite like an inertia tensor
+  q1, q2 = batchNormalize(qs=rng.normal(size=4)), batchNormalize(qs=rng.normal(size=4))
+  R = Quaternion(elements=tuple(q1)).get_rotation_matrix()
+
+  cases: Dict[str, Tuple[Callable, Callable]] = {
+    "dot": (lambda: np.dot(a, b), lambda: dot3(a=a.tolist(), b=b.tolist())),
+    "cross": (lambda: np.cross(a, b), lambda: cross3(a=a.tolist(), b=b.tolist())),
+    "norm": (lambda: np.linalg.norm(a), lambda: norm3(a=a.tolist())),
+    "mat_vec": (lambda: np.matmul(A, a), lambda: matVec3(A=A.tolist(), b=a.tolist())),
+    "inverse": (lambda: np.linalg.inv(A), lambda: inverse3(A=A.tolist())),
+    "quaternion_product": (
+      lambda: np.concatenate(([q1[0] * q2[0] - np.dot(q1[1:], q2[1:])], q1[0] * q2[1:] + q2[0] * q1[1:] + np.cross(q1[1:], q2[1:]))),
+      lambda: quatMultiply(q1=q1.tolist(), q2=q2.tolist())
+    ),
+    "quaternion_rotate": (lambda: np.matmul(R, a), lambda: quatRotate(q=q1.tolist(), v=a.tolist()))
+  }
+
+  rows: List[dict] = []
+  for name, (numpy_call, kernel_call) in cases.items():
+    assert np.allclose(numpy_call(), kernel_call()), f"kernel {name} disagrees with numpy"
+    numpy_time = min(timeRepeat(numpy_call, number=number, repeat=repeats)) / number * 1e6
+    kernel_time = min(timeRepeat(kernel_call, number=number, repeat=repeats)) / number * 1e6
+    rows.append({
+      "operation": name,
+      "numpy_us": numpy_time,
+      "kernel_us": kernel_time,
+      "speedup": numpy_time / kernel_time
+    })
+
+  report = pd.DataFrame(rows)
+  print(f"Kernel benchmark, including the `.tolist()` conversions\n{report.to_string(index=False)}")
+  return report
+
+def benchmarkSimulation(dt: float = 1e-2, repeats: int = 10) -> pd.DataFrame:
+  """ times the full demo flight
+
+  Args:
+      dt (float, optional): small time step. Defaults to 1e-2.
+      repeats (int, optional): number of flights. Defaults to 10.
+
+  Returns:
+      pd.DataFrame: a single row with mean and standard deviation of the loop wall time and the time per step
+  """
+  wall_times = []
+  for _ in range(repeats):
+    design, tvc, motor_idx = buildDemoVehicle()
+    data = simulate(serial_manager=None, design=design, tvc=tvc, motor_idx=motor_idx, dt=dt).to_frame()
+    wall_times.append(data.attrs["simulation_time"])
+
+  report = pd.DataFrame([{
+    "dt": dt,
+    "steps": len(data),
+    "mean_s": np.mean(wall_times),
+    "std_s": np.std(wall_times),
+    "per_step_us": np.mean(wall_times) / len(data) * 1e6
+  }])
+  print(f"Simulation benchmark\n{report.to_string(index=False)}")
+  return report
+
+def benchmarkIntegrators(dts: Tuple[float, ...] = (2e-2, 1e-2, 5e-3, 2e-3, 1e-3), reference_dt: float = 2e-4, repeats: int = 3) -> pd.DataFrame:
+  """ flies the demo vehicle with every scheme in `INTEGRATORS` over a range of step sizes and reports cost against accuracy
+
+  - the reference flight uses "rkmk4" at reference_dt. every flight is resampled onto a common 10 ms grid with `resampleTrajectory()`
+    before comparing, so schemes with different step sizes are measured at the same instants, up to the end of the shorter flight
+
+  Args:
+      dts (Tuple[float, ...], optional): step sizes to fly each scheme at. Defaults to (2e-2, 1e-2, 5e-3, 2e-3, 1e-3).
+      reference_dt (float, optional): step size of the reference flight. Defaults to 2e-4.
+      repeats (int, optional): flights per scheme and step size, the fastest wall time is reported. Defaults to 3.
+
+  Returns:
+      pd.DataFrame: one row per scheme and step size with loop wall time, step count, maximum position and attitude error, apogee error,
+        and the energy balance drift and verdict of the conservation monitors, which judge the flight without the reference
+  """
+  def fly(integrator: str, dt: float) -> pd.DataFrame:
+    design, tvc, motor_idx = buildDemoVehicle()
+    return simulate(serial_manager=None, design=design, tvc=tvc, motor_idx=motor_idx, dt=dt, integrator=integrator, monitor=True).to_frame()
+
+  def resample(data: pd.DataFrame, grid: NDArray) -> Dict[str, NDArray]:
+    return resampleTrajectory(
+      data["time"].to_numpy(),
+      frameChannel(data=data, channel="position"),
+      frameChannel(data=data, channel="velocity"),
+      frameChannel(data=data, channel="attitude"),
+      grid
+    )
+
+  reference = fly(integrator="rkmk4", dt=reference_dt)
+  grid = np.arange(max(dts), reference["time"].iloc[-1], 1e-2)
+  expected = resample(data=reference, grid=grid)
+  expected_apogee = frameChannel(data=reference, channel="position")[:, 2].max()
+
+  rows: List[dict] = []
+  for integrator in INTEGRATORS.keys():
+    for dt in dts:
+      wall_times = []
+      for _ in range(repeats):
+        data = fly(integrator=integrator, dt=dt)
+        wall_times.append(data.attrs["simulation_time"])
+
+      # every flight ends at its own located ground impact, the errors are taken up to the earlier of its impact and the reference's
+      N = np.searchsorted(grid, data["time"].iloc[-1], side="right")
+      actual = resample(data=data, grid=grid[:N])
+      rows.append({
+        "integrator": integrator,
+        "dt": dt,
+        "steps": len(data),
+        "wall_time_s": min(wall_times),
+        "max_position_error_m": np.linalg.norm(actual["position"] - expected["position"][:N], axis=1).max(),
+        "max_attitude_error_rad": batchAttitudeError(actual["attitude"], expected["attitude"][:N]).max(),
+        "apogee_error_m": abs(frameChannel(data=data, channel="position")[:, 2].max() - expected_apogee),
+        "energy_balance": data.attrs["monitors"]["energy_balance"],
+        "healthy": data.attrs["monitors"]["healthy"]
+      })
+
+  report = pd.DataFrame(rows)
+  print(f"Integrator benchmark against rkmk4 at dt = {reference_dt}\n{report.to_string(index=False)}")
+  return report
+
+def benchmarkEnsemble(sizes: Tuple[int, ...] = (1, 8, 64), dt: float = 1e-2, integrator: str = "euler") -> pd.DataFrame:
+  """ flies ensembles of demo vehicles with different motor draws in lockstep and compares the cost per member with `simulationLoop()`
+
+  - member 0 is the standard demo vehicle, its apogee is checked against the scalar flight with the same scheme
+
+  Args:
+      sizes (Tuple[int, ...], optional): ensemble sizes, member i uses seed i. Defaults to (1, 8, 64).
+      dt (float, optional): small time step. Defaults to 1e-2.
+      integrator (str, optional): a key of both `ENSEMBLE_INTEGRATORS` and `INTEGRATORS`. Defaults to "euler".
+
+  Returns:
+      pd.DataFrame: one row per size with the ensemble wall time, the time per member, the speedup over the scalar loop and the apogee deviation
+  """
+  design, tvc, motor_idx = buildDemoVehicle()
+  scalar = simulate(serial_manager=None, design=design, tvc=tvc, motor_idx=motor_idx, dt=dt, integrator=integrator).to_frame()
+  scalar_apogee = max(event["position"][2] for event in scalar.attrs["events"] if event["name"] == "apogee")
+
+  rows: List[dict] = []
+  for size in sizes:
+    members = []
+    for seed in range(size):
+      design, tvc, _ = buildDemoVehicle(seed=seed)
+      members.append(RigidBodyDynamics(design=design, tvc=tvc))
+    result = ensembleLoop(members=members, dt=dt, integrator=integrator)
+    rows.append({
+      "members": size,
+      "wall_time_s": result["simulation_time"],
+      "per_member_ms": result["simulation_time"] / size * 1e3,
+      "speedup": scalar.attrs["simulation_time"] * size / result["simulation_time"],
+      "apogee_error_m": abs(result["summary"]["apogee"].iloc[0] - scalar_apogee)
+    })
+
+  report = pd.DataFrame(rows)
+  print(f"Ensemble benchmark, {integrator} at dt = {dt}, scalar loop {scalar.attrs['simulation_time']:.4f} s\n{report.to_string(index=False)}")
+  return report
+
+
+__all__ = [
+  "buildDemoVehicle",
+  "benchmarkPrecision",
+  "benchmarkKernels",
+  "benchmarkSimulation",
+  "benchmarkIntegrators",
+  "benchmarkEnsemble"
+]
+
+if __name__ == "__main__":
+  benchmarkKernels()
+  benchmarkSimulation(dt=1e-2)
+  benchmarkPrecision(dt=1e-2)
+  benchmarkPrecision(dt=1e-3)
+  benchmarkIntegrators()
+  benchmarkEnsemble()
@@ -0,0 +1,111 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Tuple, TypedDict
+import copy
+import numpy as np
+from numpy.typing import NDArray
+
+from Quaternion import *
+from State import *
+from Precision import *
+from Design import *
+from ThrustVectorController import *
+from Events import *
+
+"""
+Description: Checkpoint.py captures everything a flight needs to carry on from a moment t: the kinematic state, the burning masses and
+gimbal attitudes of the design's dynamic elements, the servo angles and targets of the thrust vectoring unit, the step count, flight
+phase and events so far, and the numpy random state. A run resumed from a checkpoint continues exactly as the original run would have, so
+controller studies that share a boost phase integrate it once and fork every variant from the checkpoint taken at the setpoint change.
+"""
+
+class ServoState(TypedDict):
+  thetax: float
+  thetay: float
+  targetx: float
+  targety: float
+
+
+class Checkpoint(TypedDict):
+  t: float
+  steps: int # steps taken so far, fixed steps land on steps * dt
+  dt_next: float # the step an adaptive run proposes next
+  phase: str
+  state: StateVector # (13,) copy of the design's kinematic state
+  elements: Dict[int, Tuple[float, NDArray]] # mass and (4,) attitude of every dynamic element by id
+  servos: ServoState
+  events: List[EventRecord] # every event located up to t
+  rng: Tuple[Any, ...] # `np.random.get_state()`
+
+
+def takeCheckpoint(design: Design, tvc: ThrustVectorController, t: float, steps: int = 0, dt_next: float = None, phase: str = "rail", events: List[EventRecord] = None) -> Checkpoint:
+  """ copies the state of a flight at t, nothing in the checkpoint is shared with the design or the thrust vectoring unit
+
+  Args:
+      design (Design): the vehicle
+      tvc (ThrustVectorController): its thrust vectoring unit
+      t (float): time of the state
+      steps (int, optional): steps taken up to t. Defaults to 0.
+      dt_next (float, optional): the next adaptive step. Defaults to None.
+      phase (str, optional): flight phase at t. Defaults to "rail".
+      events (List[EventRecord], optional): the events located so far. Defaults to None, none.
+
+  Returns:
+      Checkpoint: the snapshot
+  """
+  return Checkpoint(
+    t=t,
+    steps=steps,
+    dt_next=dt_next,
+    phase=phase,
+    state=design.get_state(),
+    elements={id: (float(element.mass), np.array(attitude.q)) for id, (element, attitude, _) in design.dynamic_elements.items()},
+    servos=ServoState(thetax=tvc.thetax, thetay=tvc.thetay, targetx=tvc.targetx, targety=tvc.targety),
+    events=list(events) if events is not None else [],
+    rng=np.random.get_state()
+  )
+
+def restoreCheckpoint(checkpoint: Checkpoint, design: Design, tvc: ThrustVectorController) -> None:
+  """ puts the design, the thrust vectoring unit and the numpy random state back to a checkpoint, in the active `Precision.py` dtype
+
+  Args:
+      checkpoint (Checkpoint): the snapshot
+      design (Design): the vehicle the checkpoint was taken from, or an identical build of it
+      tvc (ThrustVectorController): its thrust vectoring unit
+
+  Raises:
+      KeyError: a dynamic element of the checkpoint is not in the design
+  """
+  for id in checkpoint["elements"].keys():
+    if id not in design.dynamic_elements.keys():
+      raise KeyError(f"Dynamic element ids must be one of {list(design.dynamic_elements.keys())}")
+
+  design.set_state(state=checkpoint["state"])
+  for id, (mass, attitude) in checkpoint["elements"].items():
+    design.dynamic_elements[id][0].mass = mass
+    design.dynamic_elements[id][1] = Quaternion.from_buffer(asPrecision(np.array(attitude)))
+
+  servos = checkpoint["servos"]
+  tvc.thetax, tvc.thetay = servos["thetax"], servos["thetay"]
+  tvc.updateSetpoint(targetx=servos["targetx"], targety=servos["targety"])
+  np.random.set_state(checkpoint["rng"])
+
+def forkCheckpoint(checkpoint: Checkpoint, copies: int) -> List[Checkpoint]:
+  """ independent copies of a checkpoint, each one can be changed, e.g. its servo targets, and resumed without touching the others
+
+  Args:
+      checkpoint (Checkpoint): the snapshot
+      copies (int): number of forks
+
+  Returns:
+      List[Checkpoint]: the forks
+  """
+  return [copy.deepcopy(checkpoint) for _ in range(copies)]
+
+
+__all__ = [
+  "ServoState",
+  "Checkpoint",
+  "takeCheckpoint",
+  "restoreCheckpoint",
+  "forkCheckpoint"
+]
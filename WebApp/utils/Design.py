@@ -3,6 +3,8 @@ from typing import Union, TypedDict, List, Dict, Tuple
 from numpy.typing import NDArray
 from Element import *
 from Quaternion import *
+from Precision import *
+from State import *
 
 X, Y, Z = 0, 1, 2
 ELEMENT, QUATERNION, VECTOR = 0, 1, 2
@@ -26,20 +28,23 @@ class Design:
     ########################################## NOTE #############################################
     # these values are strictly measured from the inertial world frame, not from the design frame
     # i.e. no rotation corrections are needed on each iteration
-    self.r: Vector = Vector(elements=(0, 0, 0))
-    self.v: Vector = Vector(elements=(0, 0, 0))
-    self.q: Quaternion = Quaternion(default=True)
-    self.omega: Vector = Vector(elements=(0, 0, 0))
+    # r, v, q and omega are views into the one flat state array, see `State.py`
+    self.state: StateVector = packState(r=(0, 0, 0), v=(0, 0, 0), q=(1, 0, 0, 0), omega=(0, 0, 0))
+    self.r: Vector
+    self.v: Vector
+    self.q: Quaternion
+    self.omega: Vector
+    self.r, self.v, self.q, self.omega = stateViews(state=self.state)
     #############################################################################################
     
     static_elements = parts_list["Static"]
     relative_attitudes: List[Quaternion] = [Quaternion(default=True) for _ in range(len(static_elements))]
-    relative_positions: List[NDArray] = [np.array([0, 0, 0], dtype=np.float32) for _ in range(len(static_elements))]
+    relative_positions: List[NDArray] = [np.array([0, 0, 0], dtype=getPrecision()) for _ in range(len(static_elements))]
     self.static_elements: Dict[int, List[Element, Quaternion, NDArray]] = {_element.id: [_element, _relative_attitude, _relative_position] for (_element, _relative_attitude, _relative_position) in zip(static_elements, relative_attitudes, relative_positions)}
     
     dynamic_elements = parts_list["Dynamic"]
     relative_attitudes: List[Quaternion] = [Quaternion(default=True) for _ in range(len(dynamic_elements))]
-    relative_positions: List[NDArray] = [np.array([0, 0, 0], dtype=np.float32) for _ in range(len(dynamic_elements))]
+    relative_positions: List[NDArray] = [np.array([0, 0, 0], dtype=getPrecision()) for _ in range(len(dynamic_elements))]
     self.dynamic_elements: Dict[int, List[Element, Quaternion, NDArray]] = {_element.id: [_element, _relative_attitude, _relative_position] for (_element, _relative_attitude, _relative_position) in zip(dynamic_elements, relative_attitudes, relative_positions)}
     
     self.parts = [*parts_list["Static"], *parts_list["Dynamic"]]
@@ -82,6 +87,42 @@ class Design:
       else:
         raise AssertionError("Cannot manually control static element placement after consolidating the state")
     
+  def set_precision(self) -> None:
+    """ recasts every array held by the design, its elements and its kinematic state to the active `Precision.py` dtype
+    """
+    self.state = asPrecision(self.state)
+    # point the existing state objects at the recast array so references held elsewhere stay live
+    self.r.v, self.v.v, self.q.q, self.omega.v = (self.state[part] for part in (POSITION, VELOCITY, ATTITUDE, ANGULAR_VELOCITY))
+    self.q._R = None
+    
+    for part in self.parts:
+      part.I = asPrecision(part.I)
+    
+    element_groups = [self.dynamic_elements] if self.reduced else [self.static_elements, self.dynamic_elements]
+    for elements in element_groups:
+      for placement in elements.values():
+        placement[QUATERNION].set_precision()
+        placement[VECTOR] = asPrecision(placement[VECTOR])
+    
+    if self.reduced:
+      self.static_mass = getPrecision()(self.static_mass)
+      self.static_CG = asPrecision(self.static_CG)
+      self.static_inertia_tensor = asPrecision(self.static_inertia_tensor)
+  
+  def get_state(self) -> StateVector:
+    """ a copy of the kinematic state as one flat array, see `State.py`
+    """
+    return self.state.copy()
+  
+  def set_state(self, state: StateVector) -> None:
+    """ overwrites the kinematic state in place from a flat array, see `State.py`
+
+    Args:
+        state (StateVector): (13,) position, velocity, attitude and angular velocity
+    """
+    self.state[:] = state
+    self.q._R = None
+  
   def step(self, dt: float):
     for dynamic_element in self.dynamic_elements.values():
       element, _, _ = dynamic_element
@@ -90,8 +131,8 @@ class Design:
   def consolidate_static_elements(self) -> None:
     self.reduced = True
     mass = 0.0
-    center_of_mass = np.array([0, 0, 0], dtype=np.float32)
-    inertia_tensor = np.array([[0, 0, 0], [0, 0, 0], [0, 0, 0]], dtype=np.float32)
+    center_of_mass = np.array([0, 0, 0], dtype=getPrecision())
+    inertia_tensor = np.array([[0, 0, 0], [0, 0, 0], [0, 0, 0]], dtype=getPrecision())
     ΔI: NDArray
     for static_element in self.static_elements.values():
       static_element: Tuple[Element, Quaternion, NDArray]
@@ -109,6 +150,7 @@ class Design:
       
       center_of_mass += element.mass * position
     
+    mass = getPrecision()(mass)
     center_of_mass /= mass
     
     self.static_mass = mass
@@ -117,46 +159,59 @@ class Design:
     
     del self.static_elements
   
-  def consolidate_dynamic_elements(self) -> Tuple[float, NDArray, NDArray]:
+  def consolidate_dynamic_elements(self, lookahead: float = 0.0) -> Tuple[float, NDArray, NDArray]:
     """ sums temporary physical quantities from the dynamic elements at a current time step t
 
+    Args:
+        lookahead (float, optional): seconds past the last `step()` to project the mass depletion to, without changing any element.
+          Defaults to 0.0.
+
     Returns:
         Tuple[float, NDArray, NDArray]: mass, center_of_gravity vector, and inertia tensor contributions
     """
     mass = 0.0
-    center_of_mass = np.array([0, 0, 0], dtype=np.float32)
-    inertia_tensor = np.array([[0, 0, 0], [0, 0, 0], [0, 0, 0]], dtype=np.float32)
+    center_of_mass = np.array([0, 0, 0], dtype=getPrecision())
+    inertia_tensor = np.array([[0, 0, 0], [0, 0, 0], [0, 0, 0]], dtype=getPrecision())
     ΔI: NDArray
     for dynamic_element in self.dynamic_elements.values():
       dynamic_element: Tuple[Element, Quaternion, NDArray]
       element, attitude, position = dynamic_element
       
-      mass += element.mass
+      element_mass = element.mass
+      if lookahead > 0.0 and element.is_dynamic() and element_mass > element.min_mass:
+        element_mass = max(element.min_mass, element_mass - element.m_dot * lookahead)
+      
+      mass += element_mass
       
       R = attitude.get_rotation_matrix()
       # rotate I
       ΔI = np.matmul(np.matmul(R, element.I), R.T)
       # then translate I
-      ΔI += self.shift_inertia_tensor(position=position, mass=element.mass)
+      ΔI += self.shift_inertia_tensor(position=position, mass=element_mass)
       
       inertia_tensor += ΔI
       
-      center_of_mass += element.mass * position
+      center_of_mass += element_mass * position
     
+    mass = getPrecision()(mass)
     center_of_mass /= mass
     
     return (mass, center_of_mass, inertia_tensor)
   
-  def get_temporary_properties(self) -> Tuple[float, NDArray, NDArray]:
-    """ gets current properties of the design including all transformations necessary to represent the current state
+  def get_body_properties(self, lookahead: float = 0.0) -> Tuple[float, NDArray, NDArray]:
+    """ gets the mass properties of the design in its own body frame, independent of the current attitude
+
+    Args:
+        lookahead (float, optional): seconds past the last `step()` to evaluate the mass depletion at, used by multi-stage integrators to
+          sample the mass inside a step. Defaults to 0.0.
 
     Returns:
-        Tuple[float, NDArray, NDArray]: total mass, total cg coordinate in design coordinate frame, and total inertia tensor about the cg given prior
+        Tuple[float, NDArray, NDArray]: total mass, total cg coordinate in design coordinate frame, and total inertia tensor in body axes
     """
     if not self.reduced:
       self.consolidate_static_elements()
     
-    dynamic_mass, dynamic_CG, dynamic_inertia_tensor = self.consolidate_dynamic_elements()
+    dynamic_mass, dynamic_CG, dynamic_inertia_tensor = self.consolidate_dynamic_elements(lookahead=lookahead)
     
     true_cg = (dynamic_mass * dynamic_CG + self.static_mass * self.static_CG) / (dynamic_mass + self.static_mass)
     
@@ -164,10 +219,20 @@ class Design:
     
     true_inertia_tensor += self.shift_inertia_tensor(position=true_cg, mass=dynamic_mass + self.static_mass)
     
+    return (dynamic_mass + self.static_mass, true_cg, true_inertia_tensor)
+  
+  def get_temporary_properties(self) -> Tuple[float, NDArray, NDArray]:
+    """ gets current properties of the design including all transformations necessary to represent the current state
+
+    Returns:
+        Tuple[float, NDArray, NDArray]: total mass, total cg coordinate in design coordinate frame, and total inertia tensor about the cg given prior
+    """
+    mass, true_cg, true_inertia_tensor = self.get_body_properties()
+    
     rotation_matrix = self.q.get_rotation_matrix()
     true_inertia_tensor = np.matmul(np.matmul(rotation_matrix, true_inertia_tensor), rotation_matrix.T) # need to rotate from body frame to inertial frame, so R.T@I@R is the correct order of operations
     
-    return (dynamic_mass + self.static_mass, true_cg, true_inertia_tensor)
+    return (mass, true_cg, true_inertia_tensor)
   
   def shift_inertia_tensor(self, position: NDArray, mass: float) -> NDArray:
     """ parallel axis theorem - translate all inertia tensor elements to new position
@@ -190,7 +255,7 @@ class Design:
       [IXX, IXY, IXZ],
       [IYX, IYY, IYZ],
       [IZX, IZY, IZZ]
-    ], dtype=np.float32)
+    ], dtype=getPrecision())
   
   def __getitem__(self, key: int):
     if key in self.dynamic_elements.keys():
@@ -207,9 +272,9 @@ class Design:
     if not self.reduced:
       if isinstance(key, int) and isinstance(value, Element) and key not in self.dynamic_elements.keys() and key not in self.static_elements.keys():
         if value.is_dynamic():
-          self.dynamic_elements[key] = (value, Quaternion(default=True), np.array([0, 0, 0], dtype=np.float32))
+          self.dynamic_elements[key] = [value, Quaternion(default=True), np.array([0, 0, 0], dtype=getPrecision())]
         else:
-          self.static_elements[key] = (value, Quaternion(default=True), np.array([0, 0, 0], dtype=np.float32))
+          self.static_elements[key] = [value, Quaternion(default=True), np.array([0, 0, 0], dtype=getPrecision())]
       else:
         raise Exception("Tried to setitem for `Design()` object, but not supported")
   
@@ -221,15 +286,22 @@ class Design:
     return _str
   
   def __iadd__(self, other):
+    """ adopts a new kinematic state, a `KinematicData` dict or a flat `State.py` array, copied into the design's own buffers
+
+    - the simulation loop integrates `design.r`, `design.v`, `design.q` and `design.omega` in place, in which case this is a no-op
+    """
     if isinstance(other, dict):
       r, v, q, omega = other.values()
-      self.r += r
-      self.v += v
-      self.q = q
-      self.omega = omega
+      self.r.copy_from(r)
+      self.v.copy_from(v)
+      self.q.copy_from(q)
+      self.omega.copy_from(omega)
+      return self
+    elif isinstance(other, np.ndarray) and other.shape == (STATE_SIZE,):
+      self.set_state(state=other)
       return self
     else:
-      raise ValueError("Addition on `Design()` object only defined on `KinematicData` types")
+      raise ValueError("Addition on `Design()` object only defined on `KinematicData` types and flat state arrays")
   
 
 __all__ = [
@@ -0,0 +1,313 @@
+from __future__ import annotations
+from typing import Tuple, Sequence, Callable, TypedDict
+import math
+import numpy as np
+from numpy.typing import NDArray
+
+from Kernels import *
+from Design import *
+from ThrustVectorController import *
+from State import *
+
+"""
+Description: Dynamics.py evaluates the equations of motion of the vehicle at an arbitrary state, which is what a multi-stage integrator
+needs: thrust, mass properties and torque are sampled again at every stage instead of once per step. `RigidBodyDynamics.evaluate()` reads
+the design and the thrust vectoring unit but never changes them, the mass depletion and the servo ramp inside a step are projected with a
+lookahead. The Euler equation is solved in body axes, where the inertia tensor is constant, which equals the
+inertial frame form α = I⁻¹ (M - ω x I ω) used before with I rotated into the inertial frame. `derivative()` is the same physics as a
+pure function of time, a flat `State.py` array and a `VehicleParams` snapshot of the vehicle, for solvers that should not touch the objects.
+"""
+
+# inertial frame gravitational acceleration in m/s^2
+GRAVITY = (0.0, 0.0, -9.8)
+
+# lumped quadratic drag, 0.5 rho Cd A with the body tube cross section, the drag force is -DRAG_FACTOR |v| v
+DRAG_FACTOR = 0.5 * 0.99 * 0.2 * np.pi * 0.037 ** 2
+
+# the launch pad holds the vehicle up against gravity and ground contact is ignored for this long after ignition, in seconds
+PAD_HOLD_TIME = 1.0
+
+# mass, cg in body coordinates, body axes inertia tensor and its inverse, see `RigidBodyDynamics.mass_properties()`
+MassProperties = Tuple[float, NDArray, Matrix3, Matrix3]
+
+
+def angularAcceleration(q: Sequence[float], omega: Sequence[float], M: Sequence[float], I: Matrix3, I_inverse: Matrix3) -> Vector3:
+  """ Euler's equation in body axes, I_b α_b = M_b - ω_b x I_b ω_b, with the result rotated into the inertial frame
+
+  Args:
+      q (Sequence[float]): (4,) unit attitude quaternion
+      omega (Sequence[float]): (3,) angular velocity in the inertial frame
+      M (Sequence[float]): (3,) moment about the cg in body coordinates
+      I (Matrix3): body axes inertia tensor as rows
+      I_inverse (Matrix3): its inverse
+
+  Returns:
+      Vector3: inertial angular acceleration
+  """
+  w = quatRotate(q=(q[0], -q[1], -q[2], -q[3]), v=omega)
+  gyroscopic = cross3(a=w, b=matVec3(A=I, b=w))
+  return quatRotate(q=q, v=matVec3(A=I_inverse, b=(M[0] - gyroscopic[0], M[1] - gyroscopic[1], M[2] - gyroscopic[2])))
+
+def linearAcceleration(v: Sequence[float], F: Sequence[float], mass: float, gravity: Vector3, drag_factor: float, on_pad: bool) -> Vector3:
+  """ Newton's second law with gravity, drag and the launch pad
+
+  Args:
+      v (Sequence[float]): (3,) inertial velocity
+      F (Sequence[float]): (3,) thrust in the inertial frame
+      mass (float): vehicle mass in kg
+      gravity (Vector3): gravitational acceleration in the inertial frame
+      drag_factor (float): quadratic drag coefficient in kg/m
+      on_pad (bool): the vehicle still sits on the pad, which cancels any downward acceleration
+
+  Returns:
+      Vector3: inertial acceleration
+  """
+  drag = drag_factor * norm3(a=v) # lazy man's drag force
+  g = gravity
+  a = [(F[0] - drag * v[0]) / mass + g[0], (F[1] - drag * v[1]) / mass + g[1], (F[2] - drag * v[2]) / mass + g[2]]
+
+  if on_pad and a[2] < 0.0:
+    # if the motor is starting, do not acclerate down because of gravity - the earth provides a normal force equal to gravity
+    a[2] = 0.0
+
+  return tuple(a)
+
+
+class VehicleParams(TypedDict):
+  t0: float # time of the snapshot, the masses and servo angles below hold at t0
+  static_mass: float
+  static_cg: NDArray # (3,)
+  static_inertia_tensor: NDArray # (3, 3) about the body origin
+  masses: NDArray # (K,) dynamic element masses
+  min_masses: NDArray # (K,)
+  m_dots: NDArray # (K,) mass flow rates in kg/s
+  positions: NDArray # (K, 3) element positions in body coordinates
+  inertia_tensors: NDArray # (K, 3, 3) element inertia tensors rotated into body axes, at their attitudes at t0
+  thrust: Callable[[float], float] # thrust curve, see `MotorManager.getThrust()`
+  offset: NDArray # (3,) motor position in body coordinates
+  thetax: float
+  thetay: float
+  targetx: float
+  targety: float
+  max_speed: float # servo rate limit in rad/s
+  gravity: Vector3
+  drag_factor: float
+  pad_hold_time: float
+
+
+class RigidBodyDynamics:
+  def __init__(self, design: Design, tvc: ThrustVectorController, gravity: Vector3 = GRAVITY, drag_factor: float = DRAG_FACTOR, pad_hold_time: float = PAD_HOLD_TIME):
+    """ the right hand side of the 6 degree of freedom equations of motion for one vehicle
+
+    Args:
+        design (Design): a completed and consolidated vehicle design
+        tvc (ThrustVectorController): its thrust vectoring unit
+        gravity (Vector3, optional): gravitational acceleration in the inertial frame. Defaults to GRAVITY.
+        drag_factor (float, optional): quadratic drag coefficient in kg/m. Defaults to DRAG_FACTOR.
+        pad_hold_time (float, optional): seconds after ignition during which the pad cancels any downward acceleration. Defaults to PAD_HOLD_TIME.
+    """
+    self.design = design
+    self.tvc = tvc
+    self.gravity = tuple(gravity)
+    self.drag_factor = drag_factor
+    self.pad_hold_time = pad_hold_time
+
+  def mass_properties(self, h: float = 0.0) -> MassProperties:
+    """ the mass properties h seconds past the design's last `step()`, the expensive part of an evaluation that a multi-rate step reuses
+
+    Args:
+        h (float, optional): offset into the step in seconds. Defaults to 0.0.
+
+    Returns:
+        MassProperties: mass, cg in body coordinates, the body axes inertia tensor and its inverse as rows
+    """
+    mass, cg, inertia_tensor = self.design.get_body_properties(lookahead=h)
+    I = inertia_tensor.tolist()
+    return (float(mass), cg, I, inverse3(A=I))
+
+  def angular_acceleration(self, q: Sequence[float], omega: Sequence[float], M: Sequence[float], properties: MassProperties) -> Vector3:
+    """ Euler's equation in body axes, I_b α_b = M_b - ω_b x I_b ω_b, with the result rotated into the inertial frame
+
+    Args:
+        q (Sequence[float]): (4,) unit attitude quaternion
+        omega (Sequence[float]): (3,) angular velocity in the inertial frame
+        M (Sequence[float]): (3,) moment about the cg in body coordinates
+        properties (MassProperties): see `mass_properties()`
+
+    Returns:
+        Vector3: inertial angular acceleration
+    """
+    _, _, I, I_inverse = properties
+    return angularAcceleration(q=q, omega=omega, M=M, I=I, I_inverse=I_inverse)
+
+  def linear_acceleration(self, t: float, v: Sequence[float], F: Sequence[float], mass: float) -> Vector3:
+    """ Newton's second law with gravity, drag and the launch pad
+
+    Args:
+        t (float): time at the start of the step in seconds, which decides the pad hold
+        v (Sequence[float]): (3,) inertial velocity
+        F (Sequence[float]): (3,) thrust in the inertial frame
+        mass (float): vehicle mass in kg
+
+    Returns:
+        Vector3: inertial acceleration
+    """
+    # the pad is a discrete mode decided at the start of the step, so no stage of a step sees it switch halfway
+    return linearAcceleration(v=v, F=F, mass=mass, gravity=self.gravity, drag_factor=self.drag_factor, on_pad=t < self.pad_hold_time)
+
+  def is_torque_free(self, t: float) -> bool:
+    """ whether no external moment acts from time t on, true after burnout since thrust is the only moment modeled
+
+    Args:
+        t (float): time in seconds
+
+    Returns:
+        bool: True once the motor has burnt out
+    """
+    return t >= self.tvc.burn_time
+
+  def evaluate(self, t: float, h: float, v: Sequence[float], q: Sequence[float], omega: Sequence[float], window: float = 0.0) -> Tuple[Vector3, Vector3, NDArray]:
+    """ linear and angular acceleration of the vehicle in the given state
+
+    Args:
+        t (float): time at the start of the step in seconds, the design's masses were last stepped here and it sets the pad hold
+        h (float): offset of the stage into the step in seconds, the state is evaluated at time t + h
+        v (Sequence[float]): (3,) inertial velocity
+        q (Sequence[float]): (4,) attitude quaternion rotating body axes into the inertial frame
+        omega (Sequence[float]): (3,) angular velocity in the inertial frame
+        window (float, optional): the thrust is averaged over [t + h, t + h + window] instead of sampled at t + h, which makes a single
+          evaluation step deliver the exact impulse of the thrust curve. Defaults to 0.0.
+
+    Returns:
+        Tuple[Vector3, Vector3, NDArray]: inertial acceleration a, inertial angular acceleration α, and the cg in body coordinates
+    """
+    properties = self.mass_properties(h=h)
+    mass, cg, _, _ = properties
+    F, M = self.tvc.getThrustVector(t=t + h, cg=cg, lookahead=h, window=window)
+
+    qw, qx, qy, qz = q
+    scale = 1.0 / math.sqrt(qw * qw + qx * qx + qy * qy + qz * qz) # stage attitudes are only unit to within the renormalization tolerance
+    q = (qw * scale, qx * scale, qy * scale, qz * scale)
+
+    alpha = self.angular_acceleration(q=q, omega=omega, M=M.tolist(), properties=properties)
+    a = self.linear_acceleration(t=t, v=v, F=quatRotate(q=q, v=F.tolist()), mass=mass)
+
+    return (a, alpha, cg)
+
+
+def shiftInertiaTensors(positions: NDArray, masses: NDArray) -> NDArray:
+  """ parallel axis terms m (|p|² 1 - p pᵀ) for many point masses at once, the same terms as `Design.shift_inertia_tensor()`
+
+  Args:
+      positions (NDArray): (..., 3) positions
+      masses (NDArray): (...) masses
+
+  Returns:
+      NDArray: (..., 3, 3) inertia tensor contributions
+  """
+  positions = np.asarray(positions, dtype=np.float64)
+  masses = np.asarray(masses, dtype=np.float64)
+  squared = np.einsum("...i,...i->...", positions, positions)
+  outer = np.einsum("...i,...j->...ij", positions, positions)
+  return masses[..., None, None] * (squared[..., None, None] * np.identity(3) - outer)
+
+def vehicleParams(dynamics: RigidBodyDynamics, t0: float = 0.0) -> VehicleParams:
+  """ a snapshot of everything `derivative()` needs, taken from the live objects of a vehicle
+
+  Args:
+      dynamics (RigidBodyDynamics): the vehicle's equations of motion, its design and thrust vectoring unit are read but not changed
+      t0 (float, optional): the current time, i.e. the time the design's masses were last stepped to. Defaults to 0.0.
+
+  Returns:
+      VehicleParams: the snapshot
+  """
+  design, tvc = dynamics.design, dynamics.tvc
+  if not design.reduced:
+    design.consolidate_static_elements()
+
+  elements = list(design.dynamic_elements.values())
+  rotations = [attitude.get_rotation_matrix() for _, attitude, _ in elements]
+  return VehicleParams(
+    t0=t0,
+    static_mass=float(design.static_mass),
+    static_cg=np.array(design.static_CG, dtype=np.float64),
+    static_inertia_tensor=np.array(design.static_inertia_tensor, dtype=np.float64),
+    masses=np.array([element.mass for element, _, _ in elements], dtype=np.float64),
+    min_masses=np.array([element.min_mass for element, _, _ in elements], dtype=np.float64),
+    m_dots=np.array([element.m_dot for element, _, _ in elements], dtype=np.float64),
+    positions=np.array([position for _, _, position in elements], dtype=np.float64).reshape(-1, 3),
+    inertia_tensors=np.array([R @ element.I @ R.T for (element, _, _), R in zip(elements, rotations)], dtype=np.float64).reshape(-1, 3, 3),
+    thrust=tvc.motor_manager.getThrust,
+    offset=np.array(tvc.offset, dtype=np.float64),
+    thetax=tvc.thetax,
+    thetay=tvc.thetay,
+    targetx=tvc.targetx,
+    targety=tvc.targety,
+    max_speed=tvc.max_speed,
+    gravity=dynamics.gravity,
+    drag_factor=dynamics.drag_factor,
+    pad_hold_time=dynamics.pad_hold_time
+  )
+
+def paramsMassProperties(t: float, params: VehicleParams) -> MassProperties:
+  """ mass properties of a `VehicleParams` snapshot at time t, with the mass flow projected from t0 as in `Design.get_body_properties()`
+  """
+  masses = params["masses"]
+  if t > params["t0"]:
+    masses = np.maximum(params["min_masses"], masses - params["m_dots"] * (t - params["t0"]))
+  mass = float(masses.sum()) + params["static_mass"]
+  cg = (masses @ params["positions"] + params["static_mass"] * params["static_cg"]) / mass
+  inertia_tensor = (
+    params["inertia_tensors"].sum(axis=0) + shiftInertiaTensors(positions=params["positions"], masses=masses).sum(axis=0)
+    + params["static_inertia_tensor"] + shiftInertiaTensors(positions=cg, masses=mass)
+  )
+  I = inertia_tensor.tolist()
+  return (mass, cg, I, inverse3(A=I))
+
+def derivative(t: float, state: StateVector, params: VehicleParams) -> StateVector:
+  """ the time derivative (v, a, q', α) of a flat state, a pure function of its arguments
+
+  - thrust comes from the thrust curve at t, the servo angles follow their rate limited ramp from t0 and the masses their mass flow from t0
+  - the pad holds the vehicle while t < pad_hold_time, so a multi-stage solver should put a step boundary there
+
+  Args:
+      t (float): time in seconds, at or after params["t0"]
+      state (StateVector): (13,) position, velocity, attitude and angular velocity
+      params (VehicleParams): see `vehicleParams()`
+
+  Returns:
+      StateVector: (13,) derivative in the same layout, with q' = ω q / 2
+  """
+  _, v, q, omega = unpackState(state=state)
+  qw, qx, qy, qz = q
+  scale = 1.0 / math.sqrt(qw * qw + qx * qx + qy * qy + qz * qz)
+  q = (qw * scale, qx * scale, qy * scale, qz * scale)
+
+  mass, cg, I, I_inverse = paramsMassProperties(t=t, params=params)
+  epsilon = params["max_speed"] * max(0.0, t - params["t0"])
+  thetax = rampServo(theta=params["thetax"], target=params["targetx"], epsilon=epsilon)
+  thetay = rampServo(theta=params["thetay"], target=params["targety"], epsilon=epsilon)
+  F, M = thrustVector(thrust=float(params["thrust"](t)), thetax=thetax, thetay=thetay, offset=params["offset"].tolist(), cg=cg.tolist())
+
+  a = linearAcceleration(
+    v=v, F=quatRotate(q=q, v=F), mass=mass, gravity=params["gravity"], drag_factor=params["drag_factor"], on_pad=t < params["pad_hold_time"]
+  )
+  alpha = angularAcceleration(q=q, omega=omega, M=M, I=I, I_inverse=I_inverse)
+  q_dot = tuple(0.5 * component for component in quatMultiply(q1=(0.0, *omega), q2=q))
+  return packState(r=v, v=a, q=q_dot, omega=alpha, out=np.empty_like(state))
+
+
+__all__ = [
+  "GRAVITY",
+  "DRAG_FACTOR",
+  "PAD_HOLD_TIME",
+  "MassProperties",
+  "angularAcceleration",
+  "linearAcceleration",
+  "RigidBodyDynamics",
+  "VehicleParams",
+  "shiftInertiaTensors",
+  "vehicleParams",
+  "paramsMassProperties",
+  "derivative"
+]
@@ -4,6 +4,7 @@ from numpy.typing import NDArray
 from abc import ABC, abstractmethod
 
 from Quaternion import *
+from Precision import *
 
 """
 Author: Logan Wright
@@ -84,7 +85,7 @@ class Cylinder(Element):
       [IXX, 0, 0],
       [0, IYY, 0],
       [0, 0, IZZ]
-    ], dtype=np.float32)
+    ], dtype=getPrecision())
 
 
 class Tube(Element):
@@ -112,7 +113,7 @@ class Tube(Element):
       [IXX, 0, 0],
       [0, IYY, 0],
       [0, 0, IZZ]
-    ], dtype=np.float32)
+    ], dtype=getPrecision())
 
 
 class Cone(Element):
@@ -132,7 +133,7 @@ class Cone(Element):
       [IXX, 0, 0],
       [0, IYY, 0],
       [0, 0, IZZ]
-    ], dtype=np.float32)
+    ], dtype=getPrecision())
 
 # this is not quite right... will fix the element type below later on but this comment will serve as the reminder
 class HollowCone(Element):
@@ -168,7 +169,7 @@ class HollowCone(Element):
       [IXX, 0, 0],
       [0, IYY, 0],
       [0, 0, IZZ]
-    ], dtype=np.float32)
+    ], dtype=getPrecision())
     
     IXX = IYY = self.mass * (self.inner_height ** 2 + 4 * self.inner_radius ** 2) * 3 / 80
     IZZ = self.mass * self.inner_radius ** 2 * 3 / 10
@@ -176,7 +177,7 @@ class HollowCone(Element):
       [IXX, 0, 0],
       [0, IYY, 0],
       [0, 0, IZZ]
-    ], dtype=np.float32)
+    ], dtype=getPrecision())
     
     self.I = np.copy(outer_I - inner_I)
     
@@ -196,7 +197,7 @@ def reduceMass(element: Element, dt: float) -> bool:
   """
   if element.is_dynamic():
     if element.mass > element.min_mass:
-      element.mass -= element.m_dot * dt
+      element.mass = max(element.min_mass, element.mass - element.m_dot * dt) # a long step must not burn past the empty motor
       return True
     else:
       return True
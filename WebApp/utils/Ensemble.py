@@ -0,0 +1,306 @@
+from __future__ import annotations
+from typing import Tuple, List, Dict, Callable, TypedDict
+from time import time
+import numpy as np
+import pandas as pd
+from numpy.typing import NDArray
+
+from QuaternionBatch import *
+from ExponentialMap import *
+from MotorManager import *
+from Dynamics import *
+from State import *
+from Events import *
+
+"""
+Description: Ensemble.py flies N independent vehicles in lockstep as one (N, 13) state array, for Monte Carlo dispersions and parameter
+sweeps that would otherwise call `simulationLoop()` once per vehicle. Every step the thrust lookup, the mass properties, the servo ramp, the
+force and moment sums and the quaternion update each run as a single NumPy operation over all members still flying, so the Python cost of
+a step is paid once for the whole ensemble. Members are snapshots taken with `vehicleParams()`, which keeps the motor attitude fixed at its
+value at the snapshot. A member leaves the ensemble at ground impact, located inside its step like the `groundImpactEvent()`.
+"""
+
+
+class EnsembleParams(TypedDict):
+  t0: float
+  static_mass: NDArray # (N,)
+  static_cg: NDArray # (N, 3)
+  static_inertia_tensor: NDArray # (N, 3, 3)
+  masses: NDArray # (N, K)
+  min_masses: NDArray # (N, K)
+  m_dots: NDArray # (N, K)
+  positions: NDArray # (N, K, 3)
+  inertia_tensors: NDArray # (N, K, 3, 3)
+  thrust_times: NDArray # (N, P) thrust curves, see `batchImpulse()`
+  thrusts: NDArray # (N, P)
+  thrust_slopes: NDArray # (N, P)
+  impulses: NDArray # (N, P)
+  offset: NDArray # (N, 3)
+  thetax: NDArray # (N,)
+  thetay: NDArray # (N,)
+  targetx: NDArray # (N,)
+  targety: NDArray # (N,)
+  max_speed: NDArray # (N,)
+  gravity: NDArray # (3,) shared by every member
+  drag_factor: NDArray # (N,)
+  pad_hold_time: float # shared, the pad is a mode of the whole ensemble
+
+
+class EnsembleResult(TypedDict):
+  summary: pd.DataFrame # one row per member: apogee, its time, impact time and impact position
+  times: NDArray # (M,) recorded times, empty unless recorded
+  states: NDArray # (M, N, 13) recorded states, frozen members keep their impact state, empty unless recorded
+  simulation_time: float # loop wall time in seconds
+
+
+def ensembleParams(members: List[RigidBodyDynamics], t0: float = 0.0) -> EnsembleParams:
+  """ stacks the snapshots of N vehicles, see `vehicleParams()`
+
+  Args:
+      members (List[RigidBodyDynamics]): the vehicles, each with its own design and thrust vectoring unit
+      t0 (float, optional): the time the snapshots are taken at. Defaults to 0.0.
+
+  Raises:
+      ValueError: the vehicles do not all have the same number of dynamic elements, or disagree on the pad hold or gravity
+
+  Returns:
+      EnsembleParams: the stacked snapshot
+  """
+  snapshots = [vehicleParams(dynamics=dynamics, t0=t0) for dynamics in members]
+  if len({len(snapshot["masses"]) for snapshot in snapshots}) != 1:
+    raise ValueError("Every ensemble member needs the same number of dynamic elements")
+  if len({snapshot["pad_hold_time"] for snapshot in snapshots}) != 1 or len({tuple(snapshot["gravity"]) for snapshot in snapshots}) != 1:
+    raise ValueError("Every ensemble member needs the same pad hold time and gravity")
+
+  tables = [dynamics.tvc.motor_manager.getThrustTable() for dynamics in members]
+  P = max(len(table[0]) for table in tables)
+  pad = lambda values: np.concatenate((values, np.full(P - len(values), values[-1]))) # the last slope is already 0
+
+  stack = lambda key: np.array([snapshot[key] for snapshot in snapshots], dtype=np.float64)
+  return EnsembleParams(
+    t0=t0,
+    static_mass=stack("static_mass"),
+    static_cg=stack("static_cg"),
+    static_inertia_tensor=stack("static_inertia_tensor"),
+    masses=stack("masses"),
+    min_masses=stack("min_masses"),
+    m_dots=stack("m_dots"),
+    positions=stack("positions"),
+    inertia_tensors=stack("inertia_tensors"),
+    thrust_times=np.array([pad(times) for times, _, _, _, _ in tables]),
+    thrusts=np.array([pad(thrusts) for _, thrusts, _, _, _ in tables]),
+    thrust_slopes=np.array([pad(slopes) for _, _, slopes, _, _ in tables]),
+    impulses=np.array([pad(impulses) for _, _, _, impulses, _ in tables]),
+    offset=stack("offset"),
+    thetax=stack("thetax"),
+    thetay=stack("thetay"),
+    targetx=stack("targetx"),
+    targety=stack("targety"),
+    max_speed=stack("max_speed"),
+    gravity=np.array(snapshots[0]["gravity"], dtype=np.float64),
+    drag_factor=stack("drag_factor"),
+    pad_hold_time=snapshots[0]["pad_hold_time"]
+  )
+
+def selectMembers(params: EnsembleParams, index: NDArray) -> EnsembleParams:
+  """ the snapshot of a subset of the members, shared entries are kept as they are
+  """
+  shared = ["t0", "gravity", "pad_hold_time"]
+  return EnsembleParams(**{key: value if key in shared else value[index] for key, value in params.items()})
+
+def batchServoAngles(t: float, params: EnsembleParams) -> Tuple[NDArray, NDArray]:
+  """ `rampServo()` for every member, the servos move from their t0 angles toward the targets at their maximum speed
+  """
+  epsilon = params["max_speed"] * max(0.0, t - params["t0"])
+  angles = []
+  for theta, target in ((params["thetax"], params["targetx"]), (params["thetay"], params["targety"])):
+    error = target - theta
+    angles.append(np.where(np.abs(error) > epsilon, theta + np.sign(error) * epsilon, target))
+  return (angles[0], angles[1])
+
+def batchMassProperties(t: float, params: EnsembleParams) -> Tuple[NDArray, NDArray, NDArray, NDArray]:
+  """ `paramsMassProperties()` for every member
+
+  Returns:
+      Tuple[NDArray, NDArray, NDArray, NDArray]: (N,) mass, (N, 3) cg, (N, 3, 3) inertia tensor and its inverse in body axes
+  """
+  masses = params["masses"]
+  if t > params["t0"]:
+    masses = np.maximum(params["min_masses"], masses - params["m_dots"] * (t - params["t0"]))
+  mass = masses.sum(axis=1) + params["static_mass"]
+  cg = (np.einsum("nk,nki->ni", masses, params["positions"]) + params["static_mass"][:, None] * params["static_cg"]) / mass[:, None]
+  inertia_tensor = (
+    params["inertia_tensors"].sum(axis=1) + shiftInertiaTensors(positions=params["positions"], masses=masses).sum(axis=1)
+    + params["static_inertia_tensor"] + shiftInertiaTensors(positions=cg, masses=mass)
+  )
+  return (mass, cg, inertia_tensor, np.linalg.inv(inertia_tensor))
+
+def batchDerivative(t: float, states: StateVector, params: EnsembleParams, on_pad: bool, window: float = 0.0) -> StateVector:
+  """ `derivative()` for every member in one pass
+
+  Args:
+      t (float): time in seconds
+      states (StateVector): (N, 13) states
+      params (EnsembleParams): the members, in the same order as the states
+      on_pad (bool): the pad hold applies, decided at the start of the step so no stage sees it switch
+      window (float, optional): the thrust is averaged over [t, t + window] instead of sampled at t, see `batchAverageThrust()`. Defaults to 0.0.
+
+  Returns:
+      StateVector: (N, 13) derivatives, with q' = ω q / 2
+  """
+  v, q, omega = states[:, VELOCITY], batchNormalize(qs=states[:, ATTITUDE]), states[:, ANGULAR_VELOCITY]
+  mass, cg, I, I_inverse = batchMassProperties(t=t, params=params)
+
+  # thrust vector of every gimballed motor, see `thrustVector()`
+  thetax, thetay = batchServoAngles(t=t, params=params)
+  thrust = batchAverageThrust(t=t, dt=window, times=params["thrust_times"], thrusts=params["thrusts"], slopes=params["thrust_slopes"], impulses=params["impulses"])
+  cosy = np.cos(thetay)
+  F = thrust[:, None] * np.stack((np.sin(thetay), -np.sin(thetax) * cosy, np.cos(thetax) * cosy), axis=1)
+  M = np.cross(params["offset"] - cg, F)
+
+  drag = params["drag_factor"] * np.linalg.norm(v, axis=1)
+  a = (batchRotateVector(qs=q, vs=F) - drag[:, None] * v) / mass[:, None] + params["gravity"]
+  if on_pad:
+    a[:, 2] = np.maximum(a[:, 2], 0.0)
+
+  # Euler's equation in body axes, see `angularAcceleration()`
+  w = batchRotateVector(qs=batchConjugate(qs=q), vs=omega)
+  gyroscopic = np.cross(w, np.einsum("nij,nj->ni", I, w))
+  alpha = batchRotateVector(qs=q, vs=np.einsum("nij,nj->ni", I_inverse, M - gyroscopic))
+
+  derivatives = np.empty_like(states)
+  derivatives[:, POSITION] = v
+  derivatives[:, VELOCITY] = a
+  derivatives[:, ATTITUDE] = 0.5 * batchHamiltonProduct(q1s=np.concatenate((np.zeros((len(q), 1)), omega), axis=1), q2s=q)
+  derivatives[:, ANGULAR_VELOCITY] = alpha
+  return derivatives
+
+def ensembleEulerStep(t: float, dt: float, states: StateVector, params: EnsembleParams, on_pad: bool) -> StateVector:
+  """ `eulerStep()` for every member: omega first, the attitude by the exponential map of the new omega, then r and v, with the thrust
+  averaged over the step
+  """
+  derivatives = batchDerivative(t=t, states=states, params=params, on_pad=on_pad, window=dt)
+  stepped = states + dt * derivatives
+  stepped[:, ATTITUDE] = batchNormalize(qs=batchHamiltonProduct(q1s=batchExpMap(phis=dt * stepped[:, ANGULAR_VELOCITY]), q2s=states[:, ATTITUDE]))
+  return stepped
+
+def ensembleRK4Step(t: float, dt: float, states: StateVector, params: EnsembleParams, on_pad: bool) -> StateVector:
+  """ `rk4Step()` for every member, the quaternion is renormalized at the end
+  """
+  k1 = batchDerivative(t=t, states=states, params=params, on_pad=on_pad)
+  k2 = batchDerivative(t=t + 0.5 * dt, states=states + 0.5 * dt * k1, params=params, on_pad=on_pad)
+  k3 = batchDerivative(t=t + 0.5 * dt, states=states + 0.5 * dt * k2, params=params, on_pad=on_pad)
+  k4 = batchDerivative(t=t + dt, states=states + dt * k3, params=params, on_pad=on_pad)
+  stepped = states + dt / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+  stepped[:, ATTITUDE] = batchNormalize(qs=stepped[:, ATTITUDE])
+  return stepped
+
+ENSEMBLE_INTEGRATORS: Dict[str, Callable[..., StateVector]] = {
+  "euler": ensembleEulerStep,
+  "rk4": ensembleRK4Step
+}
+
+def ensembleLoop(
+    members: List[RigidBodyDynamics],
+    dt: float = 1e-2,
+    t_final: float = 20.0,
+    integrator: str = "euler",
+    record: bool = False
+  ) -> EnsembleResult:
+  """ flies every member from its current state until it hits the ground or the time limit, all in lockstep
+
+  - apogee and ground impact of each member are located inside their steps, see `Events.py`
+
+  Args:
+      members (List[RigidBodyDynamics]): the vehicles, their designs hold the initial states and are not changed
+      dt (float, optional): small time step. Defaults to 1e-2.
+      t_final (float, optional): time limit in seconds. Defaults to 20.0.
+      integrator (str, optional): a key of `ENSEMBLE_INTEGRATORS`. Defaults to "euler".
+      record (bool, optional): keep the state of every member at every step. Defaults to False.
+
+  Returns:
+      EnsembleResult: the per member summary and the optional state history
+  """
+  if integrator in ENSEMBLE_INTEGRATORS.keys():
+    step = ENSEMBLE_INTEGRATORS[integrator]
+  else:
+    raise KeyError(f"Integrator must be one of {list(ENSEMBLE_INTEGRATORS.keys())}")
+
+  params = ensembleParams(members=members)
+  states = np.array([dynamics.design.get_state() for dynamics in members], dtype=np.float64)
+  N = len(members)
+  apogee, apogee_time = np.full(N, np.nan), np.full(N, np.nan)
+  impact_time, impact_position = np.full(N, np.nan), np.full((N, 3), np.nan)
+  apogee_event, ground_event = apogeeEvent(), groundImpactEvent(pad_hold_time=params["pad_hold_time"])
+
+  active = np.arange(N) # members still flying
+  flying = params
+  times, history = [], []
+  t = 0.0
+  n = 0
+
+  start = time()
+  while t < t_final and len(active) > 0:
+    n += 1
+    t_next = n * dt
+    previous = states[active]
+    stepped = step(t=t, dt=dt, states=previous, params=flying, on_pad=t < params["pad_hold_time"])
+
+    # crossings are rare, so the few members that have one are located one by one with the scalar event code
+    # both events are falling crossings of one state component, the vertical velocity and the altitude
+    for event, component in ((apogee_event, 5), (ground_event, 2)):
+      g0, g1 = previous[:, component], stepped[:, component]
+      crossed = event.crossed(g0=g0, g1=g1, t0=t)
+      for member in np.flatnonzero(crossed):
+        state0, state1 = unpackState(state=previous[member]), unpackState(state=stepped[member])
+        g = lambda τ: event.function(τ, interpolateState(t0=t, state0=state0, t1=t_next, state1=state1, t=τ))
+        t_event = locateCrossing(g=g, a=t, b=t_next, ga=g0[member], gb=g1[member])
+        event_state = interpolateState(t0=t, state0=state0, t1=t_next, state1=state1, t=t_event)
+        if event is apogee_event:
+          if not event_state[0][2] < apogee[active[member]]: # the highest of several local maxima
+            apogee[active[member]], apogee_time[active[member]] = event_state[0][2], t_event
+        else:
+          impact_time[active[member]] = t_event
+          impact_position[active[member]] = event_state[0]
+          stepped[member] = packState(*event_state, out=stepped[member])
+
+    states[active] = stepped
+    if record:
+      times.append(t_next)
+      history.append(states.copy())
+
+    landed = ~np.isnan(impact_time[active])
+    if landed.any():
+      active = active[~landed]
+      flying = selectMembers(params=params, index=active)
+    t = t_next
+
+  simulation_time = time() - start
+  summary = pd.DataFrame({
+    "apogee": apogee,
+    "apogee_time": apogee_time,
+    "impact_time": impact_time,
+    "impact_x": impact_position[:, 0],
+    "impact_y": impact_position[:, 1]
+  })
+  return EnsembleResult(
+    summary=summary,
+    times=np.array(times),
+    states=np.array(history) if record else np.empty((0, N, STATE_SIZE)),
+    simulation_time=simulation_time
+  )
+
+
+__all__ = [
+  "EnsembleParams",
+  "EnsembleResult",
+  "ensembleParams",
+  "selectMembers",
+  "batchServoAngles",
+  "batchMassProperties",
+  "batchDerivative",
+  "ensembleEulerStep",
+  "ensembleRK4Step",
+  "ENSEMBLE_INTEGRATORS",
+  "ensembleLoop"
+]
@@ -0,0 +1,227 @@
+from __future__ import annotations
+from typing import Tuple, List, Callable, TypedDict
+import numpy as np
+from numpy.typing import NDArray
+
+from Kernels import *
+from ExponentialMap import *
+from Integrator import *
+
+"""
+Description: Events.py finds the moments inside a step at which something happens to the flight, such as apogee or ground impact. An
+event is a scalar function g(t, state) that crosses zero, checked at the two ends of every step. When it changes sign the crossing is
+located to well below the step size by root finding on a cubic Hermite interpolant of the step, so apogee and landing come out exact even
+at a coarse dt. An event can end the run, where the state is rolled back to the crossing, or switch the flight phase.
+"""
+
+# length of the launch rail in meters, the vehicle is clear of it once this far from the pad
+RAIL_LENGTH = 1.0
+
+# crossings are located to within this many seconds
+EVENT_TOLERANCE = 1e-9
+
+RISING, FALLING, EITHER = 1, -1, 0
+
+
+class Event:
+  def __init__(self, name: str, function: Callable[[float, KinematicState], float], direction: int = EITHER, terminal: bool = False, phase: str = None, zero_start_after: float = None):
+    """ a zero crossing of a scalar function of the flight
+
+    Args:
+        name (str): label of the event in the event log
+        function (Callable[[float, KinematicState], float]): g(t, (r, v, q, omega)), the event happens where it crosses zero
+        direction (int, optional): RISING for a - to + crossing, FALLING for + to -, EITHER for both. Defaults to EITHER.
+        terminal (bool, optional): the run ends at the crossing. Defaults to False.
+        phase (str, optional): the flight phase entered at the crossing. Defaults to None, no phase change.
+        zero_start_after (float, optional): from this time on a step starting exactly at zero also counts once g moves off zero in the
+          event's direction, e.g. a vehicle sinking from the pad. Defaults to None, a start at zero never counts.
+
+    Raises:
+        ValueError: direction is not RISING, FALLING or EITHER
+    """
+    if direction not in [RISING, FALLING, EITHER]:
+      raise ValueError(f"Event direction must be one of {[RISING, FALLING, EITHER]}")
+    self.name = name
+    self.function = function
+    self.direction = direction
+    self.terminal = terminal
+    self.phase = phase
+    self.zero_start_after = zero_start_after
+
+  def crossed(self, g0: float | NDArray, g1: float | NDArray, t0: float = 0.0) -> bool | NDArray:
+    """ whether g went through zero in the event's direction between two values, a start exactly at zero only counts from
+    zero_start_after on. works elementwise on arrays of values as well
+
+    Args:
+        g0 (float | NDArray): value at the start of the step
+        g1 (float | NDArray): value at the end of the step
+        t0 (float, optional): start of the step. Defaults to 0.0.
+
+    Returns:
+        bool | NDArray: True for a crossing
+    """
+    rising = (g0 < 0.0) & (g1 >= 0.0)
+    falling = (g0 > 0.0) & (g1 <= 0.0)
+    if self.zero_start_after is not None and t0 >= self.zero_start_after:
+      rising = rising | ((g0 == 0.0) & (g1 > 0.0))
+      falling = falling | ((g0 == 0.0) & (g1 < 0.0))
+    if self.direction == RISING:
+      return rising
+    elif self.direction == FALLING:
+      return falling
+    else:
+      return rising | falling
+
+
+class EventRecord(TypedDict):
+  name: str
+  time: float
+  position: Vector3
+  velocity: Vector3
+  attitude: Quaternion4
+  omega: Vector3
+
+
+def apogeeEvent(terminal: bool = False) -> Event:
+  """ the top of the flight, where the vertical velocity turns negative
+  """
+  return Event(name="apogee", function=lambda t, state: state[1][2], direction=FALLING, terminal=terminal, phase="descent")
+
+def burnoutEvent(burn_time: float) -> Event:
+  """ the end of the thrust curve, see `MotorManager.burn_time`
+  """
+  return Event(name="burnout", function=lambda t, state: t - burn_time, direction=RISING, phase="coast")
+
+def railExitEvent(rail_length: float = RAIL_LENGTH) -> Event:
+  """ the vehicle leaves the launch rail, i.e. climbs rail_length along the vertical rail, a vehicle sinking below the pad never does
+  """
+  return Event(name="rail_exit", function=lambda t, state: state[0][2] - rail_length, direction=RISING, phase="free_flight")
+
+def groundImpactEvent(pad_hold_time: float = 0.0) -> Event:
+  """ the vehicle comes back down to the pad altitude, which ends the run
+
+  - a vehicle that never lifts off sits at exactly zero altitude, so once the pad lets go of it any step that ends below the pad ends the
+    run too, at the start of that step
+
+  Args:
+      pad_hold_time (float, optional): end of the pad hold, see `RigidBodyDynamics`. Defaults to 0.0.
+  """
+  return Event(name="ground_impact", function=lambda t, state: state[0][2], direction=FALLING, terminal=True, phase="landed", zero_start_after=pad_hold_time)
+
+def interpolateState(t0: float, state0: KinematicState, t1: float, state1: KinematicState, t: float) -> KinematicState:
+  """ the state at a time inside a step from the states at its two ends
+
+  - the position is the cubic Hermite interpolant with the velocities as slopes and the velocity is its derivative, so both match the ends
+  - the attitude integrates the linearly interpolated angular velocity and is corrected to meet q1, which keeps several turns per step
+    correct where a plain slerp would take the shortest path
+
+  Args:
+      t0 (float): start of the step
+      state0 (KinematicState): state at t0
+      t1 (float): end of the step
+      state1 (KinematicState): state at t1
+      t (float): the requested time, t0 <= t <= t1
+
+  Returns:
+      KinematicState: the interpolated state
+  """
+  h = t1 - t0
+  s = (t - t0) / h
+  r0, v0, q0, w0 = state0
+  r1, v1, q1, w1 = state1
+
+  h00, h10, h01, h11 = 2 * s**3 - 3 * s**2 + 1, s**3 - 2 * s**2 + s, -2 * s**3 + 3 * s**2, s**3 - s**2
+  d00, d10, d01, d11 = (6 * s**2 - 6 * s) / h, 3 * s**2 - 4 * s + 1, (-6 * s**2 + 6 * s) / h, 3 * s**2 - 2 * s
+  r = tuple(h00 * r0[k] + h10 * h * v0[k] + h01 * r1[k] + h11 * h * v1[k] for k in range(3))
+  v = tuple(d00 * r0[k] + d10 * v0[k] + d01 * r1[k] + d11 * v1[k] for k in range(3))
+  w = tuple(w0[k] + s * (w1[k] - w0[k]) for k in range(3))
+
+  def predicted(τ: float) -> Quaternion4:
+    # exp(∫ω) q0 with ω linear across the step
+    return quatMultiply(q1=expMap(phi=tuple(τ * w0[k] + 0.5 * τ * τ / h * (w1[k] - w0[k]) for k in range(3))).tolist(), q2=q0)
+
+  qh = predicted(τ=h)
+  correction = logMap(q=np.array(quatMultiply(q1=q1, q2=(qh[0], -qh[1], -qh[2], -qh[3]))))
+  q = quatMultiply(q1=expMap(phi=tuple(s * component for component in correction.tolist())).tolist(), q2=predicted(τ=t - t0))
+  return (r, v, q, w)
+
+def locateCrossing(g: Callable[[float], float], a: float, b: float, ga: float, gb: float, tolerance: float = EVENT_TOLERANCE) -> float:
+  """ root of g in [a, b] by the Illinois variant of regula falsi, given g(a) and g(b) of opposite sign or g(b) == 0
+
+  Args:
+      g (Callable[[float], float]): the function
+      a (float): left end
+      b (float): right end
+      ga (float): g(a)
+      gb (float): g(b)
+      tolerance (float, optional): width of the final bracket in seconds. Defaults to EVENT_TOLERANCE.
+
+  Returns:
+      float: the crossing time, the right end of the final bracket so the state is already past the crossing
+  """
+  side = 0
+  for _ in range(100):
+    if gb == 0.0 or b - a <= tolerance:
+      break
+    c = b - gb * (b - a) / (gb - ga)
+    c = min(max(c, a + 0.25 * tolerance), b - 0.25 * tolerance)
+    gc = g(c)
+    if (gc > 0.0) == (gb > 0.0) and gc != 0.0:
+      b, gb = c, gc
+      if side == -1:
+        ga *= 0.5
+      side = -1
+    else:
+      a, ga = c, gc
+      if side == 1:
+        gb *= 0.5
+      side = 1
+  return b
+
+def detectEvents(events: List[Event], t0: float, state0: KinematicState, t1: float, state1: KinematicState) -> List[Tuple[Event, float, KinematicState]]:
+  """ every event crossing inside one step, located and in time order
+
+  Args:
+      events (List[Event]): the events to check
+      t0 (float): start of the step
+      state0 (KinematicState): state at t0
+      t1 (float): end of the step
+      state1 (KinematicState): state at t1
+
+  Returns:
+      List[Tuple[Event, float, KinematicState]]: the event, its time and the state at that time, for each crossing
+  """
+  crossings = []
+  for event in events:
+    g0 = event.function(t0, state0)
+    g1 = event.function(t1, state1)
+    if event.crossed(g0=g0, g1=g1, t0=t0):
+      g = lambda t: event.function(t, interpolateState(t0=t0, state0=state0, t1=t1, state1=state1, t=t))
+      t_event = locateCrossing(g=g, a=t0, b=t1, ga=g0, gb=g1)
+      crossings.append((event, t_event, interpolateState(t0=t0, state0=state0, t1=t1, state1=state1, t=t_event)))
+  return sorted(crossings, key=lambda crossing: crossing[1])
+
+def eventRecord(event: Event, t: float, state: KinematicState) -> EventRecord:
+  """ the event log entry of a crossing
+  """
+  r, v, q, w = state
+  return EventRecord(name=event.name, time=t, position=tuple(r), velocity=tuple(v), attitude=tuple(q), omega=tuple(w))
+
+
+__all__ = [
+  "RAIL_LENGTH",
+  "EVENT_TOLERANCE",
+  "RISING",
+  "FALLING",
+  "EITHER",
+  "Event",
+  "EventRecord",
+  "apogeeEvent",
+  "burnoutEvent",
+  "railExitEvent",
+  "groundImpactEvent",
+  "interpolateState",
+  "locateCrossing",
+  "detectEvents",
+  "eventRecord"
+]
@@ -0,0 +1,148 @@
+from __future__ import annotations
+from typing import Sequence
+import math
+import numpy as np
+from numpy.typing import NDArray
+
+from Precision import *
+from Kernels import *
+
+"""
+Description: ExponentialMap.py maps between rotation vectors in so(3) and unit quaternions on S³. A rotation vector φ = θ n rotates by θ
+radians about the unit axis n, and its exponential is the unit quaternion (cos(θ / 2), sin(θ / 2) n). The logarithm is the inverse map,
+taken along the shortest path. Both directions switch to their Taylor series near θ = 0, so they stay smooth and exact to machine precision
+through zero rotation instead of snapping to the identity below a cutoff. Every function has a single input form working on a (3,) or (4,)
+array and a batched form working on (N, 3) or (N, 4) stacks.
+"""
+
+# below this rotation angle (radians) the closed forms lose digits to cancellation and the series are exact to double precision
+SERIES_THRESHOLD = 1e-2
+
+
+def expMap(phi: NDArray, out: NDArray = None) -> NDArray:
+  """ exponential of a rotation vector, i.e. the unit quaternion that rotates by |φ| about φ
+
+  Args:
+      phi (NDArray): (3,) rotation vector in radians
+      out (NDArray, optional): (4,) buffer to write the quaternion into. Defaults to None, a new array.
+
+  Returns:
+      NDArray: (4,) unit quaternion (w, x, y, z)
+  """
+  θ2 = float(phi[0] * phi[0] + phi[1] * phi[1] + phi[2] * phi[2])
+
+  if θ2 < SERIES_THRESHOLD * SERIES_THRESHOLD:
+    scalar = 1.0 - θ2 / 8.0 + θ2 * θ2 / 384.0
+    scale = 0.5 - θ2 / 48.0 + θ2 * θ2 / 3840.0
+  else:
+    θ = math.sqrt(θ2)
+    scalar = math.cos(θ / 2)
+    scale = math.sin(θ / 2) / θ
+
+  if out is None:
+    out = np.empty(4, dtype=getPrecision())
+  out[0] = scalar
+  np.multiply(phi, scale, out=out[1:])
+  return out
+
+def logMap(q: NDArray) -> NDArray:
+  """ logarithm of a unit quaternion, i.e. the rotation vector of the shortest rotation it represents
+
+  Args:
+      q (NDArray): (4,) unit quaternion (w, x, y, z)
+
+  Returns:
+      NDArray: (3,) rotation vector in radians with magnitude in [0, π]
+  """
+  qw = float(q[0])
+  u = q[1:]
+  if qw < 0.0:
+    # q and -q are the same rotation, the one with positive scalar part is the short way around
+    qw = -qw
+    u = -u
+
+  s2 = float(u[0] * u[0] + u[1] * u[1] + u[2] * u[2])
+
+  if s2 < SERIES_THRESHOLD * SERIES_THRESHOLD * qw * qw:
+    # 2 atan(s / w) / s expanded in powers of s / w
+    r2 = s2 / (qw * qw)
+    scale = 2.0 / qw * (1.0 - r2 / 3.0 + r2 * r2 / 5.0 - r2 * r2 * r2 / 7.0)
+  else:
+    s = math.sqrt(s2)
+    scale = 2.0 * math.atan2(s, qw) / s
+
+  return u * scale
+
+def dexpInverse(u: Sequence[float], omega: Sequence[float]) -> Vector3:
+  """ inverse of the differential of the exponential map, the rate of u that makes expMap(u) q0 turn at angular velocity ω
+
+  - the exact series is ω - [u, ω] / 2 + [u, [u, ω]] / 12 + ..., truncated after the third term, which is all a 4th order Runge-Kutta-Munthe-
+    Kaas step needs since u is O(dt). [u, ω] = u x ω for rotation vectors
+
+  Args:
+      u (Sequence[float]): (3,) rotation vector of the current stage relative to the start of the step
+      omega (Sequence[float]): (3,) angular velocity in the inertial frame
+
+  Returns:
+      Vector3: (3,) derivative of u
+  """
+  uxw = cross3(a=u, b=omega)
+  uxuxw = cross3(a=u, b=uxw)
+  return (
+    omega[0] - 0.5 * uxw[0] + uxuxw[0] / 12.0,
+    omega[1] - 0.5 * uxw[1] + uxuxw[1] / 12.0,
+    omega[2] - 0.5 * uxw[2] + uxuxw[2] / 12.0
+  )
+
+def batchExpMap(phis: NDArray) -> NDArray:
+  """ exponential of every rotation vector in the stack, see `expMap()`
+
+  Args:
+      phis (NDArray): (N, 3) rotation vectors in radians
+
+  Returns:
+      NDArray: (N, 4) unit quaternions
+  """
+  θ2 = np.sum(phis * phis, axis=-1, keepdims=True)
+  θ = np.sqrt(θ2)
+  small = θ < SERIES_THRESHOLD
+
+  with np.errstate(divide="ignore", invalid="ignore"):
+    scale = np.where(small, 0.5 - θ2 / 48.0 + θ2 * θ2 / 3840.0, np.sin(θ / 2) / θ)
+  scalar = np.where(small, 1.0 - θ2 / 8.0 + θ2 * θ2 / 384.0, np.cos(θ / 2))
+
+  return np.concatenate((scalar, scale * phis), axis=-1)
+
+def batchLogMap(qs: NDArray) -> NDArray:
+  """ logarithm of every unit quaternion in the stack, see `logMap()`
+
+  Args:
+      qs (NDArray): (N, 4) unit quaternions
+
+  Returns:
+      NDArray: (N, 3) rotation vectors in radians
+  """
+  sign = np.where(qs[..., :1] < 0.0, -1.0, 1.0)
+  qw = sign * qs[..., :1]
+  u = sign * qs[..., 1:]
+
+  s2 = np.sum(u * u, axis=-1, keepdims=True)
+  small = s2 < SERIES_THRESHOLD * SERIES_THRESHOLD * qw * qw
+
+  with np.errstate(divide="ignore", invalid="ignore"):
+    r2 = s2 / (qw * qw)
+    series = 2.0 / qw * (1.0 - r2 / 3.0 + r2 * r2 / 5.0 - r2 * r2 * r2 / 7.0)
+    s = np.sqrt(s2)
+    scale = np.where(small, series, 2.0 * np.arctan2(s, qw) / s)
+
+  return scale * u
+
+
+__all__ = [
+  "SERIES_THRESHOLD",
+  "expMap",
+  "logMap",
+  "dexpInverse",
+  "batchExpMap",
+  "batchLogMap"
+]
@@ -1,25 +1,72 @@
-from typing import Tuple
+from typing import Tuple, List, TypedDict, Dict, Callable
+import math
+from numpy.typing import NDArray
 from Quaternion import *
+from ExponentialMap import *
+from Kernels import *
+from Dynamics import *
+from TorqueFree import *
 import numpy as np
 
-def solver(omega: Vector, alpha: Vector, q: Quaternion, dt: float, display: bool = False, index: int = None) -> Tuple[Quaternion, Vector]:
-  """ A Runge-Kutta 4th order method to compute the next quaternion state given the angular velocity in the inertal frame
+# position, velocity, attitude quaternion and angular velocity as plain floats, the state a Runge-Kutta-Munthe-Kaas step works on
+KinematicState = Tuple[Vector3, Vector3, Quaternion4, Vector3]
+
+# one stage of a Runge-Kutta-Munthe-Kaas step: the rates of (r, v, omega, u), i.e. (v, a, alpha, dexpinv(u, omega)) at the stage
+Stage = Tuple[Vector3, Vector3, Vector3, Vector3]
+
+
+class ButcherTableau(TypedDict):
+  A: List[List[float]] # row i holds the i stage weights of stage i
+  b: List[float]
+  c: List[float]
+  e: List[float] # b minus the weights of the embedded lower order solution, empty when the method has none
+
+
+# classical 4th order Runge-Kutta, shared by the Euclidean states and the Lie algebra increment of the attitude
+RK4 = ButcherTableau(
+  A=[[], [0.5], [0.0, 0.5], [0.0, 0.0, 1.0]],
+  b=[1.0 / 6.0, 1.0 / 3.0, 1.0 / 3.0, 1.0 / 6.0],
+  c=[0.0, 0.5, 0.5, 1.0],
+  e=[]
+)
+
+# 3 stage, 3rd order Crouch-Grossman method, the attitude moves through a product of exponentials instead of one dexp corrected exponential
+CROUCH_GROSSMAN = ButcherTableau(
+  A=[[], [0.75], [119.0 / 216.0, 17.0 / 108.0]],
+  b=[13.0 / 51.0, -2.0 / 3.0, 24.0 / 17.0],
+  c=[0.0, 0.75, 17.0 / 24.0],
+  e=[]
+)
+
+# Bogacki-Shampine 3(2), 3rd order solution with an embedded 2nd order one for the error estimate
+BOGACKI_SHAMPINE = ButcherTableau(
+  A=[[], [0.5], [0.0, 0.75], [2.0 / 9.0, 1.0 / 3.0, 4.0 / 9.0]],
+  b=[2.0 / 9.0, 1.0 / 3.0, 4.0 / 9.0, 0.0],
+  c=[0.0, 0.5, 0.75, 1.0],
+  e=[2.0 / 9.0 - 7.0 / 24.0, 1.0 / 3.0 - 1.0 / 4.0, 4.0 / 9.0 - 1.0 / 3.0, -1.0 / 8.0]
+)
+
+def solver(omega: Vector, alpha: Vector, q: Quaternion, dt: float, display: bool = False, index: int = None, out: Quaternion = None) -> Tuple[Quaternion, Vector]:
+  """ A single explicit Euler step of omega followed by the exponential map of the new omega, the attitude update of `eulerStep()`
 
   Args:
-      omega (Vector): angular velocity in the inertial frame
+      omega (Vector): angular velocity in the inertial frame, updated in place
       alpha (Vector): angular acceleration vector in inertial frame
       q (Quaternion): a quaternion to accumulate a change dq due to omega
       dt (float): a small time step
       display (bool): choose to display the qFinal and omega_q. Defaults to False
       index (int): the iteration step number. Defaults to None
+      out (Quaternion, optional): quaternion to write the new attitude into, pass q itself to update it in place. Defaults to None
   
   Returns:
       Tuple[Quaternion, Vector]: new attitude quaternion q after infinitesimal rotation, and new omega after alpha integration
   """
-  omega += alpha * dt
+  omega.add_scaled(alpha, dt)
   
-  qFinal = hamiltonProduct(q1=exponentiateQuaternion(q=omega.extend_to_quaternion() * dt, ε=dt * 1e-3), q2=q)
-  qFinal.normalize()
+  wx, wy, wz = omega.v.tolist()
+  dq = Quaternion.from_buffer(expMap(phi=(wx * dt, wy * dt, wz * dt))) # rotation by |omega| dt about omega
+  qFinal = hamiltonProduct(q1=dq, q2=q, out=out)
+  qFinal.renormalize()
   
   if display:
     if index is not None:
@@ -29,7 +76,522 @@ def solver(omega: Vector, alpha: Vector, q: Quaternion, dt: float, display: bool
   
   return qFinal, omega
 
+def eulerStep(dynamics: RigidBodyDynamics, t: float, dt: float, r: Vector, v: Vector, q: Quaternion, omega: Vector) -> Tuple[Vector3, Vector3, NDArray]:
+  """ advances the full state by one explicit Euler step in place, omega first and the attitude with the updated omega, see `solver()`
+
+  - the thrust is averaged over the step from the cumulative impulse, so the step delivers the exact impulse of the thrust curve whatever dt
+
+  Args:
+      dynamics (RigidBodyDynamics): the equations of motion
+      t (float): time at the start of the step
+      dt (float): a small time step
+      r (Vector): inertial position, updated in place
+      v (Vector): inertial velocity, updated in place
+      q (Quaternion): attitude, updated in place
+      omega (Vector): inertial angular velocity, updated in place
+
+  Returns:
+      Tuple[Vector3, Vector3, NDArray]: acceleration, angular acceleration and cg evaluated at the start of the step
+  """
+  a, alpha, cg = dynamics.evaluate(t=t, h=0.0, v=v.v.tolist(), q=q.q.tolist(), omega=omega.v.tolist(), window=dt)
+  
+  solver(omega=omega, alpha=Vector.from_buffer(np.array(alpha, dtype=omega.v.dtype)), q=q, dt=dt, out=q)
+  r.add_scaled(v, dt)
+  v.add_scaled(Vector.from_buffer(np.array(a, dtype=v.v.dtype)), dt)
+  
+  return (a, alpha, cg)
+
+def semiImplicitEulerStep(dynamics: RigidBodyDynamics, t: float, dt: float, r: Vector, v: Vector, q: Quaternion, omega: Vector) -> Tuple[Vector3, Vector3, NDArray]:
+  """ advances the full state by one semi-implicit (symplectic) Euler step in place, the velocities first and the positions and attitude
+  with the updated velocities
+
+  - the thrust is averaged over the step as in `eulerStep()`
+
+  Args:
+      dynamics (RigidBodyDynamics): the equations of motion
+      t (float): time at the start of the step
+      dt (float): a small time step
+      r (Vector): inertial position, updated in place
+      v (Vector): inertial velocity, updated in place
+      q (Quaternion): attitude, updated in place
+      omega (Vector): inertial angular velocity, updated in place
+
+  Returns:
+      Tuple[Vector3, Vector3, NDArray]: acceleration, angular acceleration and cg evaluated at the start of the step
+  """
+  a, alpha, cg = dynamics.evaluate(t=t, h=0.0, v=v.v.tolist(), q=q.q.tolist(), omega=omega.v.tolist(), window=dt)
+  
+  solver(omega=omega, alpha=Vector.from_buffer(np.array(alpha, dtype=omega.v.dtype)), q=q, dt=dt, out=q)
+  v.add_scaled(Vector.from_buffer(np.array(a, dtype=v.v.dtype)), dt)
+  r.add_scaled(v, dt)
+  
+  return (a, alpha, cg)
+
+def weightedIncrements(stages: List[Stage], weights: List[float], dt: float) -> Stage:
+  """ dt times the weighted sum of the stage rates, i.e. the increments (dr, dv, domega, u) of one Runge-Kutta combination
+
+  Args:
+      stages (List[Stage]): the stages evaluated so far
+      weights (List[float]): one weight per stage, a row of a `ButcherTableau()`
+      dt (float): the step size
+
+  Returns:
+      Stage: increments of position, velocity, angular velocity and the attitude rotation vector
+  """
+  increments = [[0.0, 0.0, 0.0] for _ in range(4)]
+  for weight, stage in zip(weights, stages):
+    if weight != 0.0:
+      h = weight * dt
+      for increment, rate in zip(increments, stage):
+        increment[0] += h * rate[0]
+        increment[1] += h * rate[1]
+        increment[2] += h * rate[2]
+  return tuple(increments)
+
+def applyIncrements(state: KinematicState, increments: Stage) -> KinematicState:
+  """ moves a state by a set of increments, additively for r, v and omega and by the exponential map expMap(u) q0 for the attitude
+
+  Args:
+      state (KinematicState): state at the start of the step
+      increments (Stage): see `weightedIncrements()`
+
+  Returns:
+      KinematicState: the moved state
+  """
+  r0, v0, q0, w0 = state
+  dr, dv, dw, u = increments
+  return (
+    (r0[0] + dr[0], r0[1] + dr[1], r0[2] + dr[2]),
+    (v0[0] + dv[0], v0[1] + dv[1], v0[2] + dv[2]),
+    quatMultiply(q1=expMap(phi=u).tolist(), q2=q0),
+    (w0[0] + dw[0], w0[1] + dw[1], w0[2] + dw[2])
+  )
+
+def evaluateStage(dynamics: RigidBodyDynamics, t: float, h: float, state: KinematicState, u: Vector3) -> Tuple[Stage, Vector3, Vector3, NDArray]:
+  """ evaluates the equations of motion at one stage state
+
+  Args:
+      dynamics (RigidBodyDynamics): the equations of motion
+      t (float): time at the start of the step
+      h (float): offset of the stage into the step
+      state (KinematicState): the stage state
+      u (Vector3): rotation vector of the stage attitude relative to the start of the step
+
+  Returns:
+      Tuple[Stage, Vector3, Vector3, NDArray]: the stage rates, plus the acceleration, angular acceleration and cg for recording
+  """
+  _, v, q, w = state
+  a, alpha, cg = dynamics.evaluate(t=t, h=h, v=v, q=q, omega=w)
+  return ((v, a, alpha, dexpInverse(u=u, omega=w)), a, alpha, cg)
+
+def rkmkStages(dynamics: RigidBodyDynamics, t: float, dt: float, state: KinematicState, tableau: ButcherTableau, first: Stage) -> List[Stage]:
+  """ evaluates every stage of an explicit Runge-Kutta-Munthe-Kaas step
+
+  - position, velocity and angular velocity take ordinary Runge-Kutta stages. the attitude of every stage is expMap(u) q0, where the
+    rotation vector u lives in the Lie algebra and is integrated with the same weights through `dexpInverse()`, so q stays on the unit sphere
+  - thrust, mass properties, servo angles and torque are evaluated again at each stage
+
+  Args:
+      dynamics (RigidBodyDynamics): the equations of motion
+      t (float): time at the start of the step
+      dt (float): the step size
+      state (KinematicState): state at the start of the step
+      tableau (ButcherTableau): the method
+      first (Stage): the first stage, which does not depend on dt and is shared by retried steps
+
+  Returns:
+      List[Stage]: one entry per stage of the tableau
+  """
+  stages = [first]
+  for weights, c in zip(tableau["A"][1:], tableau["c"][1:]):
+    increments = weightedIncrements(stages=stages, weights=weights, dt=dt)
+    stage, _, _, _ = evaluateStage(dynamics=dynamics, t=t, h=c * dt, state=applyIncrements(state=state, increments=increments), u=increments[3])
+    stages.append(stage)
+  return stages
+
+def readState(r: Vector, v: Vector, q: Quaternion, omega: Vector) -> KinematicState:
+  """ copies the design's state buffers into plain floats
+  """
+  return (r.v.tolist(), v.v.tolist(), q.q.tolist(), omega.v.tolist())
+
+def writeState(state: KinematicState, r: Vector, v: Vector, q: Quaternion, omega: Vector) -> None:
+  """ writes a state back into the design's buffers in place
+  """
+  r.set_elements(state[0])
+  v.set_elements(state[1])
+  q.set_elements(state[2])
+  q.renormalize()
+  omega.set_elements(state[3])
+
+def rkmk4Step(dynamics: RigidBodyDynamics, t: float, dt: float, r: Vector, v: Vector, q: Quaternion, omega: Vector) -> Tuple[Vector3, Vector3, NDArray]:
+  """ advances the full state by one 4th order Runge-Kutta-Munthe-Kaas step in place, see `rkmkStages()`
+
+  Args:
+      dynamics (RigidBodyDynamics): the equations of motion
+      t (float): time at the start of the step
+      dt (float): a small time step
+      r (Vector): inertial position, updated in place
+      v (Vector): inertial velocity, updated in place
+      q (Quaternion): attitude, updated in place
+      omega (Vector): inertial angular velocity, updated in place
+
+  Returns:
+      Tuple[Vector3, Vector3, NDArray]: acceleration, angular acceleration and cg evaluated at the start of the step
+  """
+  state = readState(r=r, v=v, q=q, omega=omega)
+  first, a, alpha, cg = evaluateStage(dynamics=dynamics, t=t, h=0.0, state=state, u=(0.0, 0.0, 0.0))
+  stages = rkmkStages(dynamics=dynamics, t=t, dt=dt, state=state, tableau=RK4, first=first)
+  writeState(state=applyIncrements(state=state, increments=weightedIncrements(stages=stages, weights=RK4["b"], dt=dt)), r=r, v=v, q=q, omega=omega)
+  return (a, alpha, cg)
+
+def rk4Step(dynamics: RigidBodyDynamics, t: float, dt: float, r: Vector, v: Vector, q: Quaternion, omega: Vector) -> Tuple[Vector3, Vector3, NDArray]:
+  """ advances the full state by one classical Runge-Kutta 4 step in place, treating the quaternion as 4 free numbers with q' = ω q / 2
+
+  - the stage quaternions leave the unit sphere and the result is renormalized at the end, the baseline the Lie group methods improve on
+
+  Args:
+      dynamics (RigidBodyDynamics): the equations of motion
+      t (float): time at the start of the step
+      dt (float): a small time step
+      r (Vector): inertial position, updated in place
+      v (Vector): inertial velocity, updated in place
+      q (Quaternion): attitude, updated in place
+      omega (Vector): inertial angular velocity, updated in place
+
+  Returns:
+      Tuple[Vector3, Vector3, NDArray]: acceleration, angular acceleration and cg evaluated at the start of the step
+  """
+  r0, v0, q0, w0 = readState(r=r, v=v, q=q, omega=omega)
+  a1, alpha1, cg = dynamics.evaluate(t=t, h=0.0, v=v0, q=q0, omega=w0)
+  
+  # rates of (r, v, q, omega) at each stage
+  rates = [(v0, a1, tuple(0.5 * component for component in quatMultiply(q1=(0.0, *w0), q2=q0)), alpha1)]
+  for weights, c in zip(RK4["A"][1:], RK4["c"][1:]):
+    h = weights[-1] * dt # every classical RK4 stage leans on the previous stage only
+    _, dv, dq, dw = rates[-1]
+    v_ = tuple(x + h * dx for x, dx in zip(v0, dv))
+    q_ = tuple(x + h * dx for x, dx in zip(q0, dq))
+    w_ = tuple(x + h * dx for x, dx in zip(w0, dw))
+    a, alpha, _ = dynamics.evaluate(t=t, h=c * dt, v=v_, q=q_, omega=w_)
+    rates.append((v_, a, tuple(0.5 * component for component in quatMultiply(q1=(0.0, *w_), q2=q_)), alpha))
+  
+  r_, v_, q_, w_ = (
+    tuple(x + dt * sum(weight * rate[k][index] for weight, rate in zip(RK4["b"], rates)) for index, x in enumerate(x0))
+    for k, x0 in enumerate((r0, v0, q0, w0))
+  )
+  
+  r.set_elements(r_)
+  v.set_elements(v_)
+  q.set_elements(q_)
+  q.normalize()
+  omega.set_elements(w_)
+  return (a1, alpha1, cg)
+
+def crouchGrossmanStep(dynamics: RigidBodyDynamics, t: float, dt: float, r: Vector, v: Vector, q: Quaternion, omega: Vector) -> Tuple[Vector3, Vector3, NDArray]:
+  """ advances the full state by one 3rd order Crouch-Grossman step in place
+
+  - r, v and omega take ordinary Runge-Kutta stages, while every stage attitude is a product of exponentials of the earlier stage angular
+    velocities applied to q0, so no `dexpInverse()` correction is needed and q stays on the unit sphere
+
+  Args:
+      dynamics (RigidBodyDynamics): the equations of motion
+      t (float): time at the start of the step
+      dt (float): a small time step
+      r (Vector): inertial position, updated in place
+      v (Vector): inertial velocity, updated in place
+      q (Quaternion): attitude, updated in place
+      omega (Vector): inertial angular velocity, updated in place
+
+  Returns:
+      Tuple[Vector3, Vector3, NDArray]: acceleration, angular acceleration and cg evaluated at the start of the step
+  """
+  state = readState(r=r, v=v, q=q, omega=omega)
+  first, a, alpha, cg = evaluateStage(dynamics=dynamics, t=t, h=0.0, state=state, u=(0.0, 0.0, 0.0))
+  stages = [first]
+  
+  def exponentialProduct(weights: List[float]) -> Quaternion4:
+    # exp(dt a_ij ω_j) applied one after another, the latest stage acts last, i.e. from the left
+    _q = state[2]
+    for weight, stage in zip(weights, stages):
+      if weight != 0.0:
+        _q = quatMultiply(q1=expMap(phi=tuple(weight * dt * component for component in stage[3])).tolist(), q2=_q)
+    return _q
+  
+  for weights, c in zip(CROUCH_GROSSMAN["A"][1:], CROUCH_GROSSMAN["c"][1:]):
+    _, dv, dw, _ = weightedIncrements(stages=stages, weights=weights, dt=dt)
+    v_ = (state[1][0] + dv[0], state[1][1] + dv[1], state[1][2] + dv[2])
+    w_ = (state[3][0] + dw[0], state[3][1] + dw[1], state[3][2] + dw[2])
+    a_, alpha_, _ = dynamics.evaluate(t=t, h=c * dt, v=v_, q=exponentialProduct(weights=weights), omega=w_)
+    stages.append((v_, a_, alpha_, w_)) # the angular velocity itself takes the place of dexpinv(u, omega)
+  
+  dr, dv, dw, _ = weightedIncrements(stages=stages, weights=CROUCH_GROSSMAN["b"], dt=dt)
+  r0, v0, _, w0 = state
+  writeState(
+    state=(
+      (r0[0] + dr[0], r0[1] + dr[1], r0[2] + dr[2]),
+      (v0[0] + dv[0], v0[1] + dv[1], v0[2] + dv[2]),
+      exponentialProduct(weights=CROUCH_GROSSMAN["b"]),
+      (w0[0] + dw[0], w0[1] + dw[1], w0[2] + dw[2])
+    ),
+    r=r, v=v, q=q, omega=omega
+  )
+  return (a, alpha, cg)
+
+def multirateStep(
+    dynamics: RigidBodyDynamics,
+    t: float,
+    dt: float,
+    substeps: int,
+    r: Vector,
+    v: Vector,
+    q: Quaternion,
+    omega: Vector,
+    on_substep: Callable[[], None] = None
+  ) -> Tuple[Vector3, Vector3, NDArray]:
+  """ advances the full state in place by one slow translational step of dt, inside which the attitude and the servos take substeps of
+  dt / substeps
+
+  - the mass properties are evaluated once per slow step, at its midpoint, and shared by every substep
+  - each substep takes the thrust vector with the thrust averaged over the substep, an Euler step of omega and q as in `solver()` and moves
+    the servos with `tvc.step()`, so the caller must not step the thrust vectoring unit again for this step
+  - the translation uses the thrust averaged over the substeps in the inertial frame, with drag and the pad taken at the start of the step
+
+  Args:
+      dynamics (RigidBodyDynamics): the equations of motion
+      t (float): time at the start of the step
+      dt (float): the slow step size
+      substeps (int): number of attitude and servo steps per slow step
+      r (Vector): inertial position, updated in place
+      v (Vector): inertial velocity, updated in place
+      q (Quaternion): attitude, updated in place after every substep
+      omega (Vector): inertial angular velocity, updated in place after every substep
+      on_substep (Callable[[], None], optional): called after every substep, e.g. to exchange setpoints and attitudes with hardware in the
+        loop at the fast rate. Defaults to None.
+
+  Returns:
+      Tuple[Vector3, Vector3, NDArray]: acceleration, angular acceleration and cg evaluated at the start of the step
+  """
+  properties = dynamics.mass_properties(h=0.5 * dt)
+  mass, cg, _, _ = properties
+  h = dt / substeps
+  r0, v0, q_, w_ = readState(r=r, v=v, q=q, omega=omega)
+  
+  thrust = [0.0, 0.0, 0.0] # inertial thrust summed over the substeps
+  for k in range(substeps):
+    F, M = dynamics.tvc.getThrustVector(t=t + k * h, cg=cg, window=h)
+    F = quatRotate(q=q_, v=F.tolist())
+    thrust[0] += F[0]
+    thrust[1] += F[1]
+    thrust[2] += F[2]
+    
+    alpha_ = dynamics.angular_acceleration(q=q_, omega=w_, M=M.tolist(), properties=properties)
+    if k == 0:
+      alpha = alpha_
+    w_ = (w_[0] + h * alpha_[0], w_[1] + h * alpha_[1], w_[2] + h * alpha_[2])
+    q_ = quatMultiply(q1=expMap(phi=(w_[0] * h, w_[1] * h, w_[2] * h)).tolist(), q2=q_)
+    dynamics.tvc.step(dt=h)
+    
+    if on_substep is not None:
+      q.set_elements(q_)
+      omega.set_elements(w_)
+      on_substep()
+  
+  a = dynamics.linear_acceleration(t=t, v=v0, F=(thrust[0] / substeps, thrust[1] / substeps, thrust[2] / substeps), mass=mass)
+  writeState(
+    state=(
+      (r0[0] + dt * (v0[0] + 0.5 * dt * a[0]), r0[1] + dt * (v0[1] + 0.5 * dt * a[1]), r0[2] + dt * (v0[2] + 0.5 * dt * a[2])),
+      (v0[0] + dt * a[0], v0[1] + dt * a[1], v0[2] + dt * a[2]),
+      q_,
+      w_
+    ),
+    r=r, v=v, q=q, omega=omega
+  )
+  return (a, alpha, cg)
+
+def coastStep(dynamics: RigidBodyDynamics, t: float, dt: float, r: Vector, v: Vector, q: Quaternion, omega: Vector) -> Tuple[Vector3, Vector3, NDArray]:
+  """ advances a torque free, axisymmetric vehicle in place by a step of any size
+
+  - the attitude and angular velocity follow the closed form of `torqueFreeAttitude()`, so they are exact however large dt is
+  - with no thrust the translation only feels gravity and drag, which do not depend on the attitude, and takes a classical RK4 step
+
+  Args:
+      dynamics (RigidBodyDynamics): the equations of motion, `is_torque_free()` must hold at t
+      t (float): time at the start of the step
+      dt (float): the step size
+      r (Vector): inertial position, updated in place
+      v (Vector): inertial velocity, updated in place
+      q (Quaternion): attitude, updated in place
+      omega (Vector): inertial angular velocity, updated in place
+
+  Raises:
+      ValueError: the inertia tensor of the design is not axisymmetric
+
+  Returns:
+      Tuple[Vector3, Vector3, NDArray]: acceleration, angular acceleration and cg evaluated at the start of the step
+  """
+  properties = dynamics.mass_properties(h=0.5 * dt)
+  mass, cg, I, _ = properties
+  symmetry = axisymmetricInertia(I=I)
+  if symmetry is None:
+    raise ValueError("Closed form coasting needs an axisymmetric inertia tensor")
+  
+  r0, v0, q0, w0 = readState(r=r, v=v, q=q, omega=omega)
+  no_thrust = (0.0, 0.0, 0.0)
+  alpha = dynamics.angular_acceleration(q=q0, omega=w0, M=no_thrust, properties=properties)
+  q_, w_ = torqueFreeAttitude(q=q0, omega=w0, symmetry=symmetry, dt=dt)
+  
+  # classical RK4 on (r, v), the rate of r is the stage velocity itself
+  velocities = [v0]
+  accelerations = [dynamics.linear_acceleration(t=t, v=v0, F=no_thrust, mass=mass)]
+  for weights in RK4["A"][1:]:
+    h = weights[-1] * dt
+    velocities.append(tuple(x + h * dx for x, dx in zip(v0, accelerations[-1])))
+    accelerations.append(dynamics.linear_acceleration(t=t, v=velocities[-1], F=no_thrust, mass=mass))
+  
+  r_ = tuple(x + dt * sum(weight * rate[axis] for weight, rate in zip(RK4["b"], velocities)) for axis, x in enumerate(r0))
+  v_ = tuple(x + dt * sum(weight * rate[axis] for weight, rate in zip(RK4["b"], accelerations)) for axis, x in enumerate(v0))
+  writeState(state=(r_, v_, q_, w_), r=r, v=v, q=q, omega=omega)
+  return (accelerations[0], alpha, cg)
+
+
+# every fixed step integration scheme `simulationLoop()` can run, all sharing the signature of `eulerStep()`
+INTEGRATORS: Dict[str, Callable[..., Tuple[Vector3, Vector3, NDArray]]] = {
+  "euler": eulerStep,
+  "semi_implicit_euler": semiImplicitEulerStep,
+  "rk4": rk4Step,
+  "rkmk4": rkmk4Step,
+  "crouch_grossman": crouchGrossmanStep
+}
+
+
+class StepSizeController:
+  def __init__(self, rtol: float = 1e-6, atol: float = 1e-6, min_dt: float = 1e-5, max_dt: float = 0.1, safety: float = 0.9, order: int = 3):
+    """ chooses step sizes from an embedded error estimate, keeping the scaled RMS error of every step at or below 1
+
+    Args:
+        rtol (float, optional): relative tolerance on every state component. Defaults to 1e-6.
+        atol (float, optional): absolute tolerance, in meters, m/s, rad/s and rad for the attitude. Defaults to 1e-6.
+        min_dt (float, optional): smallest step, taken even when it fails the tolerance. Defaults to 1e-5.
+        max_dt (float, optional): largest step. Defaults to 0.1.
+        safety (float, optional): fraction of the optimal step actually proposed. Defaults to 0.9.
+        order (int, optional): order of the embedded lower order solution plus one. Defaults to 3.
+    """
+    self.rtol = rtol
+    self.atol = atol
+    self.min_dt = min_dt
+    self.max_dt = max_dt
+    self.safety = safety
+    self.exponent = -1.0 / order
+  
+  def error_norm(self, state0: KinematicState, state1: KinematicState, errors: Stage) -> float:
+    """ scaled RMS norm of the error estimate over position, velocity, angular velocity and attitude
+
+    Args:
+        state0 (KinematicState): state at the start of the step
+        state1 (KinematicState): proposed state at the end of the step
+        errors (Stage): difference between the two embedded solutions, the attitude error as a rotation vector
+
+    Returns:
+        float: at most 1 when the step meets the tolerances
+    """
+    total = 0.0
+    for k in (0, 1, 3):
+      for axis in range(3):
+        scale = self.atol + self.rtol * max(abs(state0[k][axis]), abs(state1[k][axis]))
+        total += (errors[k][axis] / scale) ** 2
+    scale = self.atol + self.rtol # the attitude lives on the unit sphere
+    for axis in range(3):
+      total += (errors[3][axis] / scale) ** 2
+    return math.sqrt(total / 12.0)
+  
+  def propose(self, dt: float, error: float) -> float:
+    """ the next step size after a step of size dt produced the given error norm
+
+    Args:
+        dt (float): the step just attempted
+        error (float): its `error_norm()`
+
+    Returns:
+        float: the proposed step, growing at most 5 times and shrinking at most 5 times, within [min_dt, max_dt]
+    """
+    factor = 5.0 if error == 0.0 else min(5.0, max(0.2, self.safety * error ** self.exponent))
+    return min(self.max_dt, max(self.min_dt, dt * factor))
+
+
+def adaptiveStep(
+    dynamics: RigidBodyDynamics,
+    controller: StepSizeController,
+    t: float,
+    dt: float,
+    t_limit: float,
+    r: Vector,
+    v: Vector,
+    q: Quaternion,
+    omega: Vector
+  ) -> Tuple[Vector3, Vector3, NDArray, float, float]:
+  """ advances the full state in place by one error controlled Bogacki-Shampine 3(2) Runge-Kutta-Munthe-Kaas step
+
+  - a step that fails the tolerances is retried with a smaller one, and no step runs past `t_limit` so discontinuities such as thrust
+    curve breakpoints always fall on a step boundary
+
+  Args:
+      dynamics (RigidBodyDynamics): the equations of motion
+      controller (StepSizeController): tolerances and step bounds
+      t (float): time at the start of the step
+      dt (float): the step size to try first
+      t_limit (float): the step ends at or before this time
+      r (Vector): inertial position, updated in place
+      v (Vector): inertial velocity, updated in place
+      q (Quaternion): attitude, updated in place
+      omega (Vector): inertial angular velocity, updated in place
+
+  Returns:
+      Tuple[Vector3, Vector3, NDArray, float, float]: acceleration, angular acceleration and cg at the start of the step, the step size
+        taken, and the step size to try next
+  """
+  state = readState(r=r, v=v, q=q, omega=omega)
+  first, a, alpha, cg = evaluateStage(dynamics=dynamics, t=t, h=0.0, state=state, u=(0.0, 0.0, 0.0))
+  
+  while True:
+    h = min(dt, t_limit - t)
+    stages = rkmkStages(dynamics=dynamics, t=t, dt=h, state=state, tableau=BOGACKI_SHAMPINE, first=first)
+    proposal = applyIncrements(state=state, increments=weightedIncrements(stages=stages, weights=BOGACKI_SHAMPINE["b"], dt=h))
+    errors = weightedIncrements(stages=stages, weights=BOGACKI_SHAMPINE["e"], dt=h)
+    error = controller.error_norm(state0=state, state1=proposal, errors=errors)
+    if error <= 1.0 or h <= controller.min_dt:
+      break
+    dt = controller.propose(dt=h, error=error)
+  
+  writeState(state=proposal, r=r, v=v, q=q, omega=omega)
+  # a step cut short by t_limit says nothing about the step size the dynamics allow, so it may not shrink the next one
+  dt_next = controller.propose(dt=h, error=error)
+  if h < dt:
+    dt_next = max(dt_next, dt)
+  return (a, alpha, cg, h, dt_next)
+
 
 __all__ = [
-  "solver"
+  "KinematicState",
+  "Stage",
+  "ButcherTableau",
+  "RK4",
+  "CROUCH_GROSSMAN",
+  "BOGACKI_SHAMPINE",
+  "solver",
+  "eulerStep",
+  "semiImplicitEulerStep",
+  "weightedIncrements",
+  "applyIncrements",
+  "evaluateStage",
+  "rkmkStages",
+  "readState",
+  "writeState",
+  "rkmk4Step",
+  "rk4Step",
+  "crouchGrossmanStep",
+  "multirateStep",
+  "coastStep",
+  "INTEGRATORS",
+  "StepSizeController",
+  "adaptiveStep"
 ]
\ No newline at end of file
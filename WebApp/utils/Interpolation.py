@@ -0,0 +1,223 @@
+from __future__ import annotations
+from typing import TypedDict, Tuple
+import numpy as np
+from numpy.typing import NDArray
+from pandas import DataFrame
+
+from QuaternionBatch import *
+from ExponentialMap import *
+from Trajectory import frameChannel
+
+"""
+Description: Interpolation.py resamples a recorded trajectory onto any time grid. Attitudes are interpolated on the unit sphere with batched
+SLERP, or SQUAD when a smooth angular velocity across samples matters, and positions and velocities get matching linear or cubic Hermite
+interpolation. This lets a simulation run at the coarse time step its accuracy allows and still produce output at a video frame rate or
+a flight computer log rate without re-running `simulationLoop()` at that rate.
+"""
+
+
+class ResampledTrajectory(TypedDict):
+  time: NDArray
+  position: NDArray
+  velocity: NDArray
+  attitude: NDArray
+
+
+def makeContinuous(qs: QuaternionArray) -> QuaternionArray:
+  """ flips the sign of quaternions so that consecutive samples lie in the same hemisphere, q and -q are the same attitude
+
+  Args:
+      qs (QuaternionArray): (N, 4) attitude history
+
+  Returns:
+      QuaternionArray: (N, 4) history with no sign jumps between neighbours
+  """
+  dots = np.sum(qs[1:] * qs[:-1], axis=-1)
+  signs = np.concatenate(([1.0], np.cumprod(np.where(dots < 0.0, -1.0, 1.0))))
+  return qs * signs[:, np.newaxis]
+
+def batchSlerp(q0s: QuaternionArray, q1s: QuaternionArray, τ: NDArray) -> QuaternionArray:
+  """ spherical linear interpolation between matching rows of q0s and q1s, along the shortest arc
+
+  Args:
+      q0s (QuaternionArray): (N, 4) unit quaternions at τ = 0
+      q1s (QuaternionArray): (N, 4) unit quaternions at τ = 1
+      τ (NDArray): (N,) interpolation fractions
+
+  Returns:
+      QuaternionArray: (N, 4) interpolated unit quaternions
+  """
+  phis = batchLogMap(qs=batchHamiltonProduct(q1s=batchConjugate(qs=q0s), q2s=q1s))
+  return batchHamiltonProduct(q1s=q0s, q2s=batchExpMap(phis=np.asarray(τ)[..., np.newaxis] * phis))
+
+def squadControlPoints(qs: QuaternionArray) -> QuaternionArray:
+  """ inner control points s_i = q_i exp(-(log(q_i* q_i+1) + log(q_i* q_i-1)) / 4) of a SQUAD spline, end points are their own controls
+
+  Args:
+      qs (QuaternionArray): (N, 4) continuous attitude history, see `makeContinuous()`
+
+  Returns:
+      QuaternionArray: (N, 4) control points
+  """
+  controls = np.array(qs, copy=True)
+  if len(qs) > 2:
+    inverses = batchConjugate(qs=qs[1:-1])
+    forward = batchLogMap(qs=batchHamiltonProduct(q1s=inverses, q2s=qs[2:]))
+    backward = batchLogMap(qs=batchHamiltonProduct(q1s=inverses, q2s=qs[:-2]))
+    controls[1:-1] = batchHamiltonProduct(q1s=qs[1:-1], q2s=batchExpMap(phis=-(forward + backward) / 4))
+  return controls
+
+def batchSquad(q0s: QuaternionArray, q1s: QuaternionArray, s0s: QuaternionArray, s1s: QuaternionArray, τ: NDArray) -> QuaternionArray:
+  """ spherical quadrangle interpolation, a C1 continuous attitude spline through the samples
+
+  Args:
+      q0s (QuaternionArray): (N, 4) unit quaternions at τ = 0
+      q1s (QuaternionArray): (N, 4) unit quaternions at τ = 1
+      s0s (QuaternionArray): (N, 4) control points of q0s, see `squadControlPoints()`
+      s1s (QuaternionArray): (N, 4) control points of q1s
+      τ (NDArray): (N,) interpolation fractions
+
+  Returns:
+      QuaternionArray: (N, 4) interpolated unit quaternions
+  """
+  return batchSlerp(q0s=batchSlerp(q0s=q0s, q1s=q1s, τ=τ), q1s=batchSlerp(q0s=s0s, q1s=s1s, τ=τ), τ=2 * τ * (1 - τ))
+
+def locateSamples(times: NDArray, new_times: NDArray) -> Tuple[NDArray, NDArray, NDArray]:
+  """ finds the recorded interval that holds each requested time, requests outside the record are clamped to its ends
+
+  Args:
+      times (NDArray): (N,) increasing sample times
+      new_times (NDArray): (M,) requested times
+
+  Returns:
+      Tuple[NDArray, NDArray, NDArray]: left sample index, interval length, and fraction τ in [0, 1] for every requested time
+  """
+  new_times = np.clip(new_times, times[0], times[-1])
+  index = np.clip(np.searchsorted(times, new_times, side="right") - 1, 0, len(times) - 2)
+  h = times[index + 1] - times[index]
+  τ = (new_times - times[index]) / h
+  return (index, h, τ)
+
+def resampleAttitude(times: NDArray, qs: QuaternionArray, new_times: NDArray, method: str = "squad") -> QuaternionArray:
+  """ resamples an attitude history onto a new time grid
+
+  Args:
+      times (NDArray): (N,) increasing sample times
+      qs (QuaternionArray): (N, 4) attitude history
+      new_times (NDArray): (M,) requested times
+      method (str, optional): "slerp" or "squad". Defaults to "squad".
+
+  Returns:
+      QuaternionArray: (M, 4) attitudes at the requested times
+  """
+  qs = makeContinuous(qs=batchNormalize(qs=qs))
+  index, _, τ = locateSamples(times=times, new_times=new_times)
+
+  if method == "slerp":
+    return batchSlerp(q0s=qs[index], q1s=qs[index + 1], τ=τ)
+  elif method == "squad":
+    controls = squadControlPoints(qs=qs)
+    return batchSquad(q0s=qs[index], q1s=qs[index + 1], s0s=controls[index], s1s=controls[index + 1], τ=τ)
+  else:
+    raise KeyError("Attitude interpolation method must be one of ['slerp', 'squad']")
+
+def resampleVectors(times: NDArray, values: NDArray, new_times: NDArray, derivatives: NDArray = None, method: str = "cubic") -> NDArray:
+  """ resamples a vector history onto a new time grid
+
+  Args:
+      times (NDArray): (N,) increasing sample times
+      values (NDArray): (N, 3) vector history, e.g. positions
+      new_times (NDArray): (M,) requested times
+      derivatives (NDArray, optional): (N, 3) time derivative of `values` for cubic Hermite, e.g. velocities. Defaults to None,
+        estimated with finite differences.
+      method (str, optional): "linear" or "cubic". Defaults to "cubic".
+
+  Returns:
+      NDArray: (M, 3) values at the requested times
+  """
+  index, h, τ = locateSamples(times=times, new_times=new_times)
+  h, τ = h[:, np.newaxis], τ[:, np.newaxis]
+  p0, p1 = values[index], values[index + 1]
+
+  if method == "linear":
+    return p0 + τ * (p1 - p0)
+  elif method == "cubic":
+    if derivatives is None:
+      derivatives = np.gradient(values, times, axis=0)
+    m0, m1 = derivatives[index], derivatives[index + 1]
+    τ2 = τ * τ
+    τ3 = τ2 * τ
+    return (2 * τ3 - 3 * τ2 + 1) * p0 + (τ3 - 2 * τ2 + τ) * h * m0 + (-2 * τ3 + 3 * τ2) * p1 + (τ3 - τ2) * h * m1
+  else:
+    raise KeyError("Vector interpolation method must be one of ['linear', 'cubic']")
+
+def resampleTrajectory(
+    times: NDArray,
+    positions: NDArray,
+    velocities: NDArray,
+    attitudes: QuaternionArray,
+    new_times: NDArray,
+    accelerations: NDArray = None,
+    method: str = "cubic",
+    attitude_method: str = "squad"
+  ) -> ResampledTrajectory:
+  """ resamples a whole trajectory, positions use the velocities as Hermite slopes and velocities use the accelerations when given
+
+  Args:
+      times (NDArray): (N,) increasing sample times
+      positions (NDArray): (N, 3) positions
+      velocities (NDArray): (N, 3) velocities
+      attitudes (QuaternionArray): (N, 4) attitudes
+      new_times (NDArray): (M,) requested times
+      accelerations (NDArray, optional): (N, 3) accelerations. Defaults to None.
+      method (str, optional): "linear" or "cubic" for positions and velocities. Defaults to "cubic".
+      attitude_method (str, optional): "slerp" or "squad". Defaults to "squad".
+
+  Returns:
+      ResampledTrajectory: arrays at the requested times
+  """
+  new_times = np.asarray(new_times, dtype=np.float64)
+  return ResampledTrajectory(
+    time=new_times,
+    position=resampleVectors(times=times, values=positions, new_times=new_times, derivatives=velocities, method=method),
+    velocity=resampleVectors(times=times, values=velocities, new_times=new_times, derivatives=accelerations, method=method),
+    attitude=resampleAttitude(times=times, qs=attitudes, new_times=new_times, method=attitude_method)
+  )
+
+def resampleSimulation(data: DataFrame, rate: float, method: str = "cubic", attitude_method: str = "squad") -> ResampledTrajectory:
+  """ resamples the DataFrame produced by `simulationLoop()` at a fixed output rate
+
+  Args:
+      data (DataFrame): recorded flight data with the time column and the component columns of position, velocity and attitude
+      rate (float): output rate in Hz, e.g. a video frame rate
+      method (str, optional): "linear" or "cubic" for positions and velocities. Defaults to "cubic".
+      attitude_method (str, optional): "slerp" or "squad". Defaults to "squad".
+
+  Returns:
+      ResampledTrajectory: arrays on the grid t0, t0 + 1 / rate, ... up to the last recorded time
+  """
+  times = data["time"].to_numpy(dtype=np.float64)
+  new_times = np.arange(times[0], times[-1] + 0.5 / rate, 1.0 / rate)
+  # the recorded accelerations belong to the start of each step, a row late as velocity slopes, so the slopes come from finite differences
+  return resampleTrajectory(
+    times=times,
+    positions=frameChannel(data=data, channel="position"),
+    velocities=frameChannel(data=data, channel="velocity"),
+    attitudes=frameChannel(data=data, channel="attitude"),
+    new_times=new_times,
+    method=method,
+    attitude_method=attitude_method
+  )
+
+
+__all__ = [
+  "ResampledTrajectory",
+  "makeContinuous",
+  "batchSlerp",
+  "squadControlPoints",
+  "batchSquad",
+  "resampleAttitude",
+  "resampleVectors",
+  "resampleTrajectory",
+  "resampleSimulation"
+]
@@ -0,0 +1,97 @@
+from __future__ import annotations
+from typing import Tuple, Sequence
+import math
+
+"""
+Description: Kernels.py holds hand expanded 3-vector, 3x3 matrix and quaternion formulas on plain python floats. Inside the simulation
+loop every operation works on 3 or 4 numbers, where a numpy call spends microseconds on dispatch, shape checks and temporary arrays for a
+handful of flops. These kernels do the same math with no array machinery at all. Arguments are any indexable sequence of floats, and an
+array should be turned into a list with `.tolist()` once before a chain of kernel calls since indexing an array returns slow numpy scalars.
+Results are tuples of python floats, i.e. always computed in double precision, and are written back into the precision buffers by the caller.
+"""
+
+Vector3 = Tuple[float, float, float]
+Matrix3 = Tuple[Vector3, Vector3, Vector3]
+Quaternion4 = Tuple[float, float, float, float]
+
+
+def dot3(a: Sequence[float], b: Sequence[float]) -> float:
+  """ dot product of two 3-vectors
+  """
+  return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+def cross3(a: Sequence[float], b: Sequence[float]) -> Vector3:
+  """ cross product a x b of two 3-vectors
+  """
+  return (
+    a[1] * b[2] - a[2] * b[1],
+    a[2] * b[0] - a[0] * b[2],
+    a[0] * b[1] - a[1] * b[0]
+  )
+
+def norm3(a: Sequence[float]) -> float:
+  """ euclidean length of a 3-vector
+  """
+  return math.sqrt(a[0] * a[0] + a[1] * a[1] + a[2] * a[2])
+
+def matVec3(A: Sequence[Sequence[float]], b: Sequence[float]) -> Vector3:
+  """ matrix vector product A @ b for a 3x3 matrix given as rows, e.g. `A.tolist()`
+  """
+  A0, A1, A2 = A
+  return (
+    A0[0] * b[0] + A0[1] * b[1] + A0[2] * b[2],
+    A1[0] * b[0] + A1[1] * b[1] + A1[2] * b[2],
+    A2[0] * b[0] + A2[1] * b[1] + A2[2] * b[2]
+  )
+
+def inverse3(A: Sequence[Sequence[float]]) -> Matrix3:
+  """ inverse of a 3x3 matrix given as rows through its adjugate, the caller guarantees it is not singular, e.g. an inertia tensor
+  """
+  (a, b, c), (d, e, f), (g, h, k) = A
+  C0, C1, C2 = e * k - f * h, f * g - d * k, d * h - e * g
+  inv_det = 1.0 / (a * C0 + b * C1 + c * C2)
+  return (
+    (C0 * inv_det, (c * h - b * k) * inv_det, (b * f - c * e) * inv_det),
+    (C1 * inv_det, (a * k - c * g) * inv_det, (c * d - a * f) * inv_det),
+    (C2 * inv_det, (b * g - a * h) * inv_det, (a * e - b * d) * inv_det)
+  )
+
+def quatMultiply(q1: Sequence[float], q2: Sequence[float]) -> Quaternion4:
+  """ hamilton product q1 q2 of two (w, x, y, z) quaternions, the same as `hamiltonProduct()`
+  """
+  w1, x1, y1, z1 = q1
+  w2, x2, y2, z2 = q2
+  return (
+    w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+    w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+    w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+    w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2
+  )
+
+def quatRotate(q: Sequence[float], v: Sequence[float]) -> Vector3:
+  """ rotates a 3-vector by a unit quaternion, q v q* = v + 2w (u x v) + 2u x (u x v) for q = (w, u)
+  """
+  qw, ux, uy, uz = q
+  vx, vy, vz = v
+  tx = 2.0 * (uy * vz - uz * vy)
+  ty = 2.0 * (uz * vx - ux * vz)
+  tz = 2.0 * (ux * vy - uy * vx)
+  return (
+    vx + qw * tx + uy * tz - uz * ty,
+    vy + qw * ty + uz * tx - ux * tz,
+    vz + qw * tz + ux * ty - uy * tx
+  )
+
+
+__all__ = [
+  "Vector3",
+  "Matrix3",
+  "Quaternion4",
+  "dot3",
+  "cross3",
+  "norm3",
+  "matVec3",
+  "inverse3",
+  "quatMultiply",
+  "quatRotate"
+]
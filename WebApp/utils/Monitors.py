@@ -0,0 +1,201 @@
+from __future__ import annotations
+from typing import Dict, List, Sequence, TypedDict
+import math
+import numpy as np
+from numpy.typing import NDArray
+
+from Kernels import *
+from Integrator import *
+
+"""
+Description: Monitors.py watches the invariants of the equations of motion while a simulation runs, so a coarse or fast run can tell on its
+own whether it has gone numerically bad instead of being checked against a second run at a fine dt. Once per step, from the state at the
+start of the step and the acceleration the step evaluated there, it records the drift of the quaternion norm, the angular momentum and
+rotational kinetic energy while no moment acts, which must stay constant, and the balance of specific mechanical energy against the work of
+thrust, drag and the pad. Everything is scalar arithmetic on the values the loop already has, plus one mass properties lookup per torque
+free step. The summary at the end of the run flags every invariant that drifted past its tolerance.
+"""
+
+class MonitorTolerances(TypedDict):
+  quaternion_norm: float # largest |‖q‖ - 1|
+  angular_momentum: float # largest |L - L0| / |L0| inside a torque free interval
+  rotational_energy: float # largest |T - T0| / T0 inside a torque free interval
+  energy_balance: float # largest |Δe - W| over the non gravitational work done, see `ConservationMonitor.record()`
+
+# the drift an integration may show before its results are suspect, the demo flight with "euler" crosses the energy balance tolerance
+# between dt = 5e-3 and 1e-2, where its position error passes 5 cm, see `benchmarkIntegrators()` in Benchmarks.py
+DEFAULT_MONITOR_TOLERANCES = MonitorTolerances(
+  quaternion_norm=1e-5,
+  angular_momentum=1e-3,
+  rotational_energy=1e-3,
+  energy_balance=1e-2
+)
+
+class MonitorSummary(TypedDict):
+  steps: int
+  torque_free_time: float # seconds spent in torque free intervals
+  quaternion_norm: float # the largest drift of every invariant, in the units of `MonitorTolerances`
+  angular_momentum: float
+  rotational_energy: float
+  energy_balance: float
+  energy_residual: float # the largest |Δe - W| in J/kg
+  flags: List[str] # the invariants past their tolerance
+  healthy: bool
+
+
+class ConservationMonitor:
+  def __init__(self, gravity: Sequence[float], tolerances: MonitorTolerances = None):
+    """ per step diagnostics of the conserved and balanced quantities of a flight
+
+    Args:
+        gravity (Sequence[float]): (3,) gravitational acceleration in the inertial frame, the same as the dynamics use
+        tolerances (MonitorTolerances, optional): the drift allowed for each invariant. Defaults to None, DEFAULT_MONITOR_TOLERANCES.
+    """
+    self.gravity = tuple(float(component) for component in gravity)
+    self.tolerances = DEFAULT_MONITOR_TOLERANCES if tolerances is None else tolerances
+
+    self.times: List[float] = []
+    self.quaternion_norm: List[float] = []
+    self.angular_momentum: List[float] = []
+    self.rotational_energy: List[float] = []
+    self.energy_residual: List[float] = []
+
+    self.t_previous = None
+    self.power_previous = 0.0
+    self.on_pad_previous = False
+    self.e0 = None
+    self.work = 0.0 # non gravitational specific work done so far
+    self.absolute_work = 0.0 # the same with the power taken by magnitude, the scale of the energy balance
+    self.largest_change = 0.0 # largest |e - e0|, the scale of a flight with almost no work done
+    self.L0 = None # angular momentum and rotational energy at the start of the current torque free interval
+    self.T0 = None
+    self.I_previous = None
+    self.torque_free_time = 0.0
+    self.steps = 0 # records taken, including those already handed out by `history()`
+    self.largest = {"quaternion_norm": 0.0, "angular_momentum": 0.0, "rotational_energy": 0.0, "energy_residual": 0.0} # of the handed out records
+
+  def record(self, t: float, state: KinematicState, a: Sequence[float], on_pad: bool = False, I: Sequence[Sequence[float]] = None) -> None:
+    """ adds one step to the record
+
+    - the specific energy e = |v|² / 2 - g · r changes at the rate (a - g) · v. that power is integrated by the trapezoid rule between
+      consecutive records, and the residual Δe - W measures how far the integrated trajectory is from obeying the forces it was driven by
+    - the equations of motion leave out the rate of change of the inertia tensor, so L and T are only conserved while it is constant. a
+      torque free interval restarts whenever the inertia changes, e.g. while the last propellant burns off after burnout
+    - the pad hold switches the forces off at its end, and the step that was held runs on the forces at its start, so across the switch
+      only the power at the start of the step counts
+
+    Args:
+        t (float): time at the start of the step
+        state (KinematicState): (r, v, q, omega) at t
+        a (Sequence[float]): (3,) inertial acceleration evaluated at t, as returned by the step functions in Integrator.py
+        on_pad (bool, optional): the pad hold applies to the step starting at t. Defaults to False.
+        I (Sequence[Sequence[float]], optional): (3, 3) body axes inertia tensor at t when no moment acts on the vehicle. Defaults to None, a
+          powered or otherwise torqued step, which ends the current torque free interval.
+    """
+    r, v, q, omega = state
+    g = self.gravity
+    self.times.append(t)
+    self.quaternion_norm.append(abs(math.sqrt(q[0] * q[0] + q[1] * q[1] + q[2] * q[2] + q[3] * q[3]) - 1.0))
+
+    e = 0.5 * dot3(a=v, b=v) - dot3(a=g, b=r)
+    power = (a[0] - g[0]) * v[0] + (a[1] - g[1]) * v[1] + (a[2] - g[2]) * v[2]
+    if self.e0 is None:
+      self.e0 = e
+    else:
+      h = t - self.t_previous
+      end_power = self.power_previous if self.on_pad_previous != on_pad else power
+      self.work += 0.5 * h * (self.power_previous + end_power)
+      self.absolute_work += 0.5 * h * (abs(self.power_previous) + abs(end_power))
+    self.largest_change = max(self.largest_change, abs(e - self.e0))
+    self.energy_residual.append(e - self.e0 - self.work)
+
+    if I is None or I != self.I_previous:
+      self.L0 = self.T0 = None
+    self.I_previous = I
+    if I is None:
+      self.angular_momentum.append(math.nan)
+      self.rotational_energy.append(math.nan)
+    else:
+      w = quatRotate(q=(q[0], -q[1], -q[2], -q[3]), v=omega)
+      Iw = matVec3(A=I, b=w)
+      L = quatRotate(q=q, v=Iw)
+      T = 0.5 * dot3(a=w, b=Iw)
+      if self.L0 is None:
+        self.L0, self.T0 = L, T
+      else:
+        self.torque_free_time += t - self.t_previous
+      # a vehicle that is not turning has nothing to drift, so the drift is measured against a floor instead of zero
+      self.angular_momentum.append(norm3(a=(L[0] - self.L0[0], L[1] - self.L0[1], L[2] - self.L0[2])) / max(norm3(a=self.L0), 1e-12))
+      self.rotational_energy.append(abs(T - self.T0) / max(self.T0, 1e-12))
+
+    self.t_previous = t
+    self.power_previous = power
+    self.on_pad_previous = on_pad
+
+  def history(self, clear: bool = False) -> Dict[str, NDArray]:
+    """ the per step record, angular momentum and rotational energy drift are NaN outside torque free intervals
+
+    Args:
+        clear (bool, optional): hand the records out and drop them, e.g. once per chunk of a streamed run, the summary still covers them.
+          Defaults to False.
+
+    Returns:
+        Dict[str, NDArray]: "time", "quaternion_norm", "angular_momentum", "rotational_energy" and "energy_residual" in J/kg, since the
+          last clearing call
+    """
+    history = {
+      "time": np.array(self.times),
+      "quaternion_norm": np.array(self.quaternion_norm),
+      "angular_momentum": np.array(self.angular_momentum),
+      "rotational_energy": np.array(self.rotational_energy),
+      "energy_residual": np.array(self.energy_residual)
+    }
+    if clear:
+      self.steps += len(self.times)
+      self.largest = self.largest_drifts()
+      for values in (self.times, self.quaternion_norm, self.angular_momentum, self.rotational_energy, self.energy_residual):
+        values.clear()
+    return history
+
+  def largest_drifts(self) -> Dict[str, float]:
+    """ the largest drift of every recorded quantity so far, NaN entries skipped and |Δe - W| for the energy residual
+    """
+    largest = lambda values: max((value for value in values if not math.isnan(value)), default=0.0)
+    return {
+      "quaternion_norm": max(self.largest["quaternion_norm"], largest(self.quaternion_norm)),
+      "angular_momentum": max(self.largest["angular_momentum"], largest(self.angular_momentum)),
+      "rotational_energy": max(self.largest["rotational_energy"], largest(self.rotational_energy)),
+      "energy_residual": max(self.largest["energy_residual"], largest(abs(value) for value in self.energy_residual))
+    }
+
+  def summary(self) -> MonitorSummary:
+    """ the largest drift of every invariant over the run, checked against the tolerances
+
+    Returns:
+        MonitorSummary: the drifts, the invariants that failed and whether the run looks healthy
+    """
+    largest = self.largest_drifts()
+    energy_residual = largest["energy_residual"]
+    drifts = {
+      "quaternion_norm": largest["quaternion_norm"],
+      "angular_momentum": largest["angular_momentum"],
+      "rotational_energy": largest["rotational_energy"],
+      "energy_balance": energy_residual / max(self.absolute_work, self.largest_change, 1e-12)
+    }
+    flags = [name for name, drift in drifts.items() if drift > self.tolerances[name]]
+    return MonitorSummary(
+      steps=self.steps + len(self.times),
+      torque_free_time=self.torque_free_time,
+      **drifts,
+      energy_residual=energy_residual,
+      flags=flags,
+      healthy=len(flags) == 0
+    )
+
+
+__all__ = [
+  "MonitorTolerances",
+  "DEFAULT_MONITOR_TOLERANCES",
+  "MonitorSummary",
+  "ConservationMonitor"
+]
@@ -3,8 +3,11 @@ from typing import Tuple, TypedDict, Type, Dict, List
 import pandas as pd
 from pandas import DataFrame
 from numpy.random import randn as normal_random_variable
+from numpy.typing import NDArray
+import numpy as np
 import os
 import json
+from bisect import bisect_left, bisect_right
 
 
 from Element import Cylinder
@@ -49,7 +52,63 @@ def getLinearInterpolations(data: DataFrame) -> Tuple[List[float], List[float],
     THRUST.append(thrust)
   
   return (M, T, THRUST)
-    
+
+def getCumulativeImpulse(data: DataFrame) -> List[float]:
+  """ the total impulse delivered up to every sample of the thrust curve, exact for the piecewise linear thrust of `getLinearInterpolations()`
+
+  Args:
+      data (DataFrame): the loaded csv data into a pandas dataframe
+
+  Returns:
+      List[float]: impulse in Newton seconds at every sample time, starting at 0
+  """
+  impulses = [0.0]
+  for index in range(len(data) - 1):
+    dt = data["Time (s)"][index + 1] - data["Time (s)"][index]
+    impulses.append(impulses[-1] + 0.5 * dt * (data["Thrust (N)"][index] + data["Thrust (N)"][index + 1]))
+  
+  return impulses
+
+
+def batchImpulse(t: float, times: NDArray, thrusts: NDArray, slopes: NDArray, impulses: NDArray) -> Tuple[NDArray, NDArray]:
+  """ thrust and cumulative impulse of N motors at the same time t in one pass, see `MotorManager.getThrustTable()`
+
+  Args:
+      t (float): time in seconds
+      times (NDArray): (N, P) sample times per motor, shorter curves padded by repeating their last time
+      thrusts (NDArray): (N, P) thrust at every sample, padded with the last thrust
+      slopes (NDArray): (N, P) slope of the segment starting at every sample, 0 from the last sample on
+      impulses (NDArray): (N, P) impulse delivered up to every sample, padded with the total impulse
+
+  Returns:
+      Tuple[NDArray, NDArray]: (N,) thrust in Newtons and (N,) impulse delivered up to t in Newton seconds
+  """
+  rows = np.arange(times.shape[0])
+  index = np.maximum(np.count_nonzero(times <= t, axis=1) - 1, 0) # the segment starting at or before t
+  τ = np.maximum(t - times[rows, index], 0.0)
+  thrust = thrusts[rows, index] + slopes[rows, index] * τ
+  impulse = impulses[rows, index] + τ * (thrusts[rows, index] + 0.5 * slopes[rows, index] * τ)
+  return (np.maximum(thrust, 0.0), impulse)
+
+def batchThrust(t: float, times: NDArray, thrusts: NDArray, slopes: NDArray, impulses: NDArray) -> NDArray:
+  """ `MotorManager.getThrust()` for N motors at the same time t in one pass, see `batchImpulse()` for the arguments
+
+  Returns:
+      NDArray: (N,) thrust in Newtons
+  """
+  return batchImpulse(t=t, times=times, thrusts=thrusts, slopes=slopes, impulses=impulses)[0]
+
+def batchAverageThrust(t: float, dt: float, times: NDArray, thrusts: NDArray, slopes: NDArray, impulses: NDArray) -> NDArray:
+  """ `MotorManager.getAverageThrust()` for N motors over the same interval in one pass, see `batchImpulse()` for the arguments
+
+  Returns:
+      NDArray: (N,) average thrust over [t, t + dt] in Newtons
+  """
+  if dt <= 0.0:
+    return batchThrust(t=t, times=times, thrusts=thrusts, slopes=slopes, impulses=impulses)
+  _, start = batchImpulse(t=t, times=times, thrusts=thrusts, slopes=slopes, impulses=impulses)
+  _, end = batchImpulse(t=t + dt, times=times, thrusts=thrusts, slopes=slopes, impulses=impulses)
+  return (end - start) / dt
 
 
 class MotorManager:
@@ -74,6 +133,9 @@ class MotorManager:
   def initialize(self):
     self.data_frame, self.params = getMotorData(motor=self.motor)
     self.slopes, self.time_intercepts, self.thrust_intercepts = getLinearInterpolations(data=self.data_frame)
+    self.times = self.data_frame["Time (s)"].astype(float).tolist()
+    self.impulses = getCumulativeImpulse(data=self.data_frame)
+    self.total_impulse = self.impulses[-1]
     self.burn_time = self.data_frame["Time (s)"][len(self.data_frame["Time (s)"]) - 1]
   
   def getThrust(self, t: float) -> float:
@@ -85,16 +147,61 @@ class MotorManager:
     Returns:
         float: thrust in Newtons
     """
-    if t < self.burn_time:
-      for index, _t in enumerate(self.time_intercepts):
-        if t <= _t and t >= 0:
-          T = self.thrust_intercepts[index] + self.slopes[index] * (t - self.time_intercepts[index - 1])
-          return T if T >= 0 else 0.0
-        else:
-          pass
+    if 0 <= t < self.burn_time:
+      index = bisect_left(self.time_intercepts, t) # the first segment ending at or after t, which starts at the sample before its end
+      T = self.thrust_intercepts[index] + self.slopes[index] * (t - self.times[index])
+      return T if T >= 0 else 0.0
     else:
       return 0.0
   
+  def getImpulse(self, t: float) -> float:
+    """ computes the total impulse the motor has delivered by time t, exact for the piecewise linear thrust of `getThrust()`
+
+    Args:
+        t (float): time in seconds
+
+    Returns:
+        float: impulse in Newton seconds
+    """
+    if t <= self.times[0]:
+      return 0.0
+    elif t >= self.burn_time:
+      return self.total_impulse
+    
+    index = bisect_right(self.times, t) - 1 # the segment starting at or before t
+    τ = t - self.times[index]
+    return self.impulses[index] + τ * (self.thrust_intercepts[index] + 0.5 * self.slopes[index] * τ)
+  
+  def getAverageThrust(self, t: float, dt: float) -> float:
+    """ computes the mean thrust over [t, t + dt] from the cumulative impulse, so a step that holds it constant delivers exactly the impulse
+    of the thrust curve over the step, wherever the samples of the curve fall inside it
+
+    Args:
+        t (float): time at the start of the interval in seconds
+        dt (float): length of the interval in seconds, 0 for the thrust at t
+
+    Returns:
+        float: thrust in Newtons
+    """
+    if dt <= 0.0:
+      return self.getThrust(t=t)
+    return (self.getImpulse(t=t + dt) - self.getImpulse(t=t)) / dt
+  
+  def getThrustTable(self) -> Tuple[NDArray, NDArray, NDArray, NDArray, float]:
+    """ the thrust curve as arrays, for evaluating many vehicles at once with `batchImpulse()`
+
+    Returns:
+        Tuple[NDArray, NDArray, NDArray, NDArray, float]: sample times, thrust at every sample, slope of the segment starting at every sample
+          with 0 for the last, impulse up to every sample, and the burn time
+    """
+    return (
+      np.array(self.times, dtype=np.float64),
+      np.array(self.data_frame["Thrust (N)"], dtype=np.float64),
+      np.array([*self.slopes, 0.0], dtype=np.float64),
+      np.array(self.impulses, dtype=np.float64),
+      float(self.burn_time)
+    )
+  
   def getElementData(self) -> Dict[str, ConfigDict]:
     """ forms a single element of the design constraints for the motor, only requiring repositioning and rotating to initial setup
 
@@ -119,6 +226,10 @@ class MotorManager:
 
 __all__ = [
   "MotorManager",
+  "getCumulativeImpulse",
+  "batchImpulse",
+  "batchThrust",
+  "batchAverageThrust",
   "AVAILABLE"
 ]
 
@@ -4,7 +4,8 @@ Date: 1/31/2025
 All rights reserved.
 """
 
-from typing import Any
+from typing import Any, Iterator
+import math
 import numpy as np
 
 from Design import *
@@ -14,13 +15,133 @@ from Element import *
 from ElementTypes import *
 from SerialManager import *
 from ThrustVectorController import *
-from SimulationLoop import simulationLoop
+from Precision import *
+from Integrator import *
+from Events import *
+from Trajectory import *
+from PostProcessing import *
+from SimulationLoop import simulate, simulationStream
 
 
 Request = Dict[str, Any]
 Response = Dict[str, Any]
 
 
+def validateAdjustment(req: Request) -> str:
+  """ checks the optional translation and rotation of an adjustment request and converts them in place to core types
+
+  - this is the validation boundary: everything past it builds quaternions and vectors through the unchecked fast paths
+
+  Args:
+      req (Request): {"translation": array like of 3 | None, "rotation": Quaternion | array like of 4 (w, x, y, z) | None}
+
+  Returns:
+      str: a message describing the problem, None if the request is valid
+  """
+  try:
+    if req["translation"] is not None:
+      translation = np.asarray(req["translation"], dtype=getPrecision())
+      if translation.shape != (3,) or not np.all(np.isfinite(translation)):
+        return "translation must contain exactly 3 finite numbers"
+      req["translation"] = translation
+    
+    if req["rotation"] is not None:
+      rotation = req["rotation"].q if isinstance(req["rotation"], Quaternion) else req["rotation"]
+      rotation = np.asarray(rotation, dtype=getPrecision())
+      if rotation.shape != (4,) or not np.all(np.isfinite(rotation)) or not np.any(rotation):
+        return "rotation must be a `Quaternion` or exactly 4 finite numbers (w, x, y, z), not all zero"
+      req["rotation"] = Quaternion(elements=rotation)
+  except (TypeError, ValueError) as e:
+    return f"could not read adjustment: {e}"
+  
+  return None
+
+
+def validateSimulation(req: Request) -> str:
+  """ fills in the defaults of the simulation keys of a request in place and checks them, the same boundary as `validateAdjustment()`
+
+  Args:
+      req (Request): see `PhysicsAPI.getSimulationResults()`
+
+  Returns:
+      str: a message describing the problem, None if the request is valid
+  """
+  if "dt" not in req.keys():
+    req["dt"] = 1e-2
+  if "precision" not in req.keys():
+    req["precision"] = DEFAULT_PRECISION
+  if "integrator" not in req.keys():
+    req["integrator"] = "euler"
+  if "substeps" not in req.keys():
+    req["substeps"] = None
+  if "coast_dt" not in req.keys():
+    req["coast_dt"] = None
+  if "t_final" not in req.keys():
+    req["t_final"] = 20.0
+  if "rail_length" not in req.keys():
+    req["rail_length"] = RAIL_LENGTH
+  if "monitor" not in req.keys():
+    req["monitor"] = False
+  if "resume" not in req.keys():
+    req["resume"] = None
+  if "checkpoint" not in req.keys():
+    req["checkpoint"] = False
+  
+  if req["integrator"] not in INTEGRATORS.keys():
+    return f"integrator must be one of {list(INTEGRATORS.keys())}"
+  if req["precision"] not in PRECISIONS.keys():
+    return f"precision must be one of {list(PRECISIONS.keys())}"
+  if req["substeps"] is not None:
+    if isinstance(req["substeps"], bool) or not isinstance(req["substeps"], int) or req["substeps"] < 1:
+      return "substeps must be a positive whole number"
+    if "tolerance" in req.keys():
+      return "substeps and tolerance cannot be combined, multi-rate steps are fixed steps"
+  try:
+    for key in ("dt", "t_final", "tolerance"):
+      if key in req.keys() and not (math.isfinite(req[key]) and req[key] > 0.0):
+        return f"{key} must be a positive number"
+  except TypeError:
+    return "dt, t_final and tolerance must be numbers"
+  
+  # the output rate is converted in place to the policy that keeps it, like the rotation of an adjustment
+  req["recording"] = None
+  if any(key in req.keys() for key in ("record_every", "record_rate", "record_threshold")):
+    try:
+      req["recording"] = RecordingPolicy(every=req.get("record_every"), rate=req.get("record_rate"), threshold=req.get("record_threshold"))
+    except (TypeError, ValueError) as e:
+      return f"could not read the recording policy: {e}"
+  
+  return None
+
+def simulationArguments(req: Request) -> Dict[str, Any]:
+  """ converts the simulation keys of a request checked by `validateSimulation()` to the arguments of `simulate()`
+
+  Args:
+      req (Request): see `PhysicsAPI.getSimulationResults()`
+
+  Returns:
+      Dict[str, Any]: every argument of `simulate()` but the serial manager, the design, the thrust vectoring unit and the motor index
+  """
+  step_controller = None
+  if "tolerance" in req.keys():
+    step_controller = StepSizeController(rtol=req["tolerance"], atol=req["tolerance"])
+  
+  return {
+    "dt": req["dt"],
+    "precision": req["precision"],
+    "integrator": req["integrator"],
+    "step_controller": step_controller,
+    "substeps": req["substeps"],
+    "coast_dt": req["coast_dt"],
+    "t_final": req["t_final"],
+    "rail_length": req["rail_length"],
+    "monitor": req["monitor"],
+    "recording": req["recording"],
+    "resume": req["resume"],
+    "checkpoint": req["checkpoint"]
+  }
+
+
 class PhysicsAPI:
   _instance = None
   is_consolidated: bool = False
@@ -33,6 +154,7 @@ class PhysicsAPI:
   design: Design = None
   part_numbers: Dict[str, int] = None
   serial_manager: SerialManager = None
+  trajectory: Trajectory = None
   
   def __new__(cls, *args, **kwargs):
     if cls._instance is None:
@@ -112,6 +234,8 @@ class PhysicsAPI:
     """
     if "data" not in req.keys():
       req["data"] = Quaternion(default=True)
+    elif not isinstance(req["data"], Quaternion):
+      return {"res": False, "message": "data must be a `Quaternion`"}
     
     self.serial_manager.sendData(q=req["data"])
     
@@ -295,6 +419,9 @@ class PhysicsAPI:
       if self.design is None:
         return {"res": False, "message": "to adjust an element's position or rotation, you must first generate the design with the `.postBuildDesign() method`"}
       
+      if (message := validateAdjustment(req=req)) is not None:
+        return {"res": False, "message": message}
+      
       id = self.part_numbers[req["id"]]
       self.design.manipulate_element(id=id, displacement=req["translation"], attitude=req["rotation"])
       return {"res": True}
@@ -315,8 +442,12 @@ class PhysicsAPI:
     if "translation" not in req.keys():
       req["translation"] = None
     
+    if (message := validateAdjustment(req=req)) is not None:
+      return {"res": False, "message": message}
+    
     self.design.manipulate_element(id=self.motor_index, displacement=req["translation"], attitude=req["rotation"])
-    self.tvc.moveToMotor(offset=req["translation"])
+    if req["translation"] is not None:
+      self.tvc.moveToMotor(offset=req["translation"])
     return {"res": True}
   
   def postLockStaticElements(self, req: Request = None) -> Response:
@@ -343,26 +474,70 @@ class PhysicsAPI:
     self.tvc.forceToTarget()
     return {"res": True}
   
-  def getSimulationResults(self, req: Request = {}) -> None:
+  def getSimulationResults(self, req: Request = {}) -> Response:
     """ this function calls the simulation method based on the finalized design - all presets should have been performed already
 
     Args:
-        req (Request, optional): {"save": bool, "filename": str name of file (include .mp4 in the filename)}. Defaults to None.
+        req (Request, optional): {"save": bool, "filename": str name of file (include .mp4 in the filename), "dt": float, "precision": "float32" | "float64",
+          "integrator": a key of `INTEGRATORS`, "tolerance": float to switch to adaptive steps with this relative and absolute tolerance,
+          "substeps": int attitude and servo steps per dt for multi-rate steps, "coast_dt": float step size of the closed form coast after burnout,
+          "t_final": float time limit in seconds, "rail_length": float launch rail length in meters, "monitor": bool record the conservation
+          diagnostics of `ConservationMonitor()`, one of "record_every": int steps, "record_rate": float Hz or "record_threshold": float for
+          the rows kept by `RecordingPolicy()`, "resume": `Checkpoint` to carry on from, "checkpoint": bool keep the end state in the
+          metadata of the trajectory, "render": bool build the animation, "csv": bool write the csv for the Data Analysis page, "plot": str
+          image file for the overview of `plotTrajectory()`}. Defaults to None.
 
     Returns:
-        None
+        Response: key: res, value: bool, key: message, value: why an invalid request was refused. the flight is kept in `self.trajectory`
+          for any post processing stage skipped here
     """
     if "save" not in req.keys():
       req["save"] = True
     if "filename" not in req.keys():
       req["filename"] = None
-    if "dt" not in req.keys():
-      req["dt"] = 1e-2
+    if "render" not in req.keys():
+      req["render"] = True
+    if "csv" not in req.keys():
+      req["csv"] = True
+    if "plot" not in req.keys():
+      req["plot"] = None
     
-    if self.is_listening:
-      simulationLoop(serial_manager=self.serial_manager, design=self.design, tvc=self.tvc, motor_idx=self.motor_index, dt=req["dt"], save=req["save"], filename=req["filename"])
-    else:
-      simulationLoop(serial_manager=None, design=self.design, tvc=self.tvc, motor_idx=self.motor_index, dt=req["dt"], save=req["save"], filename=req["filename"])
+    if (message := validateSimulation(req=req)) is not None:
+      return {"res": False, "message": message}
+    
+    serial_manager = self.serial_manager if self.is_listening else None
+    self.trajectory = simulate(serial_manager=serial_manager, design=self.design, tvc=self.tvc, motor_idx=self.motor_index, **simulationArguments(req=req))
+    
+    if req["render"]:
+      renderTrajectory(trajectory=self.trajectory, save=req["save"], filename=req["filename"])
+    if req["csv"]:
+      saveTrajectory(trajectory=self.trajectory)
+    if req["plot"] is not None:
+      plotTrajectory(trajectory=self.trajectory, filename=req["plot"])
+    
+    return {"res": True}
+  
+  def getSimulationStream(self, req: Request = {}) -> Iterator[Response]:
+    """ runs the simulation like `getSimulationResults()` but hands the flight out chunk by chunk while it is computed, for a live view
+    of the run. nothing is rendered or written and the chunks are not kept
+
+    Args:
+        req (Request, optional): the simulation keys of `getSimulationResults()` and "chunk_size": int rows per chunk. Defaults to None, 100.
+
+    Yields:
+        Response: key: res, value: bool, key: chunk, value: the next rows as a `Trajectory`, or a single response with key: message for an
+          invalid request
+    """
+    if "chunk_size" not in req.keys():
+      req["chunk_size"] = 100
+    
+    if (message := validateSimulation(req=req)) is not None:
+      yield {"res": False, "message": message}
+      return
+    
+    serial_manager = self.serial_manager if self.is_listening else None
+    for chunk in simulationStream(serial_manager=serial_manager, design=self.design, tvc=self.tvc, motor_idx=self.motor_index, chunk_size=req["chunk_size"], **simulationArguments(req=req)):
+      yield {"res": True, "chunk": chunk}
     
 
 
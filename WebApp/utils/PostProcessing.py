@@ -0,0 +1,129 @@
+from __future__ import annotations
+from typing import Tuple, List
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from Quaternion import *
+from AttitudeConversions import *
+from Interpolation import *
+from VectorPlotter import *
+from Trajectory import *
+
+"""
+Description: PostProcessing.py holds the optional stages that turn a `Trajectory()` from `simulate()` into files for people: the animation
+of the body axes rendered to mp4 through matplotlib and ffmpeg, the flight data as csv for the Data Analysis page, and a static overview
+plot. None of them run unless the caller asks, so a batch study pays for the physics alone and renders only the flights it wants to see.
+"""
+
+SIMULATION_CSV = "./WebApp/assets/simulation.csv"
+
+
+def animationFrames(trajectory: Trajectory) -> Tuple[int, float, List[Vector], List[Vector], List[Vector], List[Vector]]:
+  """ the frames of the animation, one per row for evenly spaced rows, otherwise a uniform grid resampled from the rows at their nominal
+  interval, or at dt when there is none
+
+  Args:
+      trajectory (Trajectory): the flight
+
+  Returns:
+      Tuple[int, float, List[Vector], List[Vector], List[Vector], List[Vector]]: number of frames, frame interval, and the positions and body
+        x, y and z axes of every frame
+  """
+  dt = trajectory.metadata["interval"] or trajectory.metadata["dt"]
+  if trajectory.metadata["uniform"]:
+    positions, axes = trajectory["position"], trajectory.body_axes()
+  else:
+    # adaptive, coasting and thresholded rows are uneven in time
+    resampled = resampleTrajectory(
+      times=trajectory["time"],
+      positions=trajectory["position"],
+      velocities=trajectory["velocity"],
+      attitudes=trajectory["attitude"],
+      new_times=np.arange(dt, trajectory["time"][-1], dt)
+    )
+    positions = resampled["position"]
+    axes = np.ascontiguousarray(np.swapaxes(batchRotationMatrix(qs=resampled["attitude"]), 1, 2))
+
+  vectors = lambda rows: [Vector.from_buffer(row) for row in rows]
+  return (len(positions), dt, vectors(positions), vectors(axes[:, 0]), vectors(axes[:, 1]), vectors(axes[:, 2]))
+
+def renderTrajectory(trajectory: Trajectory, save: bool = True, filename: str = None) -> bool:
+  """ animates the body axes along the flight with `plotMotion()`
+
+  Args:
+      trajectory (Trajectory): the flight
+      save (bool, optional): encode the animation to mp4, which is the expensive part. Defaults to True.
+      filename (str, optional): the mp4 to write. Defaults to None, ./WebApp/assets/simulation.mp4.
+
+  Returns:
+      bool: True once the animation is built, and saved if asked
+  """
+  frames, dt, positions, body_x, body_y, body_z = animationFrames(trajectory=trajectory)
+  return plotMotion(
+    N=frames,
+    translation_vectors=positions,
+    x_body_vectors=body_x,
+    y_body_vectors=body_y,
+    z_body_vectors=body_z,
+    dt=dt,
+    burn_time=trajectory.metadata["burn_time"],
+    save=save,
+    filename=filename
+  )
+
+def saveTrajectory(trajectory: Trajectory, filename: str = SIMULATION_CSV) -> pd.DataFrame:
+  """ writes the flight data as csv, in the layout of `Trajectory.to_frame()`
+
+  Args:
+      trajectory (Trajectory): the flight
+      filename (str, optional): the csv to write. Defaults to SIMULATION_CSV.
+
+  Returns:
+      pd.DataFrame: the frame that was written
+  """
+  data = trajectory.to_frame()
+  data.to_csv(filename, sep=",")
+  return data
+
+def plotTrajectory(trajectory: Trajectory, filename: str = None) -> Figure:
+  """ a static overview of the flight: altitude, speed and tilt against time with the located events marked
+
+  Args:
+      trajectory (Trajectory): the flight
+      filename (str, optional): an image file to save the figure to. Defaults to None, not saved.
+
+  Returns:
+      Figure: the figure
+  """
+  time = trajectory["time"]
+  tilt = batchTiltAngles(qs=trajectory["attitude"])[:, TILT]
+
+  # built without pyplot, so it neither touches the backend plotMotion() uses nor stays registered after the caller drops it
+  fig = Figure(figsize=(8, 8))
+  axes = fig.subplots(3, 1, sharex=True)
+  for ax, values, label in zip(
+    axes,
+    (trajectory["position"][:, 2], np.linalg.norm(trajectory["velocity"], axis=1), np.degrees(tilt)),
+    ("altitude (m)", "speed (m/s)", "tilt (deg)")
+  ):
+    ax.plot(time, values)
+    ax.set_ylabel(label)
+    for event in trajectory.events:
+      ax.axvline(event["time"], color="gray", linestyle="--", linewidth=0.8)
+  for event in trajectory.events:
+    axes[0].annotate(event["name"], xy=(event["time"], event["position"][2]), fontsize=8)
+  axes[-1].set_xlabel("time (s)")
+
+  if filename is not None:
+    fig.savefig(filename)
+  return fig
+
+
+__all__ = [
+  "SIMULATION_CSV",
+  "animationFrames",
+  "renderTrajectory",
+  "saveTrajectory",
+  "plotTrajectory"
+]
@@ -0,0 +1,63 @@
+from __future__ import annotations
+from typing import Type
+import numpy as np
+from numpy.typing import NDArray
+
+"""
+Description: Precision.py holds the single floating point policy for the physics core. Every array created by `Quaternion()`, `Vector()`,
+`Element()` subclasses, `Design()` and the simulation loop asks this module for its dtype, so a simulation runs entirely in float32 or
+entirely in float64 with no silent upcasts or conversion copies between the two. Set the policy once, before a design is built or at the
+start of a simulation, and leave it alone while the simulation runs.
+"""
+
+PRECISIONS = {
+  "float32": np.float32,
+  "float64": np.float64
+}
+DEFAULT_PRECISION = "float64"
+
+_dtype: Type[np.floating] = PRECISIONS[DEFAULT_PRECISION]
+
+
+def setPrecision(precision: str) -> None:
+  """ selects the floating point type used by every array in the physics core
+
+  Args:
+      precision (str): one of the keys of `PRECISIONS`, "float32" or "float64"
+
+  Raises:
+      KeyError: precision is not supported
+  """
+  global _dtype
+  if precision in PRECISIONS.keys():
+    _dtype = PRECISIONS[precision]
+  else:
+    raise KeyError(f"Precision must be one of {list(PRECISIONS.keys())}")
+
+def getPrecision() -> Type[np.floating]:
+  """ gets the active floating point type
+
+  Returns:
+      Type[np.floating]: np.float32 or np.float64
+  """
+  return _dtype
+
+def asPrecision(array: NDArray) -> NDArray:
+  """ casts an array to the active floating point type, no copy is made if it already matches
+
+  Args:
+      array (NDArray): array like data
+
+  Returns:
+      NDArray: the data with the active dtype
+  """
+  return np.asarray(array, dtype=_dtype)
+
+
+__all__ = [
+  "PRECISIONS",
+  "DEFAULT_PRECISION",
+  "setPrecision",
+  "getPrecision",
+  "asPrecision"
+]
@@ -3,19 +3,28 @@ from typing import Tuple
 import numpy as np
 from numpy.typing import NDArray
 
-I = np.array([1, 0, 0], dtype=np.float32)
-J = np.array([0, 1, 0], dtype=np.float32)
-K = np.array([0, 0, 1], dtype=np.float32)
+from Precision import *
+from ExponentialMap import *
+from Kernels import *
 
 w, i, j, k = 0, 1, 2, 3
+CONJUGATE = np.array([1, -1, -1, -1], dtype=np.int8) # int8 so multiplying keeps the buffer's float dtype
 
 # Setup the datatypes that will be used as models for creating the following mathematical objects
 QuaternionElements = Tuple[float, float, float, float]
 VectorElements = Tuple[float, float, float]
-AngleVector = Tuple[float, NDArray[np.float32]]
-QuaternionTuple = Tuple[float, NDArray[np.float32], NDArray[np.float32], NDArray[np.float32]]
+AngleVector = Tuple[float, NDArray[np.floating]]
+QuaternionBuffer = NDArray[np.floating] # contiguous (w, x, y, z) storage backing every `Quaternion()`, dtype set by `Precision.py`
+
+# element access now returns numpy scalars, so they have to be accepted alongside python numbers
+SCALAR_TYPES = (int, float, np.integer, np.floating)
+
+# quaternions are only rescaled once | |q|^2 - 1 | drifts past this, round-off from a handful of products stays well below it
+NORM_TOLERANCE = 1e-6
 
 class Quaternion:
+  __slots__ = ("q", "_R")
+  
   def __init__(self, elements: QuaternionElements = None, angle_vector: AngleVector = None, default: bool = False, is_vector: bool = False):
     """ A mathematical object used to rotate vectors
 
@@ -25,37 +34,51 @@ class Quaternion:
         default (bool, optional): sets quaternion to the zero quaternion (1, 0, 0, 0). Defaults to False.
         is_vector (bool, optional): ignores quaternion normalization if it is a vector. Defaults to False.
     """
-    self.q: QuaternionTuple = ()
+    self.q: QuaternionBuffer = np.array([1.0, 0.0, 0.0, 0.0], dtype=getPrecision())
+    self._R: NDArray = None # rotation matrix cache, built lazily and dropped whenever `self.q` changes
     
     if elements is not None and angle_vector is not None:
       print('Error: Too many arguments passed to `quaternion()` contructor. Defaulting to `elements` argument to build quaternion')
       
       if self.validate_elements(elements=elements):
-        self.q = (elements[w], elements[i] * I, elements[j] * J, elements[k] * K)
+        self.q[:] = elements
     
     elif (elements is None and angle_vector is None) or default:
-      self.q = (1.0, 0 * I, 0 * J, 0 * K)
+      pass
     
     elif elements is not None:
       if self.validate_elements(elements=elements):
-        self.q = (elements[w], elements[i] * I, elements[j] * J, elements[k] * K)
+        self.q[:] = elements
     
     elif angle_vector is not None:
       if self.validate_angle_vector(angle_vector=angle_vector):
         θ = angle_vector[0]
         vector = angle_vector[1]
         if (N := np.linalg.norm(vector)) > 1e-4:
-          vector /= N
-          x, y, z = vector[0], vector[1], vector[2]
-          self.q = (np.cos(θ /2), x * np.sin(θ / 2) * I, y * np.sin(θ / 2) * J, z * np.sin(θ / 2) * K)
-        else:
-          self.q = (1.0, 0 * I, 0 * J, 0 * K)
-    
-    else:
-      self.q = (1.0, 0 * I, 0 * J, 0 * K)
+          self.q[w] = np.cos(θ / 2)
+          self.q[i:] = vector
+          self.q[i:] *= np.sin(θ / 2) / N
     
     if not is_vector:
-      self.normalize()
+      self.renormalize()
+  
+  @classmethod
+  def from_buffer(cls, buffer: QuaternionBuffer) -> Quaternion:
+    """ unchecked constructor for internal code that already holds a valid (w, x, y, z) array
+
+    - no validation, no copy and no normalization: the quaternion takes ownership of `buffer`, which must be a fresh 4 element array of
+      the active `Precision.py` dtype. Anything coming from outside the physics core goes through `Quaternion()` instead
+
+    Args:
+        buffer (QuaternionBuffer): the array to wrap
+
+    Returns:
+        Quaternion: a quaternion viewing `buffer`
+    """
+    _q = cls.__new__(cls)
+    _q.q = buffer
+    _q._R = None
+    return _q
   
   def validate_elements(self, elements: QuaternionElements) -> bool:
     try:
@@ -80,11 +103,28 @@ class Quaternion:
     return True
   
   def normalize(self) -> None:
-    norm = np.sqrt(self.q[w] * self.q[w] + np.dot((self.q[i] + self.q[j] + self.q[k]), (self.q[i] + self.q[j] + self.q[k])))
-    self.q = tuple([component / norm for component in self.q])
+    self.q /= np.sqrt(np.dot(self.q, self.q))
+    self._R = None
+  
+  def renormalize(self, tolerance: float = NORM_TOLERANCE) -> None:
+    """ normalizes only when the norm has drifted from 1 by more than the tolerance, the cheap check used on the hot path
+
+    Args:
+        tolerance (float, optional): allowed deviation of |q|^2 from 1. Defaults to NORM_TOLERANCE.
+    """
+    if abs(np.dot(self.q, self.q) - 1.0) > tolerance:
+      self.normalize()
+  
+  def set_precision(self) -> None:
+    """ recasts the buffer to the active `Precision.py` dtype
+    """
+    self.q = asPrecision(self.q)
+    self._R = None
   
   def get_conjugate(self):
-    return Quaternion(elements=(self.q[w], - self.q[i], - self.q[j], - self.q[k]), default=False)
+    _q = Quaternion.from_buffer(self.q * CONJUGATE)
+    _q.renormalize()
+    return _q
   
   def contract_to_vector(self) -> Vector:
     """ Warning: this method eliminates information about w, the first element of a quaternion when casting to a vector
@@ -92,21 +132,24 @@ class Quaternion:
     Returns:
         Vector: the vector part of the quaternion
     """
-    return Vector(elements=(self.q[i][0], self.q[j][1], self.q[k][2]))
+    return Vector.from_buffer(self.q[i:].copy())
   
   def __str__(self):
-    _sum = self.q[i] + self.q[j] + self.q[k]
-    return f"q = ( {self.q[w]:.4f}, {_sum[0]:.4f} i, {_sum[1]:.4f} j, {_sum[2]:.4f} k ) \t|q| = {((self.q[w] * self.q[w] + np.dot(_sum, _sum)) ** 0.5):.4f}"
+    return f"q = ( {self.q[w]:.4f}, {self.q[i]:.4f} i, {self.q[j]:.4f} j, {self.q[k]:.4f} k ) \t|q| = {(np.dot(self.q, self.q) ** 0.5):.4f}"
   
   def __add__(self, q: Quaternion) -> Quaternion:
-    return Quaternion(elements=(self.q[w] + q.q[w], self.q[i] + q.q[i], self.q[j] + q.q[j], self.q[k] + q.q[k]), default=False, is_vector=False)
+    _q = Quaternion.from_buffer(self.q + q.q)
+    _q.renormalize()
+    return _q
   
   def __sub__(self, q: Quaternion) -> Quaternion:
-    return Quaternion(elements=(self.q[w] - q.q[w], self.q[i] - q.q[i], self.q[j] - q.q[j], self.q[k] - q.q[k]), default=False, is_vector=False)
+    _q = Quaternion.from_buffer(self.q - q.q)
+    _q.renormalize()
+    return _q
   
   def __mul__(self, other):
-    if isinstance(other, (int, float)):
-      return Quaternion(elements=(self.q[w] * other, self.q[i] * other, self.q[j] * other, self.q[k] * other), default=False, is_vector=True)
+    if isinstance(other, SCALAR_TYPES):
+      return Quaternion.from_buffer((self.q * other).astype(self.q.dtype, copy=False))
     else:
       raise TypeError("Unsupported type for `multiplication`")
   
@@ -114,47 +157,97 @@ class Quaternion:
     return self.__mul__(other=other)
   
   def __truediv__(self, other) -> Quaternion:
-    if isinstance(other, (int, float)):
+    if isinstance(other, SCALAR_TYPES):
       if other == 0 or other == 0.0:
         raise ZeroDivisionError()
       else:
-        return Quaternion(elements=(self.q[w] / other, self.q[i] / other, self.q[j] / other, self.q[k] / other))
+        _q = Quaternion.from_buffer((self.q / other).astype(self.q.dtype, copy=False))
+        _q.renormalize()
+        return _q
     else:
       raise TypeError("Unsupported type for `division`")
     
   def __iadd__(self, other):
     if isinstance(other, Quaternion):
-      return Quaternion(elements=(self.q[w] + other.q[w], self.q[i] + other.q[i], self.q[j] + other.q[j], self.q[k] + other.q[k]), is_vector=True)
+      self.q += other.q
+      self._R = None
+      return self
     else:
       raise AssertionError("Unsupported type for addition on `Quaternion`")
   
+  def __isub__(self, other):
+    if isinstance(other, Quaternion):
+      self.q -= other.q
+      self._R = None
+      return self
+    else:
+      raise AssertionError("Unsupported type for subtraction on `Quaternion`")
+  
+  def __imul__(self, other):
+    if isinstance(other, SCALAR_TYPES):
+      self.q *= other
+      self._R = None
+      return self
+    else:
+      raise TypeError("Unsupported type for `multiplication`")
+  
+  def copy_from(self, other: Quaternion) -> Quaternion:
+    """ overwrites this quaternion's buffer with the elements of another without allocating
+
+    Args:
+        other (Quaternion): the quaternion to copy
+
+    Returns:
+        Quaternion: self
+    """
+    if other is not self:
+      self.q[:] = other.q
+      self._R = other._R
+    return self
+  
+  def set_elements(self, elements: QuaternionElements) -> Quaternion:
+    """ unchecked in-place write of (w, x, y, z) for internal code, e.g. an integrator storing its result in the design's buffer
+
+    Args:
+        elements (QuaternionElements): the new elements
+
+    Returns:
+        Quaternion: self
+    """
+    self.q[:] = elements
+    self._R = None
+    return self
+  
   def get_vector(self) -> Vector:
-    return Vector(elements=(self.q[i][0], self.q[j][1], self.q[k][2]))
+    return Vector.from_buffer(self.q[i:].copy())
   
   def get_scalar(self) -> float:
     return self.q[w]
   
   def get_rotation_matrix(self) -> NDArray:
-    _identity = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1]], np.float32)
-    _skewSymmetric = np.array([
-      [0, -self.q[k][k - 1], self.q[j][j - 1]],
-      [self.q[k][k - 1], 0, -self.q[i][i - 1]],
-      [-self.q[j][j - 1], self.q[i][i - 1], 0]
-    ], dtype=np.float32)
+    """ builds the rotation matrix R such that R @ v equals q v q*, cached until this quaternion changes
+
+    - the quaternion does not need to be a unit quaternion, the matrix is scaled by 1 / |q|^2 instead of normalizing in place
+
+    Returns:
+        NDArray: read-only 3x3 rotation matrix
+    """
+    if self._R is None:
+      qw, qx, qy, qz = self.q
+      s = 2.0 / (qw * qw + qx * qx + qy * qy + qz * qz)
+      self._R = np.array([
+        [1.0 - s * (qy * qy + qz * qz), s * (qx * qy - qw * qz), s * (qx * qz + qw * qy)],
+        [s * (qx * qy + qw * qz), 1.0 - s * (qx * qx + qz * qz), s * (qy * qz - qw * qx)],
+        [s * (qx * qz - qw * qy), s * (qy * qz + qw * qx), 1.0 - s * (qx * qx + qy * qy)]
+      ], dtype=self.q.dtype)
+      self._R.flags.writeable = False
     
-    _rotationMatrix = _identity + 2 * self.q[w] * _skewSymmetric + 2 * np.matmul(_skewSymmetric, _skewSymmetric)
-    return _rotationMatrix
+    return self._R
   
   def __getitem__(self, key: int):
     if isinstance(key, int):
-      if key == 0:
-        return self.q[w]
-      elif key == 1:
-        return self.q[i][i - 1]
-      elif key == 2:
-        return self.q[j][j - 1]
-      elif key == 3:
-        return self.q[k][k - 1]
+      if 0 <= key < 4:
+        return self.q[key]
       else:
         raise KeyError("Index out of bounds on `Quaternion()` object")
     else:
@@ -165,6 +258,8 @@ class Quaternion:
 
 
 class Vector:
+  __slots__ = ("v",)
+  
   def __init__(self, elements: VectorElements):
     """ A 3 dimensional mathematical object
 
@@ -172,31 +267,55 @@ class Vector:
         elements (VectorElements): must be a VectorElements type containing floating point values with length of 3
     """
     if len(elements) == 3:
-      self.v = np.array([elements[0], elements[1], elements[2]], dtype=np.float32)
+      self.v = np.array(elements, dtype=getPrecision())
     else:
       raise AssertionError('`elements` attribute not properly specified for `Vector()` constructor. Must be length 3: no more, no less')
   
+  @classmethod
+  def from_buffer(cls, buffer: NDArray) -> Vector:
+    """ unchecked constructor for internal code that already holds a valid 3 element array
+
+    - no validation and no copy: the vector takes ownership of `buffer`, which must be a fresh 3 element array of the active
+      `Precision.py` dtype. Anything coming from outside the physics core goes through `Vector()` instead
+
+    Args:
+        buffer (NDArray): the array to wrap
+
+    Returns:
+        Vector: a vector viewing `buffer`
+    """
+    _v = cls.__new__(cls)
+    _v.v = buffer
+    return _v
+  
   def extend_to_quaternion(self) -> Quaternion:
-    return Quaternion(elements=(0, self.v[0], self.v[1], self.v[2]), default=False, is_vector=True)
+    _buffer = np.zeros(4, dtype=self.v.dtype)
+    _buffer[i:] = self.v
+    return Quaternion.from_buffer(_buffer)
   
   def get_magnitude(self) -> float:
     return np.linalg.norm(self.v)
   
   def normalize(self) -> None:
-    self.v = self.v / self.get_magnitude()
+    self.v /= self.get_magnitude()
+  
+  def set_precision(self) -> None:
+    """ recasts the buffer to the active `Precision.py` dtype
+    """
+    self.v = asPrecision(self.v)
   
   def get_unit(self) -> NDArray:
-    return np.copy(self.v) / self.get_magnitude()
+    return self.v / self.get_magnitude()
 
   def __str__(self):
     return f"v = ( {self.v[0]:.4f}, {self.v[1]:.4f}, {self.v[2]:.4f} ) \t|v| = {(np.dot(self.v, self.v) ** 0.5):.4f}"
   
   def __add__(self, v: Vector) -> Vector:
-    return Vector(elements=(self.v[0] + v.v[0], self.v[1] + v.v[1], self.v[2] + v.v[2]))
+    return Vector.from_buffer(self.v + v.v)
   
   def __mul__(self, other) -> Vector:
-    if isinstance(other, (int, float)):
-      return Vector(elements=(self.v[0] * other, self.v[1] * other, self.v[2] * other))
+    if isinstance(other, SCALAR_TYPES):
+      return Vector.from_buffer((self.v * other).astype(self.v.dtype, copy=False))
     else:
       raise AssertionError("Invalid type attempted to multiply with type `Vector`")
   
@@ -205,32 +324,81 @@ class Vector:
   
   def __iadd__(self, other):
     if isinstance(other, Vector):
-      return Vector(elements=(self.v[0] + other.v[0], self.v[1] + other.v[1], self.v[2] + other.v[2]))
+      self.v += other.v
+      return self
     else:
       raise AssertionError(f"Vector cannot be added to another variable of type {type(other)}")
+  
+  def __isub__(self, other):
+    if isinstance(other, Vector):
+      self.v -= other.v
+      return self
+    else:
+      raise AssertionError(f"Vector cannot be subtracted from another variable of type {type(other)}")
+  
+  def __imul__(self, other):
+    if isinstance(other, SCALAR_TYPES):
+      self.v *= other
+      return self
+    else:
+      raise AssertionError("Invalid type attempted to multiply with type `Vector`")
+  
+  def add_scaled(self, other: Vector, scale: float) -> Vector:
+    """ in place self += scale * other, the update used for every explicit integration step
+
+    Args:
+        other (Vector): the rate of change, e.g. velocity for a position
+        scale (float): the scaling, e.g. the time step
+
+    Returns:
+        Vector: self
+    """
+    self.v += scale * other.v
+    return self
+  
+  def set_elements(self, elements: VectorElements) -> Vector:
+    """ unchecked in-place write of (x, y, z) for internal code, e.g. an integrator storing its result in the design's buffer
+
+    Args:
+        elements (VectorElements): the new elements
+
+    Returns:
+        Vector: self
+    """
+    self.v[:] = elements
+    return self
+  
+  def copy_from(self, other: Vector) -> Vector:
+    """ overwrites this vector's buffer with the elements of another without allocating
+
+    Args:
+        other (Vector): the vector to copy
+
+    Returns:
+        Vector: self
+    """
+    if other is not self:
+      self.v[:] = other.v
+    return self
 
   def __len__(self):
     return 3
   
   def __getitem__(self, key: int):
     if isinstance(key, int):
-      if key == 0:
-        return self.v[0]
-      elif key == 1:
-        return self.v[1]
-      elif key == 2:
-        return self.v[2]
+      if 0 <= key < 3:
+        return self.v[key]
       else:
         raise KeyError("Index out of bounds on `Vector()` object")
     else:
       raise KeyError("Key must be an int for accessing items in `Vector()` class")
   
   def __truediv__(self, other) -> Vector:
-    if isinstance(other, (int, float)):
+    if isinstance(other, SCALAR_TYPES):
       if other == 0 or other == 0.0:
         raise ZeroDivisionError()
       else:
-        return Vector(elements=(self.v[0] / other, self.v[1] / other, self.v[2] / other))
+        return Vector.from_buffer((self.v / other).astype(self.v.dtype, copy=False))
     else:
       raise TypeError("Unsupported type for `division`")
 
@@ -246,45 +414,59 @@ def quaternionDot(q1: Quaternion, q2: Quaternion) -> float:
   Returns:
       float: the inner product of quaternion vector parts, makes use of special complex property where its square is equal to -1
   """
-  _dot = - q1.q[i][0] * q2.q[i][0] - q1.q[j][1] * q2.q[j][1] - q1.q[k][2] * q2.q[k][2]
+  _dot = - np.dot(q1.q[i:], q2.q[i:])
   return _dot
 
-def hamiltonProduct(q1: Quaternion, q2: Quaternion) -> Quaternion:
+def hamiltonProduct(q1: Quaternion, q2: Quaternion, out: Quaternion = None) -> Quaternion:
   """ Applies quaternion multiplication between 2 quaternions, q1 applied from the left to q2
   
   Args:
       q1 (Quaternion): a quaternion performing a transformation
       q2 (Quaternion): a quaternion being transformed
+      out (Quaternion, optional): quaternion to write the product into, may be q1 or q2 itself. Defaults to None, a new quaternion.
   
   Returns:
       Quaternion: the final transformed quaternion
   """
-  scalar = q1.q[w] * q2.q[w] + quaternionDot(q1=q1, q2=q2)
-  vector = q1.q[w] * (q2.q[i] + q2.q[j] + q2.q[k]) + q2.q[w] * (q1.q[i] + q1.q[j] + q1.q[k]) + np.cross(a=(q1.q[i] + q1.q[j] + q1.q[k]), b=(q2.q[i] + q2.q[j] + q2.q[k]))
+  product = quatMultiply(q1=q1.q.tolist(), q2=q2.q.tolist()) # plain float kernel, np.cross on 3 elements costs more than the math
   
-  return Quaternion(elements=(scalar, vector[0], vector[1], vector[2]), default=False, is_vector=True)
+  if out is None:
+    out = Quaternion.from_buffer(np.empty(4, dtype=q2.q.dtype))
+  
+  out.q[:] = product
+  out._R = None
+  return out
 
-def rotateVector(q: Quaternion, v: Vector) -> Vector:
+def rotateVector(q: Quaternion, v: Vector, out: Vector = None) -> Vector:
   """ Rotates a 3-d vector given a quaternion
 
+  - equivalent to q v q* but reuses the cached rotation matrix of q, so rotating several vectors by the same q builds it only once
+
   Args:
       q (Quaternion): rotation operator
       v (Vector): a vector to be rotated
+      out (Vector, optional): vector to write the result into, may be v itself. Defaults to None, a new vector.
 
   Returns:
       Vector: the final rotated vector
   """
-  # Convert vector to quaternion form
-  v_q = v.extend_to_quaternion()
+  if out is None:
+    return Vector.from_buffer(np.matmul(q.get_rotation_matrix(), v.v))
   
-  # And get q conjugate to complete the rotation
-  if q.is_norm():
-    qinv = q.get_conjugate()
+  np.matmul(q.get_rotation_matrix(), v.v, out=out.v)
+  return out
 
-  intermediateV = hamiltonProduct(q1=q, q2=v_q)
-  finalV = hamiltonProduct(q1=intermediateV, q2=qinv)
-  
-  return finalV.contract_to_vector()
+def rotateVectors(q: Quaternion, vectors: NDArray) -> NDArray:
+  """ Rotates a stack of 3-d vectors by the same quaternion with a single matrix multiply
+
+  Args:
+      q (Quaternion): rotation operator
+      vectors (NDArray): (N, 3) array of vectors to be rotated
+
+  Returns:
+      NDArray: (N, 3) array of rotated vectors
+  """
+  return np.matmul(vectors, q.get_rotation_matrix().T)
 
 def rotateQuaternion(q1: Quaternion, q2: Quaternion) -> Quaternion:
   """ Transforms a quaternion representing a single rotation from one initial frame to the continuously evolving body frame
@@ -306,34 +488,46 @@ def rotateQuaternion(q1: Quaternion, q2: Quaternion) -> Quaternion:
 def exponentiateQuaternion(q: Quaternion, ε: float = 1e-6) -> Quaternion:
   """ Exponentiation of a quaternion to produce a new quaternion -> for solving differential equations on SO(3)
 
+  - the vector part is treated as a rotation vector and mapped through `expMap()`, whose series expansion near zero rotation replaced
+    the old cutoff, so the result is smooth through θ = 0
+
   Args:
       q (Quaternion): a unit quaternion to be exponentiated
-      ε (float): tolerance for minimum vector part magnitude to avoid `Division By Zero Error`
+      ε (float): no longer used, kept so existing calls keep working
 
   Returns:
       Quaternion: a new unit quaternion generated by exp(q)
   """
-  a = q.get_scalar()
-  v = q.get_vector()
-  θ = v.get_magnitude()
-  
-  if θ > ε:
-    #v_hat = v.get_unit() -> No longer need to normalize the vector part of AngleVector() type for Quaternion() constructor
-    return np.exp(a) * Quaternion(angle_vector=(θ, v.v), is_vector=True)
-  else:
-    return np.exp(a) * Quaternion(default=True) # return the zero quaternion (1, 0, 0, 0) i.e. no rotation
+  _q = Quaternion.from_buffer(expMap(phi=q.q[i:]))
+  _q *= np.exp(q.q[w])
+  return _q
+
+def attitudeError(q1: Quaternion, q2: Quaternion) -> float:
+  """ angle of the rotation taking attitude q1 to attitude q2, a metric on orientations
+
+  Args:
+      q1 (Quaternion): first attitude
+      q2 (Quaternion): second attitude
+
+  Returns:
+      float: angle in radians in [0, π]
+  """
+  return float(np.linalg.norm(logMap(q=hamiltonProduct(q1=q2, q2=q1.get_conjugate()).q)))
 
 
 __all__ = [
   "QuaternionElements",
-  "QuaternionTuple",
+  "QuaternionBuffer",
+  "NORM_TOLERANCE",
   "Quaternion",
   "AngleVector",
   "VectorElements",
   "Vector",
   "rotateVector",
+  "rotateVectors",
   "rotateQuaternion",
   "hamiltonProduct",
   "exponentiateQuaternion",
+  "attitudeError",
   "np"
 ]
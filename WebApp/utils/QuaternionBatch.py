@@ -0,0 +1,138 @@
+from __future__ import annotations
+from typing import List
+import numpy as np
+from numpy.typing import NDArray
+
+from Quaternion import *
+from ExponentialMap import *
+
+"""
+Description: QuaternionBatch.py is the vectorized companion of Quaternion.py. Every function here takes whole stacks of quaternions
+with shape (N, 4) laid out as (w, x, y, z) and stacks of vectors with shape (N, 3), and performs the same operation as its single object
+counterpart in one numpy call. A single quaternion of shape (4,) or vector of shape (3,) broadcasts against a stack, so one attitude can
+rotate a whole set of vectors or a whole attitude history can rotate one fixed body axis.
+"""
+
+QuaternionArray = NDArray[np.floating] # shape (N, 4) or (4,)
+VectorArray = NDArray[np.floating] # shape (N, 3) or (3,)
+
+
+def quaternionsToArray(quaternions: List[Quaternion]) -> QuaternionArray:
+  """ stacks a list of `Quaternion()` objects into a single (N, 4) array
+
+  Args:
+      quaternions (List[Quaternion]): the quaternions to stack
+
+  Returns:
+      QuaternionArray: (N, 4) array of (w, x, y, z) rows
+  """
+  return np.array([_q.q for _q in quaternions])
+
+def vectorsToArray(vectors: List[Vector]) -> VectorArray:
+  """ stacks a list of `Vector()` objects into a single (N, 3) array
+
+  Args:
+      vectors (List[Vector]): the vectors to stack
+
+  Returns:
+      VectorArray: (N, 3) array of (x, y, z) rows
+  """
+  return np.array([_v.v for _v in vectors])
+
+def batchConjugate(qs: QuaternionArray) -> QuaternionArray:
+  """ conjugates every quaternion in the stack
+
+  Args:
+      qs (QuaternionArray): quaternions to conjugate
+
+  Returns:
+      QuaternionArray: (w, -x, -y, -z) for every row
+  """
+  conjugates = np.array(qs, copy=True)
+  conjugates[..., 1:] *= -1
+  return conjugates
+
+def batchNormalize(qs: QuaternionArray) -> QuaternionArray:
+  """ scales every quaternion in the stack to unit length
+
+  Args:
+      qs (QuaternionArray): quaternions to normalize
+
+  Returns:
+      QuaternionArray: unit quaternions
+  """
+  return qs / np.linalg.norm(qs, axis=-1, keepdims=True)
+
+def batchHamiltonProduct(q1s: QuaternionArray, q2s: QuaternionArray) -> QuaternionArray:
+  """ applies quaternion multiplication row by row, q1s applied from the left to q2s
+
+  Args:
+      q1s (QuaternionArray): quaternions performing the transformations
+      q2s (QuaternionArray): quaternions being transformed
+
+  Returns:
+      QuaternionArray: the transformed quaternions
+  """
+  w1, v1 = q1s[..., :1], q1s[..., 1:]
+  w2, v2 = q2s[..., :1], q2s[..., 1:]
+
+  scalar = w1 * w2 - np.sum(v1 * v2, axis=-1, keepdims=True)
+  vector = w1 * v2 + w2 * v1 + np.cross(v1, v2)
+
+  return np.concatenate((scalar, vector), axis=-1)
+
+def batchRotateVector(qs: QuaternionArray, vs: VectorArray) -> VectorArray:
+  """ rotates vectors by quaternions row by row, same as `rotateVector()` without building the intermediate products
+
+  - uses v' = v + 2w (u x v) + 2u x (u x v) which equals q v q* for a unit quaternion q = (w, u)
+
+  Args:
+      qs (QuaternionArray): rotation operators, normalized internally just like `rotateVector()` does
+      vs (VectorArray): vectors to be rotated
+
+  Returns:
+      VectorArray: the rotated vectors
+  """
+  qs = batchNormalize(qs=qs)
+  w, u = qs[..., :1], qs[..., 1:]
+
+  uxv = np.cross(u, vs)
+  return vs + 2 * w * uxv + 2 * np.cross(u, uxv)
+
+def batchExponentiate(qs: QuaternionArray, ε: float = 1e-6) -> QuaternionArray:
+  """ exponentiates every quaternion in the stack with the same convention as `exponentiateQuaternion()`
+
+  Args:
+      qs (QuaternionArray): quaternions to be exponentiated
+      ε (float): no longer used, kept so existing calls keep working
+
+  Returns:
+      QuaternionArray: exp(w) * expMap(u) for every row (w, u), see `batchExpMap()`
+  """
+  return np.exp(qs[..., :1]) * batchExpMap(phis=qs[..., 1:])
+
+def batchAttitudeError(q1s: QuaternionArray, q2s: QuaternionArray) -> NDArray:
+  """ angle of the rotation taking each attitude in q1s to the matching attitude in q2s
+
+  Args:
+      q1s (QuaternionArray): unit quaternions
+      q2s (QuaternionArray): unit quaternions
+
+  Returns:
+      NDArray: (N,) angles in radians in [0, π]
+  """
+  return np.linalg.norm(batchLogMap(qs=batchHamiltonProduct(q1s=q2s, q2s=batchConjugate(qs=q1s))), axis=-1)
+
+
+__all__ = [
+  "QuaternionArray",
+  "VectorArray",
+  "quaternionsToArray",
+  "vectorsToArray",
+  "batchConjugate",
+  "batchNormalize",
+  "batchHamiltonProduct",
+  "batchRotateVector",
+  "batchExponentiate",
+  "batchAttitudeError"
+]
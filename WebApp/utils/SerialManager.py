@@ -81,7 +81,7 @@ class SerialManager:
     Returns:
         bool: success or failure to send
     """
-    w, x, y, z = q.q[0], q.q[1][0], q.q[2][1], q.q[3][2]
+    w, x, y, z = q[0], q[1], q[2], q[3]
     data = f"{w},{x},{y},{z}\n".encode("utf-8")
     self.serial.write(data)
     print(f"Sent: {data.decode("utf-8").strip()}")
@@ -97,7 +97,7 @@ def serializeQuaternion(q: Quaternion) -> bytes:
   Returns:
       bytes: the packed data ready for serial transmission
   """
-  return struct.pack(QUATERNION_PACKET, *(q.q[0], q.q[1][0], q.q[2][1], q.q[3][2]))
+  return struct.pack(QUATERNION_PACKET, *(q[0], q[1], q[2], q[3]))
 
 if __name__ == "__main__":
   ser = SerialManager("/dev/tty.usbserial-210", 115200)
@@ -3,12 +3,16 @@
 
 mean: 0.361 seconds for F15 with drag, no thrust vectoring
 standard deviation: 0.0623 seconds
+
+these were recorded without thrust vectoring and at an unstated dt, time the current loop with `benchmarkSimulation()` in Benchmarks.py
 """
 
 from __future__ import annotations
-from typing import Any, Dict
+from typing import Any, Dict, List, Iterator
+import math
 import pandas as pd
 from time import time
+from bisect import bisect_right
 
 from Quaternion import *
 from Integrator import *
@@ -20,121 +24,153 @@ from ElementTypes import *
 from MotorManager import *
 from ThrustVectorController import *
 from SerialManager import *
+from Precision import *
+from QuaternionBatch import *
+from AttitudeConversions import *
+from Kernels import *
+from Dynamics import *
+from Interpolation import *
+from TorqueFree import *
+from Events import *
+from Monitors import *
+from Checkpoint import *
+from Trajectory import *
+from PostProcessing import *
 
 
-def simulationLoop(
+def simulationStream(
     serial_manager: SerialManager,
     design: Design,
     tvc: ThrustVectorController,
     motor_idx: int,
     dt: float = 1e-3,
-    save: bool = False,
-    filename: str = None
-  ) -> None:
-  """ performs a generic model rocket flight simulation and produces solutions to the equations of motion
+    precision: str = DEFAULT_PRECISION,
+    integrator: str = "euler",
+    step_controller: StepSizeController = None,
+    substeps: int = None,
+    coast_dt: float = None,
+    t_final: float = 20.0,
+    rail_length: float = RAIL_LENGTH,
+    events: List[Event] = None,
+    monitor: bool = False,
+    recording: RecordingPolicy = None,
+    resume: Checkpoint = None,
+    checkpoint: bool = False,
+    chunk_size: int = None
+  ) -> Iterator[Trajectory]:
+  """ performs a generic model rocket flight simulation and yields the solution in chunks as it is computed
 
   - assumes all presets have been completed prior to call. verify this in the api or webapp side to prevent failures
+  - computes only: nothing is rendered or written, see PostProcessing.py for the animation, the csv and the plots
+  - the run advances only while the consumer asks for the next chunk, so a live plot, the web app or a disk writer works on the first rows
+    within milliseconds, and only chunk_size rows are held at a time. `concatenateTrajectories()` stitches the chunks back into one flight
 
   Args:
       serial_manager (SerialManager): a non-listening state serial manager object already connected to the port of interest
       design (Design): a completed vehicle design
       tvc (ThrustVectorController): a completed and initialized thrust vectoring unit
       motor_idx (int): index of the motor in the design
-      dt (float, optional): small time step. Defaults to 1e-2.
-      save (bool, optional): file is always saved to temp.mp4, but you can modify that here. Defaults to False.
-      filename (str, optional): enter the filename if you wish to save it somewhere other than temp.mp4. Defaults to None.
+      dt (float, optional): small time step, or the first step and the animation frame interval in adaptive mode. Defaults to 1e-2.
+      precision (str, optional): floating point policy for the whole run, see `Precision.py`. Defaults to DEFAULT_PRECISION.
+      integrator (str, optional): a key of `INTEGRATORS`, "euler" for the explicit Euler step, "semi_implicit_euler", the classical "rk4",
+        the 4th order Runge-Kutta-Munthe-Kaas step "rkmk4", which holds at dt = 1e-2 the accuracy "euler" needs dt = 1e-3 for, or the 3rd
+        order "crouch_grossman". See `benchmarkIntegrators()` in Benchmarks.py for their cost and accuracy. Defaults to "euler".
+      step_controller (StepSizeController, optional): switches to adaptive steps with error control, the tolerances and step bounds are
+        set on the controller and `integrator` is ignored. Steps never cross a thrust curve breakpoint, burnout, the end of the pad hold or
+        the moment the servos reach their targets. Defaults to None, fixed steps of dt.
+      substeps (int, optional): switches to multi-rate steps, see `multirateStep()`: translation and mass properties advance in steps of dt
+        while the attitude, the servos and the serial link run at dt / substeps, e.g. dt = 1e-2 and 10 substeps keep a 1 kHz control loop.
+        `integrator` is ignored and it cannot be combined with `step_controller`. Defaults to None, every subsystem at dt.
+      coast_dt (float, optional): after burnout an axisymmetric vehicle switches to `coastStep()` with steps of this size, where the attitude
+        follows the exact torque free solution. Defaults to None, no coasting steps.
+      t_final (float, optional): time limit of the run in seconds, most runs end earlier at ground impact. Defaults to 20.0.
+      rail_length (float, optional): length of the launch rail for the rail exit event. Defaults to RAIL_LENGTH.
+      events (List[Event], optional): user events, checked after the built in apogee, burnout, rail exit and ground impact events. Each one
+        is located inside its step by root finding, a terminal one ends the run exactly at the crossing and any one may switch the flight
+        phase. Defaults to None.
+      monitor (bool, optional): records the conservation diagnostics of `ConservationMonitor()` every step, adds their history as the
+        "quaternion_norm_drift", "angular_momentum_drift", "rotational_energy_drift" and "energy_residual" channels and their
+        `MonitorSummary` to the metadata, so a coarse run can be judged without a fine reference run. Defaults to False.
+      recording (RecordingPolicy, optional): which steps become rows, e.g. `RecordingPolicy(rate=100.0)` for 100 Hz output from steps of
+        dt = 1e-3. the monitor channels follow the same rows while the monitors still check every step. Defaults to None, every step.
+      resume (Checkpoint, optional): carries on from a checkpoint instead of the pad, restoring it into the design and the thrust vectoring
+        unit first. the continuation is the same flight the checkpointed run would have flown, except that the monitors start over at the
+        checkpoint. Defaults to None, a run from t = 0.
+      checkpoint (bool, optional): takes a `Checkpoint` at the end of every chunk into its metadata, see Checkpoint.py. Defaults to False.
+      chunk_size (int, optional): rows per chunk, 1 for a snapshot of every step. Defaults to None, the whole run as one chunk.
+  
+  Raises:
+      KeyError: integrator is not a key of `INTEGRATORS`
+      ValueError: substeps is not a positive whole number, or both substeps and step_controller are set
+  
+  Yields:
+      Trajectory: the next rows of the flight with their flight phases and the events located in them. The metadata describes the run so
+        far, the loop wall time without the time spent in the consumer and the monitor summary up to the last row
   """
   if serial_manager is None:
     ignore_serial = True
   else:
     ignore_serial = False
   
-  t = 0.0
-  dt = dt
-  tFinal = 20.0
-  n = 0
-
-  positions = []
-  body_x = []
-  body_y = []
-  body_z = []
-  targetx = []
-  targety = []
-  thetax = []
-  thetay = []
-  velocities = []
-  accelerations = []
-  omegas = []
-  alphas = []
-  cgs = []
-  
-  x_body_axis = Vector(elements=(1, 0, 0))
-  y_body_axis = Vector(elements=(0, 1, 0))
-  z_body_axis = Vector(elements=(0, 0, 1))
-  r = design.r
-  v = design.v
-  q = design.q
-  omega = design.omega
-  
-  if not ignore_serial:
-    serial_manager.activateListener()
-    serial_manager.sendData(q=q)
-  
-  start = time()
+  if integrator in INTEGRATORS.keys():
+    step = INTEGRATORS[integrator]
+  else:
+    raise KeyError(f"Integrator must be one of {list(INTEGRATORS.keys())}")
+  if substeps is not None and (isinstance(substeps, bool) or not isinstance(substeps, int) or substeps < 1):
+    raise ValueError("substeps must be a positive whole number")
+  if substeps is not None and step_controller is not None:
+    raise ValueError("Multi-rate steps and adaptive steps cannot be combined, set either substeps or step_controller")
   
-  while t < tFinal:
-    n += 1
-    mass, cg, inertia_tensor = design.get_temporary_properties()
-    inertia_tensor_inv = np.linalg.inv(inertia_tensor)
-    F, M = tvc.getThrustVector(t=t, cg=cg)
-    F = rotateVector(q=q, v=Vector(elements=(F[0], F[1], F[2])))
-    M = rotateVector(q=q, v=Vector(elements=(M[0],M[1], M[2])))
-    
-    F = np.array([F[0], F[1], F[2]])
-    M = np.array([M[0], M[1], M[2]])
+  # the run's precision is only active while it computes, the caller's setting is restored however the run ends
+  previous_precision = next(name for name, dtype in PRECISIONS.items() if dtype == getPrecision())
+  try:
+    setPrecision(precision=precision)
+    design.set_precision()
     
-    F += mass * np.array([0.0, 0.0, -9.8]) - 0.5 * 0.99 * 0.2 * np.pi * 0.037 ** 2 * np.linalg.norm(v.v) * v.v # lazy man's drag force
-    
-    alpha = np.matmul(inertia_tensor_inv, M - np.cross(a=omega.v, b=np.matmul(inertia_tensor, omega.v)))
-    alpha = Vector(elements=(alpha[0], alpha[1], alpha[2]))
-    
-    a = F / mass
-    a = Vector(elements=(a[0], a[1], a[2]))
-    
-    if n < 100 and a.v[2] < 0.0:
-      # if the motor is starting, do not acclerate down because of gravity - the earth provides a normal force equal to gravity
-      a.v[2] = 0.0
-    
-    q, omega = solver(omega=omega, alpha=alpha, q=q, dt=dt, display=False)
-    r += v * dt
-    v += a * dt
-    design += KinematicData(
-      R=r,
-      V=v,
-      Q=q,
-      OMEGA=omega
-    )
-    
-    body_x.append(rotateVector(q=q, v=x_body_axis))
-    body_y.append(rotateVector(q=q, v=y_body_axis))
-    body_z.append(rotateVector(q=q, v=z_body_axis))
-    positions.append(r)
-    targetx.append(tvc.targetx)
-    targety.append(tvc.targety)
-    thetax.append(tvc.thetax)
-    thetay.append(tvc.thetay)
-    velocities.append(v)
-    accelerations.append(Vector(elements=(a[0], a[1], a[2])))
-    omegas.append(omega)
-    alphas.append(alpha)
-    cgs.append(cg)
+    t = 0.0
+    dt = dt
+    n = 0
+    phase = "rail"
+    event_log: List[EventRecord] = []
+    dynamics = RigidBodyDynamics(design=design, tvc=tvc)
+    events = [
+      apogeeEvent(),
+      burnoutEvent(burn_time=tvc.burn_time),
+      railExitEvent(rail_length=rail_length),
+      groundImpactEvent(pad_hold_time=dynamics.pad_hold_time),
+      *(events if events is not None else [])
+    ]
+
+    if resume is not None:
+      restoreCheckpoint(checkpoint=resume, design=design, tvc=tvc)
+      t, n, phase = resume["t"], resume["steps"], resume["phase"]
+      event_log.extend(resume["events"])
     
-    #tvc.updateSetpoint(targetx=1e-1 * DEGREES_TO_RADIANS, targety=1e-1 * DEGREES_TO_RADIANS)
+    # one row per recorded step of dt up to t_final, a run with more rows, e.g. on adaptive steps, grows the buffer
+    if recording is None:
+      interval = None if step_controller is not None else dt
+    else:
+      interval = recording.interval(dt=dt)
+    uniform = interval is not None and step_controller is None and (recording is None or recording.is_uniform(dt=dt))
+    capacity = max(math.ceil((t_final - t) / (dt if interval is None else interval)) + 1, 1) if chunk_size is None else chunk_size
+    recorder = TrajectoryRecorder(capacity=capacity)
+    events_recorded = len(event_log)
+    recorded_steps: List[bool] = [] # which steps since the last chunk were recorded, to pick the matching monitor rows
+    chunks = 0
+    simulation_time = 0.0
     
-    design.step(dt=dt)
-    tvc.step(dt=dt)
+    dt_next = dt if resume is None or resume["dt_next"] is None else resume["dt_next"]
+    coasting = False
+    on_grid = t == n * dt # fixed steps end on multiples of dt
+    monitors = ConservationMonitor(gravity=dynamics.gravity) if monitor else None
+    breakpoints = sorted({*tvc.motor_manager.time_intercepts, tvc.burn_time, dynamics.pad_hold_time, t_final})
+    r = design.r
+    v = design.v
+    q = design.q
+    omega = design.omega
     
-    if not ignore_serial:
+    def exchangeSerial() -> None:
+      # hardware in the loop, adopt the newest setpoint from the flight computer and report the attitude back
       if not serial_manager.queue.empty():
         anglex, angley = serial_manager.queue.get()
         anglex *= DEGREES_TO_RADIANS # convert both to radians from degrees
@@ -143,47 +179,266 @@ def simulationLoop(
       
       serial_manager.sendData(q=q)
     
-    design.dynamic_elements[motor_idx][1] = tvc.getAttitude()
-
-    t += dt
+    if not ignore_serial:
+      serial_manager.activateListener()
+      serial_manager.sendData(q=q)
     
-    if n > 100:
-      if r.v[2] <= 0.0:
+    def chunk() -> Trajectory:
+      nonlocal recorder, events_recorded, recorded_steps, chunks
+      extra = None
+      if monitor:
+        history = monitors.history(clear=True)
+        rows = slice(None) if recording is None else np.array(recorded_steps, dtype=bool)
+        extra = {
+          "quaternion_norm_drift": history["quaternion_norm"][rows],
+          "angular_momentum_drift": history["angular_momentum"][rows],
+          "rotational_energy_drift": history["rotational_energy"][rows],
+          "energy_residual": history["energy_residual"][rows]
+        }
+      metadata = TrajectoryMetadata(
+        dt=dt,
+        integrator="adaptive" if step_controller is not None else "multirate" if substeps is not None else integrator,
+        precision=precision,
+        burn_time=tvc.burn_time,
+        uniform=uniform and not coasting,
+        interval=interval,
+        simulation_time=simulation_time,
+        monitors=monitors.summary() if monitor else None,
+        checkpoint=takeCheckpoint(design=design, tvc=tvc, t=t, steps=n, dt_next=dt_next, phase=phase, events=event_log) if checkpoint else None
+      )
+      trajectory = recorder.finish(events=event_log[events_recorded:], metadata=metadata, extra=extra)
+      recorder = TrajectoryRecorder(capacity=capacity)
+      events_recorded = len(event_log)
+      recorded_steps = []
+      chunks += 1
+      return trajectory
+    
+    if recording is not None:
+      recording.start()
+    
+    start = time()
+    
+    while t < t_final:
+      n += 1
+      state = readState(r=r, v=v, q=q, omega=omega)
+      # r, v, q and omega are the design's own state buffers, so the whole update happens in place and the design needs no write back
+      if coast_dt is not None and dynamics.is_torque_free(t=t):
+        # a coasting step ends at the next breakpoint, at t_final or when the servos reach their targets
+        t_limit = breakpoints[bisect_right(breakpoints, t)]
+        if (arrival := tvc.getArrivalTime()) > 0.0:
+          t_limit = min(t_limit, t + arrival)
+        # a limit within rounding of a full step is landed on exactly, so no sliver of a step is left before it
+        landing = t_limit - t <= coast_dt * (1.0 + 1e-9)
+        coast_step = t_limit - t if landing else coast_dt
+        if not coasting or arrival > 0.0:
+          # checked again while the servos move the motor, which can break the symmetry the closed form relies on
+          coasting = axisymmetricInertia(I=dynamics.mass_properties(h=0.5 * coast_step)[2]) is not None
+          if not coasting:
+            coast_dt = None # no closed form, keep the regular steps without checking again
+      
+      if coasting:
+        a, alpha, cg = coastStep(dynamics=dynamics, t=t, dt=coast_step, r=r, v=v, q=q, omega=omega)
+        dt_taken = coast_step
+        t_next = t_limit if landing else t + coast_step
+        on_grid = False
+      elif substeps is not None:
+        a, alpha, cg = multirateStep(dynamics=dynamics, t=t, dt=dt, substeps=substeps, r=r, v=v, q=q, omega=omega, on_substep=None if ignore_serial else exchangeSerial)
+        dt_taken = dt
+        t_next = n * dt if on_grid else t + dt
+      elif step_controller is None:
+        a, alpha, cg = step(dynamics=dynamics, t=t, dt=dt, r=r, v=v, q=q, omega=omega)
+        dt_taken = dt
+        # a product instead of a running sum, so step boundaries land exactly on times like PAD_HOLD_TIME, until a coast leaves the grid
+        t_next = n * dt if on_grid else t + dt
+      else:
+        t_limit = breakpoints[bisect_right(breakpoints, t)]
+        if (arrival := tvc.getArrivalTime()) > 0.0:
+          t_limit = min(t_limit, t + arrival)
+        a, alpha, cg, dt_taken, dt_next = adaptiveStep(dynamics=dynamics, controller=step_controller, t=t, dt=dt_next, t_limit=t_limit, r=r, v=v, q=q, omega=omega)
+        t_next = t_limit if dt_taken == t_limit - t else t + dt_taken
+      
+      if monitor:
+        # the design's masses are still those at t here, so the torque free inertia matches the state at the start of the step
+        monitors.record(t=t, state=state, a=a, on_pad=t < dynamics.pad_hold_time, I=dynamics.mass_properties()[2] if dynamics.is_torque_free(t=t) else None)
+      
+      terminated = False
+      for event, t_event, event_state in detectEvents(events=events, t0=t, state0=state, t1=t_next, state1=readState(r=r, v=v, q=q, omega=omega)):
+        event_log.append(eventRecord(event=event, t=t_event, state=event_state))
+        if event.phase is not None:
+          phase = event.phase
+        if event.terminal:
+          # the run ends exactly at the crossing instead of at the end of the step that found it
+          writeState(state=event_state, r=r, v=v, q=q, omega=omega)
+          dt_taken = t_event - t
+          t_next = t_event
+          terminated = True
+          break
+      
+      recorded = recording is None or recording.record(t=t_next, state=design.state, last=terminated or t_next >= t_final)
+      if monitor and recording is not None:
+        recorded_steps.append(recorded)
+      if recorded:
+        recorder.append(
+          phase=phase,
+          time=t_next,
+          position=r.v,
+          attitude=q.q,
+          targetx=tvc.targetx,
+          targety=tvc.targety,
+          thetax=tvc.thetax,
+          thetay=tvc.thetay,
+          velocity=v.v,
+          acceleration=a,
+          omega=omega.v,
+          alpha=alpha,
+          cg=cg
+        )
+      
+      #tvc.updateSetpoint(targetx=1e-1 * DEGREES_TO_RADIANS, targety=1e-1 * DEGREES_TO_RADIANS)
+      
+      design.step(dt=dt_taken)
+      if substeps is None or coasting: # the multi-rate step already moved the servos and talked to the serial port at the fast rate
+        tvc.step(dt=dt_taken)
+        
+        if not ignore_serial:
+          exchangeSerial()
+      
+      design.dynamic_elements[motor_idx][1] = tvc.getAttitude()
+
+      t = t_next
+      
+      if terminated:
         break
-  
-  print(f"Simulation took {time() - start:.3} seconds!")
-  
-  start = time()
-  plotMotion(
-    N=n,
-    translation_vectors=positions,
-    x_body_vectors=body_x,
-    y_body_vectors=body_y,
-    z_body_vectors=body_z,
+      
+      if recorded and recorder.size == chunk_size:
+        # the clock stops while the consumer works on the chunk
+        simulation_time += time() - start
+        trajectory = chunk()
+        # the consumer works in its own precision between chunks
+        setPrecision(precision=previous_precision)
+        yield trajectory
+        setPrecision(precision=precision)
+        start = time()
+    
+    simulation_time += time() - start
+    if recorder.size > 0 or chunks == 0:
+      trajectory = chunk()
+      setPrecision(precision=previous_precision)
+      yield trajectory
+  finally:
+    setPrecision(precision=previous_precision)
+
+def simulate(
+    serial_manager: SerialManager,
+    design: Design,
+    tvc: ThrustVectorController,
+    motor_idx: int,
+    dt: float = 1e-3,
+    precision: str = DEFAULT_PRECISION,
+    integrator: str = "euler",
+    step_controller: StepSizeController = None,
+    substeps: int = None,
+    coast_dt: float = None,
+    t_final: float = 20.0,
+    rail_length: float = RAIL_LENGTH,
+    events: List[Event] = None,
+    monitor: bool = False,
+    recording: RecordingPolicy = None,
+    resume: Checkpoint = None,
+    checkpoint: bool = False
+  ) -> Trajectory:
+  """ performs a generic model rocket flight simulation and produces solutions to the equations of motion, `simulationStream()` run to
+  the end as one chunk
+
+  Args:
+      see `simulationStream()`
+
+  Returns:
+      Trajectory: the recorded flight with the flight phase of every row, the located events and the metadata of the run, including the
+        loop wall time in seconds
+  """
+  return concatenateTrajectories(chunks=list(simulationStream(
+    serial_manager=serial_manager,
+    design=design,
+    tvc=tvc,
+    motor_idx=motor_idx,
     dt=dt,
-    burn_time=tvc.burn_time,
-    save=save,
-    filename=filename
+    precision=precision,
+    integrator=integrator,
+    step_controller=step_controller,
+    substeps=substeps,
+    coast_dt=coast_dt,
+    t_final=t_final,
+    rail_length=rail_length,
+    events=events,
+    monitor=monitor,
+    recording=recording,
+    resume=resume,
+    checkpoint=checkpoint
+  )))
+
+def simulationLoop(
+    serial_manager: SerialManager,
+    design: Design,
+    tvc: ThrustVectorController,
+    motor_idx: int,
+    dt: float = 1e-3,
+    save: bool = False,
+    filename: str = None,
+    precision: str = DEFAULT_PRECISION,
+    integrator: str = "euler",
+    step_controller: StepSizeController = None,
+    substeps: int = None,
+    coast_dt: float = None,
+    t_final: float = 20.0,
+    rail_length: float = RAIL_LENGTH,
+    events: List[Event] = None,
+    monitor: bool = False,
+    recording: RecordingPolicy = None,
+    resume: Checkpoint = None,
+    checkpoint: bool = False
+  ) -> pd.DataFrame:
+  """ `simulate()` followed by every post processing stage, the animation, the csv for the Data Analysis page and the DataFrame
+
+  Args:
+      save (bool, optional): encode the animation, to temp.mp4 unless a filename is given. Defaults to False.
+      filename (str, optional): enter the filename if you wish to save it somewhere other than temp.mp4. Defaults to None.
+      the rest: see `simulate()`
+
+  Returns:
+      pd.DataFrame: see `Trajectory.to_frame()`
+  """
+  trajectory = simulate(
+    serial_manager=serial_manager,
+    design=design,
+    tvc=tvc,
+    motor_idx=motor_idx,
+    dt=dt,
+    precision=precision,
+    integrator=integrator,
+    step_controller=step_controller,
+    substeps=substeps,
+    coast_dt=coast_dt,
+    t_final=t_final,
+    rail_length=rail_length,
+    events=events,
+    monitor=monitor,
+    recording=recording,
+    resume=resume,
+    checkpoint=checkpoint
   )
+  print(f"Simulation took {trajectory.metadata['simulation_time']:.3} seconds!")
   
-  data = pd.DataFrame({
-    "position": positions,
-    "body_x": body_x,
-    "body_y": body_y,
-    "body_z": body_z,
-    "targetx": targetx,
-    "targety": targety,
-    "thetax": thetax,
-    "thetay": thetay,
-    "velocity": velocities,
-    "acceleration": accelerations,
-    "omega": omegas,
-    "alpha": alphas,
-    "cg": cgs
-  })
+  summary = trajectory.metadata["monitors"]
+  if summary is not None and not summary["healthy"]:
+    print(f"Conservation monitors flagged {summary['flags']}, consider a smaller dt!")
   
-  data.to_csv("./WebApp/assets/simulation.csv", sep=",")
+  start = time()
+  renderTrajectory(trajectory=trajectory, save=save, filename=filename)
+  data = saveTrajectory(trajectory=trajectory)
   print(f"File saves took {time() - start} seconds!")
+  
+  return data
 
 
 
@@ -285,7 +540,7 @@ def demoSim():
     )
     
     z_body_list.append(rotateVector(q=q, v=u))
-    r_list.append(r)
+    r_list.append(Vector(elements=r.v))
 
     design.step(dt=dt) # reduce the mass of the dynamic elements according to their specs
     tvc.step(dt=dt)
@@ -315,5 +570,7 @@ def demoSim():
 
 __all__ = [
   "demoSim",
+  "simulationStream",
+  "simulate",
   "simulationLoop"
 ]
\ No newline at end of file
@@ -0,0 +1,82 @@
+from __future__ import annotations
+from typing import Tuple, List, Sequence
+import numpy as np
+from numpy.typing import NDArray
+
+from Quaternion import *
+from Precision import *
+
+"""
+Description: State.py fixes the canonical layout of the rigid body state as one flat array of 13 numbers, position, velocity, attitude
+quaternion and angular velocity, all in the inertial frame. `Design` keeps its kinematic state in such an array, and `design.r`, `design.v`,
+`design.q` and `design.omega` are views into it, so the object API keeps working while the whole state can be copied, restored or handed to
+an external solver as a single array. `derivative()` in Dynamics.py is the matching pure right hand side.
+"""
+
+STATE_SIZE = 13
+
+# where each part of the state lives in the flat array
+POSITION = slice(0, 3)
+VELOCITY = slice(3, 6)
+ATTITUDE = slice(6, 10)
+ANGULAR_VELOCITY = slice(10, 13)
+
+# a (13,) array laid out as (r, v, q, omega), or (N, 13) for N vehicles
+StateVector = NDArray
+
+
+def packState(r: Sequence[float], v: Sequence[float], q: Sequence[float], omega: Sequence[float], out: StateVector = None) -> StateVector:
+  """ writes the four parts of a state into one flat array
+
+  Args:
+      r (Sequence[float]): (3,) inertial position
+      v (Sequence[float]): (3,) inertial velocity
+      q (Sequence[float]): (4,) attitude quaternion rotating body axes into the inertial frame
+      omega (Sequence[float]): (3,) inertial angular velocity
+      out (StateVector, optional): (13,) array to write into. Defaults to None, a new array of the active `Precision.py` dtype.
+
+  Returns:
+      StateVector: the packed state
+  """
+  if out is None:
+    out = np.empty(STATE_SIZE, dtype=getPrecision())
+  out[POSITION] = r
+  out[VELOCITY] = v
+  out[ATTITUDE] = q
+  out[ANGULAR_VELOCITY] = omega
+  return out
+
+def unpackState(state: StateVector) -> Tuple[List[float], List[float], List[float], List[float]]:
+  """ splits a flat state into plain float lists (r, v, q, omega), the form the kernels in Kernels.py work on fastest
+  """
+  values = state.tolist()
+  return (values[0:3], values[3:6], values[6:10], values[10:13])
+
+def stateViews(state: StateVector) -> Tuple[Vector, Vector, Quaternion, Vector]:
+  """ wraps the four parts of a flat state without copying, writes through any of them land in the array
+
+  Args:
+      state (StateVector): (13,) state
+
+  Returns:
+      Tuple[Vector, Vector, Quaternion, Vector]: position, velocity, attitude and angular velocity viewing the array
+  """
+  return (
+    Vector.from_buffer(state[POSITION]),
+    Vector.from_buffer(state[VELOCITY]),
+    Quaternion.from_buffer(state[ATTITUDE]),
+    Vector.from_buffer(state[ANGULAR_VELOCITY])
+  )
+
+
+__all__ = [
+  "STATE_SIZE",
+  "POSITION",
+  "VELOCITY",
+  "ATTITUDE",
+  "ANGULAR_VELOCITY",
+  "StateVector",
+  "packState",
+  "unpackState",
+  "stateViews"
+]
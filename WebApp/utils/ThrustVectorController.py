@@ -1,16 +1,58 @@
 from __future__ import annotations
-from typing import Tuple, Dict, List, TypedDict
+from typing import Tuple, Dict, List, TypedDict, Sequence
+import math
 from numpy.typing import NDArray
 
 from Element import *
 from Quaternion import *
+from ExponentialMap import *
 from MotorManager import *
+from Precision import *
+from Kernels import *
 
 
 DEGREES_TO_RADIANS = np.pi / 180.0
 RADIANS_TO_DEGREES = 180.0 / np.pi
 
 
+def rampServo(theta: float, target: float, epsilon: float) -> float:
+  """ one servo moved toward its target by at most epsilon radians, the rate limited response of the servo
+
+  Args:
+      theta (float): current angle in radians
+      target (float): target angle in radians
+      epsilon (float): largest move, the maximum speed times the time step
+
+  Returns:
+      float: the new angle in radians
+  """
+  error = target - theta
+  # the problem without this if statement is that oscillations occur when perfect accuracy is unattainable - which is always the case
+  if abs(error) > epsilon:
+    return theta + math.copysign(epsilon, error)
+  else:
+    return target
+
+def thrustVector(thrust: float, thetax: float, thetay: float, offset: Sequence[float], cg: Sequence[float]) -> Tuple[Vector3, Vector3]:
+  """ force and moment of a motor gimballed by the two servo angles
+
+  Args:
+      thrust (float): thrust magnitude in Newtons
+      thetax (float): servo angle in radians
+      thetay (float): servo angle in radians
+      offset (Sequence[float]): (3,) motor position in body-centered coordinates
+      cg (Sequence[float]): (3,) center of gravity in body-centered coordinates
+
+  Returns:
+      Tuple[Vector3, Vector3]: the force and the moment about the cg in body-centered coordinates
+  """
+  sinx, cosx = math.sin(thetax), math.cos(thetax)
+  siny, cosy = math.sin(thetay), math.cos(thetay)
+  F = (thrust * siny, -thrust * sinx * cosy, thrust * cosx * cosy)
+  R = (offset[0] - cg[0], offset[1] - cg[1], offset[2] - cg[2])
+  return (F, cross3(a=R, b=F))
+
+
 class ThrustVectorController:
   _instance = None
   
@@ -44,20 +86,28 @@ class ThrustVectorController:
     Args:
         dt (float): small time step since last time step
     """
-    epsilon = self.max_speed * dt
-    errorx = self.targetx - self.thetax
-    errory = self.targety - self.thetay
-    # the problem without these if statements is that oscillations occur when perfect accuracy is unattainable - which is always the case
-    if abs(errorx) > epsilon:
-      self.thetax += np.sign(errorx) * epsilon
-    else:
-      self.thetax = self.targetx
-    
-    if abs(errory) > epsilon:
-      self.thetay += np.sign(errory) * epsilon
-    else:
-      self.thetay = self.targety
-    
+    self.thetax, self.thetay = self.getServoAngles(lookahead=dt)
+  
+  def getServoAngles(self, lookahead: float = 0.0) -> Tuple[float, float]:
+    """ the servo angles some time after the last `step()`, following the same rate limited ramp toward the targets without moving the servos
+
+    Args:
+        lookahead (float, optional): seconds past the last `step()`. Defaults to 0.0.
+
+    Returns:
+        Tuple[float, float]: thetax, thetay in radians
+    """
+    epsilon = self.max_speed * lookahead
+    return (rampServo(theta=self.thetax, target=self.targetx, epsilon=epsilon), rampServo(theta=self.thetay, target=self.targety, epsilon=epsilon))
+  
+  def getArrivalTime(self) -> float:
+    """ seconds until both servos reach their targets, the end of the ramp is a kink in the thrust direction
+
+    Returns:
+        float: time in seconds, 0.0 when the servos are already on target
+    """
+    return max(abs(self.targetx - self.thetax), abs(self.targety - self.thetay)) / self.max_speed
+  
   def moveToMotor(self, offset: NDArray) -> None:
     """ sets the offset parameter to correctly compute the cross product between thrust vector and center of mass position vector
 
@@ -76,26 +126,35 @@ class ThrustVectorController:
     self.targetx = targetx
     self.targety = targety
   
-  def getThrustVector(self, t: float, cg: NDArray) -> Tuple[NDArray, NDArray]:
+  def getThrustVector(self, t: float, cg: NDArray, lookahead: float = 0.0, window: float = 0.0) -> Tuple[NDArray, NDArray]:
     """ gets the force and moment generated by the thrust vector mechanism
 
     Args:
         t (float): current time in seconds
+        cg (NDArray): center of gravity in body-centered coordinates
+        lookahead (float, optional): seconds past the last `step()` to take the servo angles at, see `getServoAngles()`. Defaults to 0.0.
+        window (float, optional): averages the thrust over [t, t + window] instead of sampling it at t, see `MotorManager.getAverageThrust()`.
+          Defaults to 0.0.
 
     Returns:
         Tuple[NDArray, NDArray]: the force, torque vectors in body-centered coordinates
     """
-    F = self.motor_manager.getThrust(t=t) * np.array([np.sin(self.thetay), -np.sin(self.thetax) * np.cos(self.thetay), np.cos(self.thetax) * np.cos(self.thetay)])
-    R = self.offset - cg
-    τ = np.cross(R, F)
-    return (F, τ)
+    dtype = getPrecision()
+    thrust = float(self.motor_manager.getAverageThrust(t=t, dt=window))
+    thetax, thetay = self.getServoAngles(lookahead=lookahead) if lookahead > 0.0 else (self.thetax, self.thetay)
+    F, τ = thrustVector(thrust=thrust, thetax=thetax, thetay=thetay, offset=self.offset, cg=cg)
+    return (np.array(F, dtype=dtype), np.array(τ, dtype=dtype))
   
   def getAttitude(self):
-    z = np.array([0, 0, -1.0])
-    target = np.array([-np.sin(self.thetay), np.sin(self.thetax) * np.cos(self.thetay), -np.cos(self.thetax) * np.cos(self.thetay)])
-    angle = np.acos(np.dot(target, z))
-    cross = np.cross(z, target)
-    return Quaternion(angle_vector=(angle, cross), is_vector=False)
+    z = (0.0, 0.0, -1.0)
+    cosy = math.cos(self.thetay)
+    target = (-math.sin(self.thetay), math.sin(self.thetax) * cosy, -math.cos(self.thetax) * cosy)
+    angle = math.acos(max(-1.0, min(1.0, dot3(a=target, b=z))))
+    cross = cross3(a=z, b=target)
+    # |z x target| = sin(angle), so angle / sin(angle) scales the cross product into the rotation vector and tends to 1 at zero angle
+    sine = norm3(a=cross)
+    scale = angle / sine if sine > 1e-12 else 1.0
+    return Quaternion.from_buffer(expMap(phi=(cross[0] * scale, cross[1] * scale, cross[2] * scale)))
 
   def forceToTarget(self) -> None:
     """ a helper function for initialization to force the tvc to initial target state
@@ -106,6 +165,8 @@ class ThrustVectorController:
   
 __all__ = [
   "ThrustVectorController",
+  "rampServo",
+  "thrustVector",
   "DEGREES_TO_RADIANS",
   "RADIANS_TO_DEGREES"
 ]
\ No newline at end of file
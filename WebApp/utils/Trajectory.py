@@ -0,0 +1,371 @@
+from __future__ import annotations
+from typing import Dict, List, Sequence, Optional, TypedDict
+import math
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from numpy.typing import NDArray
+
+from Quaternion import *
+from State import *
+from Precision import *
+from AttitudeConversions import *
+from Events import *
+from Monitors import *
+from Checkpoint import *
+
+"""
+Description: Trajectory.py records a flight into preallocated contiguous NumPy arrays, one column per channel, instead of growing a Python
+list of small `Vector()` objects per channel. The recorder is sized from the expected number of steps, doubles its capacity when a run
+takes more steps than expected and is trimmed when the run ends, so recording a step is a handful of row writes with no allocation at all.
+The finished record is a `Trajectory()`, the in memory result of `simulate()`: typed arrays per channel, the flight phases, the located
+events and the run's metadata, for the whole flight or for one of the chunks `simulationStream()` yields. The body axes are not recorded
+per step but derived from the attitude column in one pass, and the DataFrame handed to the rest of the app is built from views of the
+columns only when asked for. A `RecordingPolicy()` thins the rows out to the output rate analysis needs, independent of the step size.
+"""
+
+# every channel `simulationLoop()` records per step and its width, 0 for a scalar channel. a row holds the state at the end of the step,
+# stamped with its time, but acceleration, alpha and cg are evaluated at the start of that step, one step before the row's time
+CHANNELS: Dict[str, int] = {
+  "time": 0,
+  "position": 3,
+  "attitude": 4,
+  "targetx": 0,
+  "targety": 0,
+  "thetax": 0,
+  "thetay": 0,
+  "velocity": 3,
+  "acceleration": 3,
+  "omega": 3,
+  "alpha": 3,
+  "cg": 3
+}
+
+# suffixes of the per component columns `Trajectory.to_frame()` splits a vector channel into, by channel width
+COMPONENTS: Dict[int, str] = {3: "xyz", 4: "wxyz"}
+
+# factor the capacity grows by when a run outlasts its preallocation
+GROWTH_FACTOR = 2
+
+
+class TrajectoryMetadata(TypedDict):
+  dt: float # the step size asked for
+  integrator: str # the key of `INTEGRATORS` used, or "adaptive" and "multirate"
+  precision: str
+  burn_time: float
+  uniform: bool # every row is interval after the one before, so the rows can be played as animation frames directly
+  interval: Optional[float] # nominal spacing of the rows, dt unless a `RecordingPolicy()` keeps fewer, None when there is none
+  simulation_time: float # loop wall time in seconds
+  monitors: Optional[MonitorSummary] # None unless the run was monitored
+  checkpoint: Optional[Checkpoint] # the state after the last row, None unless the run took checkpoints
+
+
+class Trajectory:
+  def __init__(self, columns: Dict[str, NDArray], phases: pd.Categorical, events: List[EventRecord], metadata: TrajectoryMetadata):
+    """ the complete record of one flight
+
+    Args:
+        columns (Dict[str, NDArray]): one array per channel with a row per step, the channels of CHANNELS and any extra scalar channels,
+          e.g. the conservation monitor history
+        phases (pd.Categorical): the flight phase of every row
+        events (List[EventRecord]): the located events in time order
+        metadata (TrajectoryMetadata): how the flight was computed
+    """
+    self.columns = columns
+    self.phases = phases
+    self.events = events
+    self.metadata = metadata
+
+  def __len__(self) -> int:
+    return len(self.columns["time"])
+
+  def __getitem__(self, channel: str) -> NDArray:
+    return self.columns[channel]
+
+  def body_axes(self) -> NDArray:
+    """ the body x, y and z axes in the inertial frame for every row, from the attitude column in one pass
+
+    Returns:
+        NDArray: (N, 3, 3) array, [:, 0] holds the body x axes, [:, 1] the y axes and [:, 2] the z axes
+    """
+    R = batchRotationMatrix(qs=self.columns["attitude"])
+    return np.ascontiguousarray(np.swapaxes(R, 1, 2), dtype=self.columns["attitude"].dtype)
+
+  def to_frame(self) -> pd.DataFrame:
+    """ the record as a DataFrame of float columns, every vector channel split into one column per component, e.g. position_x, attitude_w
+    and body_z_y, followed by the attitude angles and any extra channels. no `Vector()` or `Quaternion()` is built per row, use
+    `frameChannel()` to get a vector channel back as one array. acceleration, alpha and cg belong to the start of the step that ends at the
+    row's time, see CHANNELS
+
+    Returns:
+        pd.DataFrame: one row per step, with the loop wall time in `.attrs["simulation_time"]`, the events in `.attrs["events"]` and the
+          `MonitorSummary` in `.attrs["monitors"]` for a monitored run
+    """
+    axes = self.body_axes()
+    vectors = {
+      "position": self.columns["position"],
+      "attitude": self.columns["attitude"],
+      "body_x": axes[:, 0],
+      "body_y": axes[:, 1],
+      "body_z": axes[:, 2],
+      "velocity": self.columns["velocity"],
+      "acceleration": self.columns["acceleration"],
+      "omega": self.columns["omega"],
+      "alpha": self.columns["alpha"],
+      "cg": self.columns["cg"]
+    }
+    components = lambda name: {f"{name}_{axis}": vectors[name][:, i] for i, axis in enumerate(COMPONENTS[vectors[name].shape[1]])}
+    data = pd.DataFrame({
+      "time": self.columns["time"],
+      **components("position"),
+      **components("attitude"),
+      **components("body_x"),
+      **components("body_y"),
+      **components("body_z"),
+      "targetx": self.columns["targetx"],
+      "targety": self.columns["targety"],
+      "thetax": self.columns["thetax"],
+      "thetay": self.columns["thetay"],
+      **components("velocity"),
+      **components("acceleration"),
+      **components("omega"),
+      **components("alpha"),
+      **components("cg"),
+      "phase": self.phases
+    }, copy=False)
+
+    # angles come from the whole attitude history in one pass so analysis never has to rebuild them row by row
+    euler_angles = batchEulerAngles(qs=self.columns["attitude"])
+    tilt_angles = batchTiltAngles(qs=self.columns["attitude"])
+    data["yaw"] = euler_angles[:, YAW]
+    data["pitch"] = euler_angles[:, PITCH]
+    data["roll"] = euler_angles[:, ROLL]
+    data["tilt"] = tilt_angles[:, TILT]
+    data["azimuth"] = tilt_angles[:, AZIMUTH]
+    for name, column in self.columns.items():
+      if name not in CHANNELS.keys():
+        data[name] = column
+
+    data.attrs["simulation_time"] = self.metadata["simulation_time"]
+    data.attrs["events"] = self.events
+    if self.metadata["monitors"] is not None:
+      data.attrs["monitors"] = self.metadata["monitors"]
+    return data
+
+
+class RecordingPolicy:
+  def __init__(self, every: int = None, rate: float = None, threshold: float = None):
+    """ decides which integration steps become rows of the record, so the integrator keeps the dt accuracy demands while the record,
+    the csv and the animation only hold the rows analysis needs, e.g. dt = 1e-3 recorded at 100 Hz is a tenth of the rows
+
+    - at most one of the three may be given, none records every step. the last step of a run is always recorded
+
+    Args:
+        every (int, optional): record every k-th step. Defaults to None.
+        rate (float, optional): record the first step reaching each tick of a fixed output rate in Hz. Defaults to None.
+        threshold (float, optional): record a step once any state component x moved more than threshold * (1 + |x|) from the last row,
+          dense rows through the boost and sparse ones through a quiet coast. Defaults to None.
+    """
+    if sum(option is not None for option in (every, rate, threshold)) > 1:
+      raise ValueError("Only one of every, rate and threshold can be set on a recording policy")
+    if every is not None and (isinstance(every, bool) or not isinstance(every, int) or every < 1):
+      raise ValueError("every must be a positive whole number of steps")
+    if rate is not None and rate <= 0.0:
+      raise ValueError("rate must be a positive frequency in Hz")
+    if threshold is not None and threshold < 0.0:
+      raise ValueError("threshold must not be negative")
+    
+    self.every = every
+    self.rate = rate
+    self.threshold = threshold
+    self.start()
+
+  def start(self) -> None:
+    """ forgets the previous run, called at the start of every run
+    """
+    self.steps = 0
+    self.next_time = 0.0 if self.rate is None else 1.0 / self.rate
+    self.last_state: StateVector = None
+
+  def interval(self, dt: float) -> Optional[float]:
+    """ nominal spacing of the recorded rows on steps of dt
+
+    Returns:
+        Optional[float]: k * dt, the output period, or None for a threshold
+    """
+    if self.every is not None:
+      return self.every * dt
+    if self.rate is not None:
+      return max(dt, 1.0 / self.rate)
+    if self.threshold is not None:
+      return None
+    return dt
+
+  def is_uniform(self, dt: float) -> bool:
+    """ whether the rows on fixed steps of dt are exactly `interval()` apart, which needs an output period that is a whole number of steps
+    """
+    if self.rate is not None:
+      ratio = 1.0 / (self.rate * dt)
+      return ratio <= 1.0 or abs(ratio - round(ratio)) < 1e-6
+    return self.threshold is None
+
+  def record(self, t: float, state: StateVector, last: bool = False) -> bool:
+    """ whether the step ending at t is recorded
+
+    Args:
+        t (float): time at the end of the step
+        state (StateVector): (13,) state at t
+        last (bool, optional): the run ends with this step. Defaults to False.
+
+    Returns:
+        bool: True to record the step
+    """
+    self.steps += 1
+    if self.every is not None:
+      return last or self.steps % self.every == 0
+    if self.rate is not None:
+      if t < self.next_time - 1e-9 and not last:
+        return False
+      # the next tick after t, a step longer than the output period records once and skips the ticks it covered
+      self.next_time = (math.floor(t * self.rate + 1e-9) + 1) / self.rate
+      return True
+    if self.threshold is not None:
+      if self.last_state is not None and not last and np.all(np.abs(state - self.last_state) <= self.threshold * (1.0 + np.abs(self.last_state))):
+        return False
+      self.last_state = state.copy()
+      return True
+    return True
+
+
+class TrajectoryRecorder:
+  def __init__(self, capacity: int, channels: Dict[str, int] = CHANNELS):
+    """ a columnar buffer for the per step record of a flight
+
+    - time is always kept in float64 so long runs at a small dt keep distinct time stamps, every other channel uses the active
+      `Precision.py` dtype
+
+    Args:
+        capacity (int): number of steps to preallocate, e.g. t_final / dt for fixed steps
+        channels (Dict[str, int], optional): the channels and their widths. Defaults to CHANNELS.
+    """
+    self.channels = channels
+    self.capacity = max(1, int(capacity))
+    self.size = 0
+    self.columns: Dict[str, NDArray] = {
+      name: np.empty((self.capacity, width) if width > 0 else self.capacity, dtype=np.float64 if name == "time" else getPrecision())
+      for name, width in channels.items()
+    }
+    self.phase_codes = np.empty(self.capacity, dtype=np.int8)
+    self.phase_names: List[str] = []
+
+  def append(self, phase: str, **values: float | Sequence[float]) -> None:
+    """ writes one step into the next row of every channel
+
+    Args:
+        phase (str): the flight phase of the step
+        **values (float | Sequence[float]): a value of the matching width for every channel
+    """
+    if self.size == self.capacity:
+      self.grow(capacity=GROWTH_FACTOR * self.capacity)
+    if phase not in self.phase_names:
+      self.phase_names.append(phase)
+
+    row = self.size
+    for name, value in values.items():
+      self.columns[name][row] = value
+    self.phase_codes[row] = self.phase_names.index(phase)
+    self.size += 1
+
+  def grow(self, capacity: int) -> None:
+    """ moves every channel into a larger buffer, keeping the rows recorded so far
+
+    Args:
+        capacity (int): the new number of rows, at least the current size
+    """
+    for name, column in self.columns.items():
+      grown = np.empty((capacity, *column.shape[1:]), dtype=column.dtype)
+      grown[:self.size] = column[:self.size]
+      self.columns[name] = grown
+    grown = np.empty(capacity, dtype=np.int8)
+    grown[:self.size] = self.phase_codes[:self.size]
+    self.phase_codes = grown
+    self.capacity = capacity
+
+  def trim(self) -> None:
+    """ shrinks every channel to the rows actually recorded, releasing the unused part of the preallocation
+    """
+    if self.size < self.capacity:
+      self.grow(capacity=self.size)
+
+  def phases(self) -> pd.Categorical:
+    """ the flight phase of every recorded step
+    """
+    return pd.Categorical.from_codes(self.phase_codes[:self.size], categories=self.phase_names)
+
+  def finish(self, events: List[EventRecord], metadata: TrajectoryMetadata, extra: Dict[str, NDArray] = None) -> Trajectory:
+    """ trims the buffer and hands its columns over to a `Trajectory()`, the recorder must not be appended to afterwards
+
+    Args:
+        events (List[EventRecord]): the located events of the run
+        metadata (TrajectoryMetadata): how the run was computed
+        extra (Dict[str, NDArray], optional): more scalar channels with a row per step. Defaults to None.
+
+    Returns:
+        Trajectory: the record
+    """
+    self.trim()
+    columns = dict(self.columns)
+    if extra is not None:
+      columns.update(extra)
+    return Trajectory(columns=columns, phases=self.phases(), events=events, metadata=metadata)
+
+
+def frameChannel(data: pd.DataFrame, channel: str) -> NDArray:
+  """ stacks the component columns of a vector channel of `Trajectory.to_frame()` back into one array
+
+  Args:
+      data (pd.DataFrame): a frame from `Trajectory.to_frame()`, or the csv `saveTrajectory()` writes read back in
+      channel (str): a vector channel, e.g. "position", "attitude" or "body_z"
+
+  Returns:
+      NDArray: (N, 3) rows, or (N, 4) rows of (w, x, y, z) for the attitude
+  """
+  axes = COMPONENTS[4] if f"{channel}_w" in data.columns else COMPONENTS[3]
+  names = [f"{channel}_{axis}" for axis in axes]
+  if any(name not in data.columns for name in names):
+    raise KeyError(f"Vector channel must be one of {[name for name, width in CHANNELS.items() if width > 0] + ['body_x', 'body_y', 'body_z']}")
+  return data[names].to_numpy()
+
+def concatenateTrajectories(chunks: Sequence[Trajectory]) -> Trajectory:
+  """ joins consecutive chunks of one flight, e.g. from `simulationStream()`, into a single record
+
+  Args:
+      chunks (Sequence[Trajectory]): the chunks in time order, all with the same channels
+
+  Returns:
+      Trajectory: the whole flight, with the metadata of the last chunk, which describes the complete run
+  """
+  if len(chunks) == 0:
+    raise ValueError("At least one chunk is needed to build a trajectory")
+  if len(chunks) == 1:
+    return chunks[0]
+  
+  return Trajectory(
+    columns={name: np.concatenate([chunk.columns[name] for chunk in chunks]) for name in chunks[0].columns.keys()},
+    phases=union_categoricals([chunk.phases for chunk in chunks]),
+    events=[event for chunk in chunks for event in chunk.events],
+    metadata=chunks[-1].metadata
+  )
+
+
+__all__ = [
+  "CHANNELS",
+  "COMPONENTS",
+  "GROWTH_FACTOR",
+  "TrajectoryMetadata",
+  "Trajectory",
+  "RecordingPolicy",
+  "TrajectoryRecorder",
+  "frameChannel",
+  "concatenateTrajectories"
+]
@@ -170,7 +170,7 @@ def plotterDemo(save: bool = False):
   dt = 1e-2
   counter = 1
   while t <= dt * N:
-    omega_list.append(omega.v)
+    omega_list.append(np.copy(omega.v))
     
     q, omega = solver(omega=omega, alpha=alpha(t), q=q, dt=dt, index=counter)
     q_list.append(q)
@@ -3,12 +3,27 @@ import os
 
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
+from State import *
 from Design import *
 from Element import *
 from ElementTypes import *
+from Dynamics import *
 from Integrator import *
+from Events import *
+from Ensemble import *
+from Monitors import *
 from MotorManager import *
+from Kernels import *
+from ExponentialMap import *
+from TorqueFree import *
 from Quaternion import *
+from QuaternionBatch import *
+from AttitudeConversions import *
+from Interpolation import *
+from Checkpoint import *
+from Trajectory import *
+from PostProcessing import *
+from Precision import *
 from SerialManager import *
 from ThrustVectorController import *
 from VectorPlotter import *